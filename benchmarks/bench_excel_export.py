@@ -0,0 +1,102 @@
+"""
+导出 Excel 的性能测试
+
+对比旧的写法 (polars 写入后用 openpyxl 重新打开逐个单元格设置格式)
+和 write_styled_excel 一次性写入带格式的 Excel
+
+用法:
+    python -m benchmarks.bench_excel_export --rows 100000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import polars as pl
+import shortuuid
+from openpyxl import load_workbook
+from openpyxl.styles import Alignment, Font
+
+from utils.save import COLUMN_FORMATS, write_styled_excel
+
+
+def make_dataframe(rows: int) -> pl.DataFrame:
+    """生成测试数据"""
+    platforms = ["京东", "淘宝天猫", "拼多多", "美团（快递）", "饿了么（快递）"]
+
+    datas = [
+        [
+            shortuuid.uuid(),
+            f"测试大药房{i % 997}",
+            f"https://shop.example.com/{i % 997}",
+            "",
+            "测试品牌 测试药品",
+            "",
+            f"https://img.example.com/{i}.jpg",
+            f"{random.uniform(5, 200):.2f}",
+            platforms[i % len(platforms)],
+            "2024-01-01",
+        ]
+        for i in range(rows)
+    ]
+
+    return pl.DataFrame(datas, schema=list(COLUMN_FORMATS), orient="row")
+
+
+def legacy_export(df: pl.DataFrame, filename: Path) -> None:
+    """旧的写法: 先写入, 再用 openpyxl 重新打开设置格式"""
+    df.write_excel(filename)
+
+    wb = load_workbook(filename)
+    ws = wb.active
+    ws.sheet_view.zoomScale = 100
+
+    for cell in ws[1]:
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cell.font = Font(size=15, bold=True)
+    ws.row_dimensions[1].height = 25
+
+    for col, width in zip("ABCDEFGHIJ", (30, 45, 20, 50, 35, 15, 20, 23, 15, 18)):
+        ws.column_dimensions[col].width = width
+        for row in ws.iter_rows(min_row=2):
+            for cell in row:
+                if cell.column in (2, 6):
+                    cell.alignment = Alignment(horizontal="left", vertical="center")
+                else:
+                    cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    wb.save(filename)
+
+
+def timeit(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 Excel 的性能测试")
+    parser.add_argument("--rows", type=int, default=100_000, help="数据行数")
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="不测试旧的 openpyxl 写法"
+    )
+    args = parser.parse_args()
+
+    df = make_dataframe(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        elapsed = timeit(write_styled_excel, df, tmp / "styled.xlsx")
+        print(f"write_styled_excel: {args.rows} 行, 耗时 {elapsed:.2f}s")
+
+        if not args.skip_legacy:
+            elapsed_legacy = timeit(legacy_export, df, tmp / "legacy.xlsx")
+            print(f"openpyxl 重新设置格式: {args.rows} 行, 耗时 {elapsed_legacy:.2f}s")
+            print(f"加速比: {elapsed_legacy / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+各平台解析器的离线回放性能测试
+
+读取 HAR 文件或者 mitmproxy 保存的 flow 文件, 按域名和路径找到对应的解析器, 不需要联网,
+输出每个解析器的行数/秒、MB/秒和延迟分位数
+
+不传文件时使用 benchmarks/fixtures/sample.har, 这个文件由 --write-fixture 根据合成数据生成
+
+用法:
+    python -m benchmarks.bench_parsers
+    python -m benchmarks.bench_parsers 抓包.har flows.mitm --repeat 20 --mode proxy
+    python -m benchmarks.bench_parsers --write-fixture --items 60
+"""
+
+import argparse
+import base64
+import json
+import time
+from pathlib import Path
+from typing import Iterator, NamedTuple
+from urllib.parse import urlsplit
+
+from utils.parsers import PARSERS, PROXY_UNCHECKED, ParseContext
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample.har"
+
+# 合成数据使用的关键词
+KEYWORD = "三九 感冒灵颗粒"
+
+
+class Recorded(NamedTuple):
+    """一个录制的响应"""
+
+    url: str
+    body: bytes
+
+
+def read_har(path: Path) -> Iterator[Recorded]:
+    with open(path, encoding="utf-8") as f:
+        har = json.load(f)
+
+    for entry in har["log"]["entries"]:
+        content = entry["response"].get("content", {})
+        text = content.get("text")
+        if not text:
+            continue
+
+        if content.get("encoding") == "base64":
+            body = base64.b64decode(text)
+        else:
+            body = text.encode("utf-8")
+
+        yield Recorded(entry["request"]["url"], body)
+
+
+def read_flows(path: Path) -> Iterator[Recorded]:
+    """读取 mitmproxy 保存的 flow 文件, 需要安装 mitmproxy"""
+    from mitmproxy import http, io
+
+    with open(path, "rb") as f:
+        for flow in io.FlowReader(f).stream():
+            if isinstance(flow, http.HTTPFlow) and flow.response is not None:
+                yield Recorded(flow.request.url, flow.response.content or b"")
+
+
+def read_recorded(path: Path) -> list[Recorded]:
+    if path.suffix == ".har":
+        return list(read_har(path))
+    return list(read_flows(path))
+
+
+def synthetic_responses(items: int) -> list[Recorded]:
+    """每个解析器一个响应, 每个响应 items 个商品, 一半符合关键词"""
+
+    def name(i: int) -> str:
+        return "三九感冒灵颗粒10袋" if i % 2 == 0 else "板蓝根颗粒20袋"
+
+    jd_li = "".join(
+        f'<li data-sku="{i}"><div><div class="p-img"><a><img data-lazy-img="//img.jd.com/{i}.jpg"/></a></div>'
+        f"<div><strong><i>{10 + i}.90</i></strong></div>"
+        f"<div><a><em>{name(i)}</em></a></div><div></div>"
+        f'<div class="p-shop"><span><a title="京东药房{i}" href="//mall.jd.com/index-{i}.html"></a></span></div>'
+        f"</div></li>"
+        for i in range(items)
+    )
+
+    yfw_li = "".join(
+        f'<li><div class="img"><a><img src="//img.yaofangwang.com/{i}.jpg"/></a></div>'
+        f'<div class="clearfix"><a title="药房网店铺{i}" href="//www.yaofangwang.com/shop/{i}" '
+        f'data-commodity_price="{8 + i}.50"></a></div></li>'
+        for i in range(items)
+    )
+
+    pdd_list = [
+        {
+            "mallEntrance": {"mall_id": 1000 + i},
+            "goodsName": name(i),
+            "imgUrl": f"https://img.pddpic.com/{i}.jpg",
+            "priceInfo": f"{9 + i}",
+        }
+        for i in range(items)
+    ]
+    pdd_raw = json.dumps(
+        {"stores": {"store": {"data": {"ssrListData": {"list": pdd_list}}}}},
+        ensure_ascii=False,
+    )
+
+    pdd_xhr = {
+        "items": [
+            {
+                "item_data": {
+                    "goods_model": {
+                        "mall_id": 2000 + i,
+                        "goods_name": name(i),
+                        "hd_url": f"https://img.pddpic.com/hd/{i}.jpg",
+                        "price_info": f"{9 + i}",
+                    }
+                }
+            }
+            for i in range(items)
+        ]
+    }
+
+    meituan = {
+        "data": {
+            "module_list": [
+                {
+                    "string_data": json.dumps(
+                        {
+                            "name": f"美团药房{i}（快递电商）",
+                            "product_list": [
+                                {
+                                    "product_name": name(i),
+                                    "picture": f"https://p0.meituan.net/{i}.jpg",
+                                    "price": 10 + i,
+                                }
+                            ],
+                        },
+                        ensure_ascii=False,
+                    )
+                }
+                for i in range(items)
+            ]
+        }
+    }
+
+    taobao = {
+        "ret": ["SUCCESS::调用成功"],
+        "data": {
+            "itemsArray": [
+                {
+                    "shopInfo": {"title": f"淘宝药房{i}", "url": f"//shop{i}.taobao.com"},
+                    "title": f"{name(i)}abc",
+                    "priceShow": {"price": f"{11 + i}"},
+                    "pic_path": f"https://img.alicdn.com/{i}.jpg",
+                }
+                for i in range(items)
+            ]
+        },
+    }
+
+    ele = {
+        "data": {
+            "result": [
+                {
+                    "listItems": [
+                        {
+                            "info": {
+                                "restaurant": {
+                                    "name": f"饿了么药房{i}",
+                                    "deliveryMode": {"text": "快递发货"},
+                                },
+                                "foods": [
+                                    {
+                                        "name": name(i),
+                                        "imagePath": f"https://cube.elemecdn.com/{i}.jpg",
+                                        "price": 12 + i,
+                                    }
+                                ],
+                            }
+                        }
+                        for i in range(items)
+                    ]
+                }
+            ]
+        }
+    }
+
+    def dumps(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    return [
+        Recorded(
+            "https://search.jd.com/Search?keyword=%E4%B8%89%E4%B9%9D",
+            f'<html><body><div id="J_goodsList"><ul>{jd_li}</ul></div></body></html>'.encode(),
+        ),
+        Recorded(
+            "https://api.m.jd.com/?appid=search-pc-java&functionId=pc_search_s_new&page=2",
+            f"<html>\n{jd_li}\n<script>var a = 1;</script>\n</html>".encode(),
+        ),
+        Recorded(
+            "https://www.yaofangwang.com/medicine/12345/",
+            f'<html><div id="slist"><ul>{yfw_li}</ul></div></html>'.encode(),
+        ),
+        Recorded(
+            "https://mobile.yangkeduo.com/search_result.html?search_key=%E4%B8%89%E4%B9%9D",
+            f"<script>window.rawData={pdd_raw};document.x=1</script>".encode(),
+        ),
+        Recorded(
+            "https://mobile.yangkeduo.com/proxy/api/search?page=2", dumps(pdd_xhr)
+        ),
+        Recorded(
+            "https://i.waimai.meituan.com/openh5/search/globalpage?keyword=x",
+            dumps(meituan),
+        ),
+        Recorded(
+            "https://h5api.m.taobao.com/h5/mtop.relationrecommend.wirelessrecommend.recommend/2.0/?jsv=2.7.2",
+            b"mtopjsonp1(" + dumps(taobao) + b")",
+        ),
+        Recorded(
+            "https://waimai-guide.ele.me/h5/mtop.relationrecommend.elemetinyapprecommend.recommend/1.0/?data=x",
+            dumps(ele),
+        ),
+    ]
+
+
+def write_fixture(path: Path, recorded: list[Recorded]) -> None:
+    """把响应保存为最简单的 HAR 文件"""
+    entries = [
+        {
+            "request": {"method": "GET", "url": r.url},
+            "response": {
+                "status": 200,
+                "content": {"size": len(r.body), "text": r.body.decode("utf-8")},
+            },
+        }
+        for r in recorded
+    ]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"log": {"version": "1.2", "entries": entries}},
+            f,
+            ensure_ascii=False,
+            indent=1,
+        )
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench(recorded: list[Recorded], ctx: ParseContext, repeat: int) -> None:
+    # 先找到每个响应的解析器, 只统计解析的耗时
+    routed = []
+    for r in recorded:
+        parts = urlsplit(r.url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        parser = PARSERS.find(parts.hostname or "", path)
+        if parser is not None:
+            routed.append((parser, r.body))
+
+    print(f"{len(recorded)} 个响应, 命中解析器 {len(routed)} 个, 每个重复 {repeat} 次\n")
+
+    latencies: dict[str, list[float]] = {}
+    rows: dict[str, int] = {}
+    sizes: dict[str, int] = {}
+    errors: dict[str, int] = {}
+
+    for _ in range(repeat):
+        for parser, body in routed:
+            start = time.perf_counter()
+            try:
+                count = len(parser.parse(body, ctx))
+            except Exception:
+                count = 0
+                errors[parser.name] = errors.get(parser.name, 0) + 1
+            latencies.setdefault(parser.name, []).append(time.perf_counter() - start)
+            rows[parser.name] = rows.get(parser.name, 0) + count
+            sizes[parser.name] = sizes.get(parser.name, 0) + len(body)
+
+    print(
+        f"{'解析器':<10}{'次数':>6}{'行数':>8}{'行/秒':>12}{'MB/秒':>10}"
+        f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'出错':>6}"
+    )
+
+    for name, values in latencies.items():
+        seconds = sum(values)
+        print(
+            f"{name:<10}{len(values):>6}{rows[name]:>8}"
+            f"{rows[name] / seconds if seconds else 0:>12.0f}"
+            f"{sizes[name] / 1024 / 1024 / seconds if seconds else 0:>10.1f}"
+            f"{percentile(values, 50) * 1000:>10.3f}"
+            f"{percentile(values, 90) * 1000:>10.3f}"
+            f"{percentile(values, 99) * 1000:>10.3f}"
+            f"{errors.get(name, 0):>6}"
+        )
+
+    total_seconds = sum(sum(v) for v in latencies.values())
+    if total_seconds:
+        print(
+            f"\n合计: {sum(rows.values()) / total_seconds:.0f} 行/秒, "
+            f"{sum(sizes.values()) / 1024 / 1024 / total_seconds:.1f} MB/秒"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各平台解析器的离线回放性能测试")
+    parser.add_argument(
+        "files", nargs="*", type=Path, help="HAR 文件或者 mitmproxy 的 flow 文件"
+    )
+    parser.add_argument("--repeat", type=int, default=50, help="每个响应重复解析的次数")
+    parser.add_argument("--keyword", default=KEYWORD, help="搜索关键词")
+    parser.add_argument(
+        "--mode",
+        choices=("proxy", "browser"),
+        default="proxy",
+        help="商品名的检查方式, proxy 与代理一致, browser 与浏览器自动化一致",
+    )
+    parser.add_argument(
+        "--write-fixture", action="store_true", help="重新生成合成的 sample.har"
+    )
+    parser.add_argument("--items", type=int, default=60, help="合成数据每个响应的商品数")
+    args = parser.parse_args()
+
+    if args.write_fixture:
+        write_fixture(FIXTURE, synthetic_responses(args.items))
+        print(f"已生成 {FIXTURE}")
+        return
+
+    recorded = []
+    for path in args.files or [FIXTURE]:
+        recorded.extend(read_recorded(path))
+
+    if args.mode == "proxy":
+        ctx = ParseContext(args.keyword, match_all=True, unchecked=PROXY_UNCHECKED)
+    else:
+        ctx = ParseContext(args.keyword)
+
+    bench(recorded, ctx, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+YOLO 多进程推理的性能测试
+
+对比 1 个进程和 N 个进程推理同一批图片的吞吐量, 不移动图片, 也不使用推理缓存
+
+用法:
+    python -m benchmarks.bench_yolo_processes --model best.onnx --images 图片文件夹 --processes 1,4
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+from utils.classnames import CLASS_NAMES
+from utils.yolo import SUPPORTED_FORMATS, ShardedInference
+
+
+def bench(
+    model_path: Path, images: list[Path], processes: int, batch_size: int
+) -> tuple[float, float, int]:
+    """
+    Returns:
+        tuple: (总耗时, 各进程推理耗时之和, 失败的图片数)
+    """
+    sharded = ShardedInference(
+        model_path, processes, CLASS_NAMES, batch_size=batch_size
+    )
+
+    failed = 0
+    start = time.perf_counter()
+    for result in sharded.run(images):
+        if result.error is not None:
+            failed += 1
+    elapsed = time.perf_counter() - start
+
+    return elapsed, sharded.infer_seconds, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO 多进程推理的性能测试")
+    parser.add_argument("--model", type=Path, required=True, help="onnx 模型文件")
+    parser.add_argument("--images", type=Path, required=True, help="图片所在文件夹")
+    parser.add_argument(
+        "--processes",
+        default=f"1,{max(2, (os.cpu_count() or 2) // 2)}",
+        help="逗号分隔的进程数",
+    )
+    parser.add_argument("--batch-size", type=int, default=8, help="批次大小")
+    parser.add_argument("--limit", type=int, default=0, help="最多使用多少张图片")
+    args = parser.parse_args()
+
+    images = sorted(f for f in args.images.rglob("*") if f.suffix in SUPPORTED_FORMATS)
+    if args.limit:
+        images = images[: args.limit]
+
+    print(f"{len(images)} 张图片, CPU 核数 {os.cpu_count()}, 批次大小 {args.batch_size}")
+
+    baseline = None
+    for processes in (int(n) for n in args.processes.split(",")):
+        elapsed, infer_seconds, failed = bench(
+            args.model, images, processes, args.batch_size
+        )
+        throughput = len(images) / elapsed if elapsed else 0.0
+        baseline = baseline or throughput
+
+        print(
+            f"{processes} 个进程: 耗时 {elapsed:.2f}s, 吞吐量 {throughput:.1f} 张/秒, "
+            f"加速比 {throughput / baseline:.2f}x, "
+            f"各进程推理耗时合计 {infer_seconds:.1f}s, 失败 {failed} 张"
+        )
+
+
+if __name__ == "__main__":
+    main()
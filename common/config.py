@@ -48,6 +48,10 @@ class Config(QConfig):
     mitmProxySearch_excel_path = ConfigItem("MitmProxySearch", "ExcelPath", "", "")
     mitmProxySearch_output_path = ConfigItem("MitmProxySearch", "OutputPath", "", "")
     mitmProxySearch_keyword = ConfigItem("MitmProxySearch", "Keyword", "", "")
+    # 解析响应的子进程数, 0 表示在线程池中解析
+    mitmProxySearch_parse_processes = ConfigItem(
+        "MitmProxySearch", "ParseProcesses", 0, RangeValidator(0, 16)
+    )
 
     # 自启动
     autoStart = ConfigItem("General", "AutoStart", False, BoolValidator())
@@ -55,9 +59,26 @@ class Config(QConfig):
     # 置顶
     staysOnTop = ConfigItem("General", "StaysOnTop", False, BoolValidator())
 
+    # 等待验证码、登录的超时时间 (秒), 0 表示一直等待
+    wait_captcha_timeout = ConfigItem(
+        "Wait", "CaptchaTimeout", 600, RangeValidator(0, 3600)
+    )
+    # 等待页面加载的超时时间 (秒)
+    wait_page_timeout = ConfigItem("Wait", "PageTimeout", 30, RangeValidator(1, 600))
+    # 轮询的最大间隔 (秒)
+    wait_max_interval = ConfigItem("Wait", "MaxInterval", 2, RangeValidator(1, 10))
+
     # 京东淘宝自动化
     jdtb_keyword_path = ConfigItem("JdTB", "KeywordPath", "", "")
     jdtb_output_path = ConfigItem("JdTB", "OutputPath", "", "")
+    # 同时搜索的标签页数, 默认与原来一样只用一个标签页, 多个标签页会增加出现验证码的概率
+    jdtb_tabs = ConfigItem("JdTB", "Tabs", 1, RangeValidator(1, 8))
+    # 每个平台每分钟最多搜索多少次, 0 表示不限速
+    jdtb_jd_rate = ConfigItem("JdTB", "JdRate", 20, RangeValidator(0, 120))
+    jdtb_tb_rate = ConfigItem("JdTB", "TbRate", 10, RangeValidator(0, 120))
+    # 使用浏览器的 cookie 直接请求搜索接口
+    jdtb_direct = ConfigItem("JdTB", "Direct", False, BoolValidator())
+    jdtb_max_pages = ConfigItem("JdTB", "MaxPages", 10, RangeValidator(1, 100))
 
     # 下载图片
     downloadImg_img_path = ConfigItem("downloadImg", "ImgPath", "", "")
@@ -69,6 +90,19 @@ class Config(QConfig):
     yolo_img_path = ConfigItem("Yolo", "ImagePath", "", "")
     yolo_onnx_path = ConfigItem("Yolo", "OnnxPath", "", "")
     yolo_output_path = ConfigItem("Yolo", "OutputPath", "", "")
+    yolo_batch_size = ConfigItem("Yolo", "BatchSize", 8, RangeValidator(1, 64))
+    yolo_intra_threads = ConfigItem("Yolo", "IntraThreads", 0, RangeValidator(0, 64))
+    yolo_inter_threads = ConfigItem("Yolo", "InterThreads", 0, RangeValidator(0, 64))
+    yolo_processes = ConfigItem("Yolo", "Processes", 1, RangeValidator(1, 64))
+    # 识别结果导出格式: 不导出 / CSV / Parquet
+    yolo_export_format = ConfigItem("Yolo", "ExportFormat", "不导出")
+    # 推理会话设置
+    yolo_graph_optimization = ConfigItem("Yolo", "GraphOptimization", "全部")
+    yolo_execution_mode = ConfigItem("Yolo", "ExecutionMode", "顺序")
+    yolo_cache_optimized = ConfigItem("Yolo", "CacheOptimized", False, BoolValidator())
+    # INT8 量化
+    yolo_quant_mode = ConfigItem("Yolo", "QuantMode", "动态")
+    yolo_sample_path = ConfigItem("Yolo", "SamplePath", "", "")
 
     # 删除行
     deleteRow_excel_path = ConfigItem("DeleteRow", "ExcelPath", "", "")
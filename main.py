@@ -1,5 +1,11 @@
+import multiprocessing
 import sys
+import time
 
+# 启动耗时从导入 Qt 之前开始计算
+STARTED = time.perf_counter()
+
+from loguru import logger
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QApplication
@@ -7,25 +13,175 @@ from qfluentwidgets import FluentIcon as FIF
 from qfluentwidgets import FluentWindow, NavigationItemPosition
 
 from common import resource
-from view.interface.deleterow import DeleteRowInterface
-from view.interface.exportemptyrow import ExportEmptyRowInterface
-from view.interface.fiximgsuffix import FixImageSuffixInterface
-from view.interface.formatExcel import FormatExcelInterface
-from view.interface.imagesdownload import ImagesDownloadInterface
-from view.interface.imgformattrans import ImgFormatTransInterface
-from view.interface.incrementaldatas import IncrementalDatasInterface
-from view.interface.jdtbauto import JdTBbAutoInterface
-from view.interface.mergedexcelFiles import MergedExcelFilesInterface
-from view.interface.mitmproxysearch import MitmProxySearchInterface
-from view.interface.recheck import ReCheckInterface
-from view.interface.savetodatabase import SaveToDatabaseInterface
-from view.interface.searchjdcert import SearchJdCertInterface
-from view.interface.searchval import SearchValInterface
+from view.components.lazy_interface import LazyInterface, load_report
 from view.interface.setting import SettingInterface
-from view.interface.statistics import StatisticsInterface
-from view.interface.updatecert import UpdateCertInterface
-from view.interface.writeexcel import WriteExcelInterface
-from view.interface.yoloinference import YoloInterface
+
+# 导航栏中的界面: (属性名, 模块, 类名, objectName, 图标, 标题)
+# 第一次点击时才导入模块并创建界面
+INTERFACES = [
+    # 通过 MitmProxy 代理搜索
+    (
+        "mitmProxySearch_interface",
+        "view.interface.mitmproxysearch",
+        "MitmProxySearchInterface",
+        "MitmProxySearchInterface",
+        FIF.SEARCH,
+        "通过 MitmProxy 代理搜索",
+    ),
+    # 京东淘宝自动化
+    (
+        "jdtb_interface",
+        "view.interface.jdtbauto",
+        "JdTBbAutoInterface",
+        "JdTBbAutoInterface",
+        FIF.PEOPLE,
+        "京东淘宝自动化",
+    ),
+    # 图片下载
+    (
+        "imgd_interface",
+        "view.interface.imagesdownload",
+        "ImagesDownloadInterface",
+        "ImagesDownloadInterface",
+        FIF.SEARCH,
+        "图片下载",
+    ),
+    # 图片格式转换
+    (
+        "imgFormatTrans_interface",
+        "view.interface.imgformattrans",
+        "ImgFormatTransInterface",
+        "ImgFormatTransInterface",
+        FIF.EDUCATION,
+        "图片格式转换",
+    ),
+    # 通过 yolo 识别药品
+    (
+        "yoloinference_interface",
+        "view.interface.yoloinference",
+        "YoloInterface",
+        "YoloInterface",
+        FIF.CAMERA,
+        "通过 yolo 识别药品",
+    ),
+    # 删除行
+    (
+        "deleteRowInterface",
+        "view.interface.deleterow",
+        "DeleteRowInterface",
+        "DeleteRowInterface",
+        FIF.DELETE,
+        "删除行",
+    ),
+    # 从数据库查询资质写入 Excel
+    (
+        "writeExcelInterface",
+        "view.interface.writeexcel",
+        "WriteExcelInterface",
+        "WriteExcelInterface",
+        FIF.IMAGE_EXPORT,
+        "从数据库查询资质写入 Excel",
+    ),
+    # 格式化
+    (
+        "formatExcelInterface",
+        "view.interface.formatExcel",
+        "FormatExcelInterface",
+        "FormatExcelInterface",
+        FIF.CAR,
+        "格式化",
+    ),
+    # 保存 Excel 内容到数据库
+    (
+        "saveToDatabaseInterface",
+        "view.interface.savetodatabase",
+        "SaveToDatabaseInterface",
+        "SaveToDatabaseInterface",
+        FIF.DICTIONARY,
+        "保存 Excel 内容到数据库",
+    ),
+    # 统计数据
+    (
+        "statisticsInterface",
+        "view.interface.statistics",
+        "StatisticsInterface",
+        "StatisticsInterface",
+        FIF.AIRPLANE,
+        "统计数据",
+    ),
+    # 统计新增加的数据
+    (
+        "incrementalDatasInterface",
+        "view.interface.incrementaldatas",
+        "IncrementalDatasInterface",
+        "IncrementalDatasInterface",
+        FIF.AIRPLANE,
+        "统计新增加的数据",
+    ),
+    # 查找值
+    (
+        "searchValInterface",
+        "view.interface.searchval",
+        "SearchValInterface",
+        "SearchValInterface",
+        FIF.SEARCH,
+        "查找值",
+    ),
+    # 更新数据库的资质名称
+    (
+        "updateCertInterface",
+        "view.interface.updatecert",
+        "UpdateCertInterface",
+        "UpdateCertInterface",
+        FIF.IMAGE_EXPORT,
+        "更新数据库的资质名称",
+    ),
+    # 修正图片后缀名
+    (
+        "fixImageSuffixInterface",
+        "view.interface.fiximgsuffix",
+        "FixImageSuffixInterface",
+        "FixImageSuffixInterface",
+        FIF.SETTING,
+        "修正图片后缀名",
+    ),
+    # 合并 Excel 文件
+    (
+        "mergedExcelFilesInterface",
+        "view.interface.mergedexcelFiles",
+        "MergedExcelFilesInterface",
+        "MergedExcelFilesInterface",
+        FIF.IMAGE_EXPORT,
+        "合并 Excel 文件",
+    ),
+    # 复查数据
+    (
+        "reCheckInterface",
+        "view.interface.recheck",
+        "ReCheckInterface",
+        "ReCheckInterface",
+        FIF.IMAGE_EXPORT,
+        "复查数据",
+    ),
+    # 查找京东的资质名称
+    (
+        "searchJdCertInterface",
+        "view.interface.searchjdcert",
+        "SearchJdCertInterface",
+        "searchJdCertInterface",
+        FIF.IMAGE_EXPORT,
+        "查找京东的资质名称",
+    ),
+    # 导出资质名称为空的行数
+    (
+        "exportEmptyRowInterface",
+        "view.interface.exportemptyrow",
+        "ExportEmptyRowInterface",
+        "ExportEmptyRowInterface",
+        FIF.IMAGE_EXPORT,
+        "导出资质名称为空的行数",
+    ),
+]
 
 
 class MainWindow(FluentWindow):
@@ -33,67 +189,12 @@ class MainWindow(FluentWindow):
         super().__init__()
         self.initWindow()
 
-        # 创建子项目
-
-        # 通过 MitmProxy 代理搜索
-        self.mitmProxySearch_interface = MitmProxySearchInterface(self)
-
-        # 京东淘宝自动化
-        self.jdtb_interface = JdTBbAutoInterface(self)
-
-        # 图片下载
-        self.imgd_interface = ImagesDownloadInterface(self)
-
-        # 图片格式转换
-        self.imgFormatTrans_interface = ImgFormatTransInterface(self)
-
-        # 通过 yolo 识别药品
-        self.yoloinference_interface = YoloInterface(self)
-
-        # 删除行
-        self.deleteRowInterface = DeleteRowInterface(self)
-
-        # 从数据库查询资质写入 Excel
-        self.writeExcelInterface = WriteExcelInterface(self)
-
-        # 格式化
-        self.formatExcelInterface = FormatExcelInterface(self)
-
-        # 保存 Excel 内容到数据库
-        self.saveToDatabaseInterface = SaveToDatabaseInterface(self)
-
-        # 统计数据
-        self.statisticsInterface = StatisticsInterface(self)
-
-        # 统计新增加的数据
-        self.incrementalDatasInterface = IncrementalDatasInterface(self)
-
-        # 查找值
-        self.searchValInterface = SearchValInterface(self)
-
-        # 导出资质空白的行
-        self.exportEmptyRowInterface = None
-
-        # 京东资质查询
-        self.jdCertInterface = None
-
-        # 更新数据库的资质名称
-        self.updateCertInterface = UpdateCertInterface(self)
-
-        # 修正图片后缀名
-        self.fixImageSuffixInterface = FixImageSuffixInterface(self)
-
-        # 合并 Excel 文件
-        self.mergedExcelFilesInterface = MergedExcelFilesInterface(self)
-
-        # 复查数据
-        self.reCheckInterface = ReCheckInterface(self)
-
-        # 查找京东的资质名称
-        self.searchJdCertInterface = SearchJdCertInterface()
-
-        # 导出资质名称为空的行数
-        self.exportEmptyRowInterface = ExportEmptyRowInterface(self)
+        # 创建子项目的占位界面, 真正的界面在第一次切换过去时创建
+        self.lazyInterfaces: list[LazyInterface] = []
+        for attr, module, class_name, object_name, _, _ in INTERFACES:
+            interface = LazyInterface(module, class_name, object_name, self)
+            setattr(self, attr, interface)
+            self.lazyInterfaces.append(interface)
 
         # 设置
         self.settingInterface = SettingInterface(self)
@@ -117,86 +218,10 @@ class MainWindow(FluentWindow):
     def initNavigation(self):
         pos = NavigationItemPosition.SCROLL
 
-        self.addSubInterface(
-            self.mitmProxySearch_interface,
-            FIF.SEARCH,
-            "通过 MitmProxy 代理搜索",
-            position=pos,
-        )
-
-        self.addSubInterface(
-            self.jdtb_interface, FIF.PEOPLE, "京东淘宝自动化", position=pos
-        )
-        self.addSubInterface(self.imgd_interface, FIF.SEARCH, "图片下载", position=pos)
-        self.addSubInterface(
-            self.imgFormatTrans_interface, FIF.EDUCATION, "图片格式转换", position=pos
-        )
-        self.addSubInterface(
-            self.yoloinference_interface, FIF.CAMERA, "通过 yolo 识别药品", position=pos
-        )
-        self.addSubInterface(
-            self.deleteRowInterface, FIF.DELETE, "删除行", position=pos
-        )
-        self.addSubInterface(
-            self.writeExcelInterface,
-            FIF.IMAGE_EXPORT,
-            "从数据库查询资质写入 Excel",
-            position=pos,
-        )
-        self.addSubInterface(self.formatExcelInterface, FIF.CAR, "格式化", position=pos)
-        self.addSubInterface(
-            self.saveToDatabaseInterface,
-            FIF.DICTIONARY,
-            "保存 Excel 内容到数据库",
-            position=pos,
-        )
-        self.addSubInterface(
-            self.statisticsInterface, FIF.AIRPLANE, "统计数据", position=pos
-        )
-        self.addSubInterface(
-            self.incrementalDatasInterface,
-            FIF.AIRPLANE,
-            "统计新增加的数据",
-            position=pos,
-        )
-        self.addSubInterface(
-            self.searchValInterface, FIF.SEARCH, "查找值", position=pos
-        )
-
-        self.addSubInterface(
-            self.updateCertInterface,
-            FIF.IMAGE_EXPORT,
-            "更新数据库的资质名称",
-            position=pos,
-        )
-        self.addSubInterface(
-            self.fixImageSuffixInterface, FIF.SETTING, "修正图片后缀名", position=pos
-        )
-
-        self.addSubInterface(
-            self.mergedExcelFilesInterface,
-            FIF.IMAGE_EXPORT,
-            "合并 Excel 文件",
-            position=pos,
-        )
-
-        self.addSubInterface(
-            self.reCheckInterface, FIF.IMAGE_EXPORT, "复查数据", position=pos
-        )
-
-        self.addSubInterface(
-            self.searchJdCertInterface,
-            FIF.IMAGE_EXPORT,
-            "查找京东的资质名称",
-            position=pos,
-        )
-
-        self.addSubInterface(
-            self.exportEmptyRowInterface,
-            FIF.IMAGE_EXPORT,
-            "导出资质名称为空的行数",
-            position=pos,
-        )
+        for interface, (_, _, _, _, icon, text) in zip(
+            self.lazyInterfaces, INTERFACES
+        ):
+            self.addSubInterface(interface, icon, text, position=pos)
 
         self.addSubInterface(
             self.settingInterface, FIF.SETTING, "设置", NavigationItemPosition.BOTTOM
@@ -207,14 +232,33 @@ class MainWindow(FluentWindow):
         self.navigationInterface.expand(useAni=False)
 
 
+def startup_report(w: MainWindow):
+    """
+    依次加载所有界面, 输出每个界面的导入和创建耗时
+
+    用法: python main.py --startup-report
+    """
+    for interface in w.lazyInterfaces:
+        interface.load()
+
+    print("\n".join(load_report()))
+
+
 def main():
     app = QApplication(sys.argv)
 
     w = MainWindow()
     w.show()
 
+    logger.info(f"启动耗时: {time.perf_counter() - STARTED:.3f}s")
+
+    if "--startup-report" in sys.argv:
+        startup_report(w)
+
     app.exec()
 
 
 if __name__ == "__main__":
+    # 打包后多进程推理需要
+    multiprocessing.freeze_support()
     main()
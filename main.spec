@@ -1,4 +1,5 @@
 # -*- mode: python ; coding: utf-8 -*-
+from PyInstaller.utils.hooks import collect_submodules
 
 
 a = Analysis(
@@ -6,7 +7,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('data/lys_config.json', 'data'), ('resources/images/logo.png', 'resources/images')],
-    hiddenimports=[],
+    # 界面在第一次点击时通过 importlib 导入, 需要显式打包
+    hiddenimports=collect_submodules('view.interface'),
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
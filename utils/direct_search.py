@@ -0,0 +1,318 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+from utils.pacing import AdaptivePacer
+
+# 淘宝 H5 接口
+TAOBAO_API = "https://h5api.m.taobao.com/h5/mtop.relationrecommend.wirelessrecommend.recommend/2.0/"
+TAOBAO_APP_KEY = "12574478"
+
+# 京东搜索页面
+JD_SEARCH_URL = "https://search.jd.com/Search"
+
+# 京东滑动到底部时加载后 30 个商品的接口
+JD_XHR_URL = "https://api.m.jd.com/"
+
+# 淘宝接口返回这些错误时需要在浏览器中验证
+TAOBAO_CAPTCHA_ERRORS = ("RGV587_ERROR", "FAIL_SYS_USER_VALIDATE")
+
+# 淘宝的 token 过期或者不存在, 服务端会同时下发新的 _m_h5_tk
+TAOBAO_TOKEN_ERRORS = (
+    "FAIL_SYS_TOKEN_EXOIRED",
+    "FAIL_SYS_TOKEN_EMPTY",
+    "FAIL_SYS_ILLEGAL_ACCESS",
+)
+
+# 京东需要验证时会跳转到这些页面
+JD_CAPTCHA_HOSTS = ("cfe.m.jd.com", "passport.jd.com", "safe.jd.com")
+
+
+class CaptchaRequired(Exception):
+    """接口要求验证, 需要回退到浏览器"""
+
+
+def mtop_sign(token: str, t: str, app_key: str, data: str) -> str:
+    """淘宝 mtop 接口的签名: md5(token&t&appKey&data)"""
+    return hashlib.md5(f"{token}&{t}&{app_key}&{data}".encode("utf-8")).hexdigest()
+
+
+def browser_cookies(tab) -> httpx.Cookies:
+    """从已登录的浏览器中读取所有域名的 cookie"""
+    cookies = httpx.Cookies()
+
+    for cookie in tab.cookies(all_domains=True, all_info=True):
+        cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+        )
+
+    return cookies
+
+
+class DirectSearchClient:
+    """
+    使用浏览器的 cookie 直接请求淘宝、京东的搜索接口
+
+    不打开页面、不滑动, 返回的内容与浏览器中监听到的一致, 可以直接交给 TB.parse / JD.parse_search 解析,
+    遇到验证码时抛出 CaptchaRequired, 由调用方回退到浏览器
+
+    多个标签页的线程共用一个实例, 底层是同一个连接池
+    """
+
+    def __init__(self, tab, timeout: float = 15.0):
+        """
+        Args:
+            tab: 已登录淘宝、京东的标签页, 用于读取 cookie 和 User-Agent
+        """
+        self.lock = threading.Lock()
+
+        self.client = httpx.Client(
+            http2=True,
+            headers={"User-Agent": tab.user_agent},
+            cookies=browser_cookies(tab),
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+        )
+
+    def refresh_cookies(self, tab) -> None:
+        """在浏览器中完成验证后, 重新读取 cookie"""
+        with self.lock:
+            self.client.cookies.update(browser_cookies(tab))
+
+    def taobao_token(self) -> str:
+        """_m_h5_tk 的第一部分即签名用的 token"""
+        with self.lock:
+            for cookie in self.client.cookies.jar:
+                if cookie.name == "_m_h5_tk":
+                    return cookie.value.split("_")[0]
+
+        return ""
+
+    def taobao_search(self, keyword: str, page: int) -> tuple[str, int]:
+        """
+        请求淘宝搜索接口的一页
+
+        Returns:
+            tuple: (jsonp 格式的响应, 商品数)
+        """
+        params = {
+            "appId": "34385",
+            "params": json.dumps(
+                {
+                    "device": "HMA-AL00",
+                    "isBeta": "false",
+                    "grayHair": "false",
+                    "from": "nt_history",
+                    "brand": "HUAWEI",
+                    "info": "wifi",
+                    "index": "4",
+                    "rainbow": "",
+                    "schemaType": "auction",
+                    "elderHome": "false",
+                    "isEnterSrpSearch": "true",
+                    "newSearch": "false",
+                    "network": "wifi",
+                    "subtype": "",
+                    "hasPreposeFilter": "false",
+                    "prepositionVersion": "v2",
+                    "client_os": "Android",
+                    "gpsEnabled": "false",
+                    "searchDoorFrom": "srp",
+                    "debug_rerankNewOpenCard": "false",
+                    "homePageVersion": "v7",
+                    "searchElderHomeOpen": "false",
+                    "search_action": "initiative",
+                    "sugg": "_4_1",
+                    "sversion": "13.6",
+                    "style": "list",
+                    "ttid": "600000@taobao_pc_10.7.0",
+                    "needTabs": "true",
+                    "areaCode": "CN",
+                    "vm": "nw",
+                    "countryNum": "156",
+                    "m": "pc",
+                    "page": page,
+                    "n": 48,
+                    "q": keyword,
+                    "qSource": "url",
+                    "pageSource": "a21bo.jianhua/a.201856.d13",
+                    "tab": "all",
+                    "pageSize": 48,
+                    "sourceS": str((page - 1) * 48),
+                    "sort": "_coefp",
+                },
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ),
+        }
+        data = json.dumps(params, ensure_ascii=False, separators=(",", ":"))
+
+        # token 过期时服务端会下发新的 cookie, 用新 token 重试一次
+        for _ in range(2):
+            t = str(int(time.time() * 1000))
+
+            response = self.client.get(
+                TAOBAO_API,
+                params={
+                    "jsv": "2.7.2",
+                    "appKey": TAOBAO_APP_KEY,
+                    "t": t,
+                    "sign": mtop_sign(self.taobao_token(), t, TAOBAO_APP_KEY, data),
+                    "api": "mtop.relationrecommend.wirelessrecommend.recommend",
+                    "v": "2.0",
+                    "type": "jsonp",
+                    "dataType": "jsonp",
+                    "callback": "mtopjsonp1",
+                    "data": data,
+                },
+                headers={"Referer": "https://s.taobao.com/"},
+            )
+            response.raise_for_status()
+
+            text = response.text
+
+            # 风控、登录页面是 html, 不是 jsonp, 同样需要回退到浏览器
+            try:
+                res = json.loads(
+                    re.sub(r"^\s*mtopjsonp\d+\(", "", text).rstrip()[:-1]
+                )
+            except json.JSONDecodeError:
+                raise CaptchaRequired(f"淘宝接口返回的不是 jsonp: {text[:100]}")
+
+            ret = "".join(res.get("ret", []))
+
+            if any(error in ret for error in TAOBAO_CAPTCHA_ERRORS):
+                raise CaptchaRequired(ret)
+
+            if any(error in ret for error in TAOBAO_TOKEN_ERRORS):
+                logger.info(f"淘宝 token 失效, 重新签名: {ret}")
+                continue
+
+            if "SUCCESS" not in ret:
+                raise RuntimeError(f"淘宝接口返回错误: {ret}")
+
+            items = (res.get("data") or {}).get("itemsArray")
+            if items is None:
+                raise CaptchaRequired(f"淘宝接口没有返回商品列表: {ret}")
+
+            return text, len(items)
+
+        raise CaptchaRequired("淘宝 token 一直失效")
+
+    def jd_search(self, keyword: str, page: int) -> tuple[str, int]:
+        """
+        请求京东搜索页面的一页
+
+        京东的第 n 页对应 page=2n-1, 包含前 30 个商品, 后 30 个商品用 jd_search_more 请求
+
+        Returns:
+            tuple: (搜索页面的 html, 商品数)
+        """
+        response = self.client.get(
+            JD_SEARCH_URL,
+            params={
+                "keyword": keyword,
+                "enc": "utf-8",
+                "page": 2 * page - 1,
+                "s": (page - 1) * 60 + 1,
+                "click": 0,
+            },
+            headers={"Referer": "https://search.jd.com/"},
+        )
+
+        if response.url.host in JD_CAPTCHA_HOSTS:
+            raise CaptchaRequired(str(response.url))
+
+        response.raise_for_status()
+
+        text = response.text
+        return text, text.count("data-sku=")
+
+    def jd_search_more(self, keyword: str, page: int) -> tuple[str, int]:
+        """
+        请求京东搜索第 n 页的后 30 个商品, 即浏览器中滑动到底部时的 pc_search_s_new 接口
+
+        对应 page=2n, s=(n-1)*60+31
+
+        Returns:
+            tuple: (商品列表的 html 片段, 商品数)
+        """
+        body = {
+            "keyword": keyword,
+            "enc": "utf-8",
+            "page": 2 * page,
+            "s": (page - 1) * 60 + 31,
+            "scrolling": "y",
+        }
+        response = self.client.get(
+            JD_XHR_URL,
+            params={
+                "appid": "search-pc-java",
+                "functionId": "pc_search_s_new",
+                "client": "pc",
+                "clientVersion": "1.0.0",
+                "body": json.dumps(body, ensure_ascii=False, separators=(",", ":")),
+            },
+            headers={
+                "Referer": "https://search.jd.com/",
+                "Origin": "https://search.jd.com",
+            },
+        )
+
+        if response.url.host in JD_CAPTCHA_HOSTS:
+            raise CaptchaRequired(str(response.url))
+
+        response.raise_for_status()
+
+        text = response.text
+        return text, text.count("data-sku=")
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def fetch_pages(
+    fetch, keyword: str, max_pages: int, pacer: Optional[AdaptivePacer] = None
+):
+    """
+    逐页请求, 直到没有商品或者达到最大页数
+
+    Args:
+        fetch: DirectSearchClient.taobao_search 或者 jd_search
+        pacer: AdaptivePacer, 记录每页的延迟和验证码, 并控制每页之间的间隔
+
+    Yields:
+        str: 每一页的响应
+    """
+    for page in range(1, max_pages + 1):
+        if pacer is not None:
+            pacer.record_request()
+
+        start = time.monotonic()
+        try:
+            text, count = fetch(keyword, page)
+        except CaptchaRequired:
+            if pacer is not None:
+                pacer.record_captcha()
+            raise
+
+        if pacer is not None:
+            pacer.record_latency(time.monotonic() - start)
+
+        if not count:
+            return
+
+        yield text
+
+        if pacer is not None and page < max_pages:
+            pacer.sleep()
@@ -0,0 +1,487 @@
+import asyncio
+import hashlib
+import random
+import re
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from loguru import logger
+
+# 各图片 CDN 的并发上限: {域名后缀: 并发数}
+HOST_LIMITS = {
+    "alicdn.com": 16,  # 淘宝天猫、饿了么
+    "360buyimg.com": 16,  # 京东
+    "pddpic.com": 12,  # 拼多多
+    "yangkeduo.com": 8,  # 拼多多
+    "meituan.net": 12,  # 美团
+}
+
+# 其他域名的并发上限
+DEFAULT_HOST_LIMIT = 6
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
+}
+
+
+class DownloadTask(NamedTuple):
+    """一张待下载的图片"""
+
+    url: str
+    filename: Path
+    uuid: str
+
+
+class DownloadResult(NamedTuple):
+    """下载结果"""
+
+    size: int
+    sha256: str
+    attempts: int
+    cached: bool = False
+
+
+class DownloadError(Exception):
+    """重试多次后仍然下载失败"""
+
+    def __init__(self, error: Exception, attempts: int):
+        super().__init__(f"{error} (重试 {attempts} 次)")
+        self.error = error
+        self.attempts = attempts
+
+
+def is_retryable(e: Exception) -> bool:
+    """网络错误、限流和服务端错误可以重试, 404 等客户端错误不重试"""
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return status == 429 or status >= 500
+
+    return isinstance(e, (httpx.TransportError, httpx.DecodingError))
+
+
+def host_key(url: str) -> str:
+    """图片 url 对应的限流分组, 已知的 CDN 按域名后缀分组, 其他按域名分组"""
+    host = urlsplit(url).hostname or ""
+
+    for suffix in HOST_LIMITS:
+        if host == suffix or host.endswith(f".{suffix}"):
+            return suffix
+
+    return host
+
+
+# CDN 的缩放、格式转换后缀, 如 xxx.jpg_360x360q90.jpg_.webp, xxx.jpg!q70.dpg.webp, xxx.jpg@120w_120h
+RESIZE_SUFFIX_PATTERNS = [
+    re.compile(r"(\.(?:jpe?g|png|webp|gif|avif))_.*$", re.IGNORECASE),
+    re.compile(r"(\.(?:jpe?g|png|webp|gif|avif))[!@].*$", re.IGNORECASE),
+    re.compile(r"(\.(?:jpe?g|png|gif))\.(?:webp|avif)$", re.IGNORECASE),
+]
+
+# 京东图片路径中的尺寸, 如 /n7/s300x300_jfs/
+JD_SIZE_PATTERN = re.compile(r"/n\d+/(?:s\d+x\d+_)?jfs/")
+
+# Linux 的 FICLONE ioctl, 在 btrfs、xfs 等文件系统上创建写时复制的副本
+FICLONE = 0x40049409
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化图片 url, 同一张图片的不同尺寸、格式得到相同的 url
+
+    只处理已知的 CDN, 其他 url 只统一协议和域名大小写
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    path = parts.path
+
+    if host_key(url) not in HOST_LIMITS:
+        return urlunsplit(("https", host, path, parts.query, ""))
+
+    # 京东的 img10、img14 等是同一个图床的不同分片
+    host = re.sub(r"^img\d+\.", "img.", host)
+
+    path = JD_SIZE_PATTERN.sub("/n1/jfs/", path)
+    for pattern in RESIZE_SUFFIX_PATTERNS:
+        path = pattern.sub(r"\1", path)
+
+    # CDN 的查询参数只是缩放、裁剪参数
+    return urlunsplit(("https", host, path, "", ""))
+
+
+class BlobCache:
+    """
+    按内容寻址的图片缓存
+
+    图片按 sha256 保存在 <root>/.img_cache 中, 同时记录规范化 url 对应的 sha256,
+    每个 uuid 的图片文件都是缓存文件的写时复制副本 (不支持时复制),
+    不能用硬链接, 否则原地修改一张图片会同时改掉缓存和其他 uuid 的图片
+    """
+
+    DIRNAME = ".img_cache"
+
+    def __init__(self, root_dir: Path):
+        self.cache_dir = root_dir / self.DIRNAME
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.cache_dir / "index.db")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL)"
+        )
+
+        # 命中统计
+        self.url_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+
+    def blob_path(self, sha256: str) -> Path:
+        # 缓存文件不带后缀, 避免被图片处理工具扫描到
+        return self.cache_dir / sha256[:2] / sha256
+
+    def lookup(self, url: str) -> Optional[tuple[Path, str]]:
+        """
+        根据 url 查找缓存
+
+        Returns:
+            tuple: (缓存文件, sha256), 没有缓存时返回 None
+        """
+        row = self.conn.execute(
+            "SELECT sha256 FROM urls WHERE url = ?", (normalize_url(url),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        blob = self.blob_path(row[0])
+        if not blob.exists() or blob.stat().st_size == 0:
+            return None
+
+        return blob, row[0]
+
+    def store(self, tmp: Path, url: str, sha256: str) -> Path:
+        """把下载好的临时文件放进缓存, 内容相同的图片只保留一份"""
+        blob = self.blob_path(sha256)
+
+        if blob.exists():
+            self.content_hits += 1
+            tmp.unlink(missing_ok=True)
+        else:
+            self.misses += 1
+            blob.parent.mkdir(exist_ok=True)
+            tmp.replace(blob)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?)",
+                (normalize_url(url), sha256),
+            )
+
+        return blob
+
+    @staticmethod
+    def reflink(blob: Path, target: Path) -> bool:
+        """
+        创建写时复制的副本, 不复制数据块
+
+        Returns:
+            bool: 文件系统不支持时返回 False
+        """
+        try:
+            import fcntl
+        except ImportError:
+            return False
+
+        with open(blob, "rb") as src, open(target, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                return False
+
+        return True
+
+    @classmethod
+    def link(cls, blob: Path, target: Path) -> None:
+        """把缓存文件复制到目标路径, 优先使用写时复制"""
+        target.unlink(missing_ok=True)
+
+        if not cls.reflink(blob, target):
+            shutil.copyfile(blob, target)
+
+    def hit_rate(self) -> float:
+        total = self.url_hits + self.content_hits + self.misses
+        return (self.url_hits + self.content_hits) / total if total else 0.0
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class AsyncImageDownloader:
+    """
+    异步图片下载器
+
+    所有 Excel 文件的图片放进同一个队列, 由固定数量的协程下载,
+    使用 HTTP/2 和连接池复用连接, 按 CDN 域名限制并发, 响应分块写入磁盘
+    """
+
+    def __init__(
+        self,
+        on_success: Optional[Callable[[DownloadTask, DownloadResult], None]] = None,
+        on_failure: Optional[Callable[[DownloadTask, DownloadError], None]] = None,
+        workers: int = 64,
+        queue_size: int = 1000,
+        chunk_size: int = 64 * 1024,
+        host_limits: Optional[Dict[str, int]] = None,
+        retries: int = 3,
+        backoff: float = 1.0,
+        cache: Optional[BlobCache] = None,
+    ):
+        """
+        Args:
+            on_success: 下载成功的回调
+            on_failure: 下载失败的回调
+            workers: 下载协程数量
+            queue_size: 队列上限, 队列满时 put 会等待
+            chunk_size: 每次写入磁盘的块大小
+            host_limits: 各域名的并发上限, 默认使用 HOST_LIMITS
+            retries: 失败后最多重试几次
+            backoff: 第一次重试前等待的秒数, 之后每次翻倍
+            cache: 图片缓存, 为 None 时不使用缓存
+        """
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.host_limits = host_limits or HOST_LIMITS
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+
+        self.queue: asyncio.Queue[DownloadTask] = asyncio.Queue(maxsize=queue_size)
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.tasks: list[asyncio.Task] = []
+
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "AsyncImageDownloader":
+        self.client = httpx.AsyncClient(
+            http2=True,
+            headers=HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=self.workers,
+                max_keepalive_connections=self.workers,
+                keepalive_expiry=30.0,
+            ),
+        )
+
+        self.tasks = [
+            asyncio.create_task(self.worker()) for _ in range(self.workers)
+        ]
+
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        # 正常结束时等待队列中的图片全部下载完成
+        if exc_type is None:
+            await self.queue.join()
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        await self.client.aclose()
+
+    async def put(self, task: DownloadTask) -> None:
+        """添加下载任务, 队列满时等待"""
+        await self.queue.put(task)
+
+    def semaphore(self, url: str) -> asyncio.Semaphore:
+        key = host_key(url)
+
+        semaphore = self.semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(
+                self.host_limits.get(key, DEFAULT_HOST_LIMIT)
+            )
+            self.semaphores[key] = semaphore
+
+        return semaphore
+
+    async def download(self, task: DownloadTask) -> tuple[int, str]:
+        """
+        下载图片, 先写入临时文件, 完成后再重命名
+
+        Returns:
+            tuple: (文件大小, sha256)
+        """
+        tmp = task.filename.with_name(f"{task.filename.name}.part")
+        sha256 = hashlib.sha256()
+        size = 0
+
+        try:
+            async with self.semaphore(task.url):
+                async with self.client.stream("GET", task.url) as res:
+                    res.raise_for_status()
+
+                    with open(tmp, mode="wb") as f:
+                        async for chunk in res.aiter_bytes(self.chunk_size):
+                            f.write(chunk)
+                            sha256.update(chunk)
+                            size += len(chunk)
+
+            if size == 0:
+                raise httpx.DecodingError("图片内容为空")
+
+            if self.cache is None:
+                tmp.replace(task.filename)
+            else:
+                blob = self.cache.store(tmp, task.url, sha256.hexdigest())
+                self.cache.link(blob, task.filename)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        return size, sha256.hexdigest()
+
+    async def download_with_retry(self, task: DownloadTask) -> DownloadResult:
+        """下载图片, 优先使用缓存, 失败时按指数退避重试"""
+        if self.cache is not None:
+            cached = self.cache.lookup(task.url)
+            if cached is not None:
+                blob, sha256 = cached
+                self.cache.link(blob, task.filename)
+                self.cache.url_hits += 1
+                return DownloadResult(blob.stat().st_size, sha256, 0, cached=True)
+
+        attempts = 0
+
+        while True:
+            attempts += 1
+
+            try:
+                size, sha256 = await self.download(task)
+                return DownloadResult(size, sha256, attempts)
+            except Exception as e:
+                if attempts > self.retries or not is_retryable(e):
+                    raise DownloadError(e, attempts) from e
+
+                # 指数退避, 加上随机抖动避免同时重试
+                delay = self.backoff * 2 ** (attempts - 1)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def worker(self) -> None:
+        while True:
+            task = await self.queue.get()
+
+            try:
+                result = await self.download_with_retry(task)
+
+                if self.on_success is not None:
+                    self.on_success(task, result)
+            except DownloadError as e:
+                logger.error(f"下载失败: {task.filename.stem} {task.url} {e}")
+
+                if self.on_failure is not None:
+                    self.on_failure(task, e)
+            finally:
+                self.queue.task_done()
+
+
+class DownloadManifest:
+    """
+    图片下载清单
+
+    保存在输出目录的 download_manifest.db 中, 记录每张图片的下载状态,
+    再次运行时可以只重新下载失败或者大小为 0 的图片
+    """
+
+    FILENAME = "download_manifest.db"
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = root_dir
+
+        self.conn = sqlite3.connect(root_dir / self.FILENAME)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                filename TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                uuid TEXT,
+                status TEXT NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                sha256 TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL
+            )
+            """
+        )
+
+    def record(
+        self,
+        task: DownloadTask,
+        status: str,
+        size: int = 0,
+        sha256: Optional[str] = None,
+        attempts: int = 0,
+        error: Optional[str] = None,
+    ) -> None:
+        """记录一张图片的下载结果, 尝试次数累加"""
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO images
+                    (filename, url, uuid, status, size, sha256, attempts, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    url = excluded.url,
+                    uuid = excluded.uuid,
+                    status = excluded.status,
+                    size = excluded.size,
+                    sha256 = excluded.sha256,
+                    attempts = images.attempts + excluded.attempts,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    task.filename.relative_to(self.root_dir).as_posix(),
+                    task.url,
+                    task.uuid,
+                    status,
+                    size,
+                    sha256,
+                    attempts,
+                    error,
+                    time.time(),
+                ),
+            )
+
+    def record_success(self, task: DownloadTask, result: DownloadResult) -> None:
+        self.record(task, "ok", result.size, result.sha256, result.attempts)
+
+    def record_failure(self, task: DownloadTask, e: DownloadError) -> None:
+        self.record(task, "failed", attempts=e.attempts, error=str(e.error))
+
+    def pending(self) -> list[DownloadTask]:
+        """下载失败、大小为 0 或者文件已被删除的图片"""
+        tasks = []
+
+        for filename, url, uuid, status, size in self.conn.execute(
+            "SELECT filename, url, uuid, status, size FROM images"
+        ):
+            path = self.root_dir / filename
+
+            if status == "ok" and size > 0 and path.exists() and path.stat().st_size:
+                continue
+
+            tasks.append(DownloadTask(url, path, uuid))
+
+        return tasks
+
+    def close(self) -> None:
+        self.conn.close()
@@ -1,226 +1,177 @@
 import random
 import time
 from pathlib import Path
+from typing import Optional
 
 from DrissionPage import Chromium
 from DrissionPage.common import Keys
-from lxml import etree
 from PySide6.QtCore import Signal
 
-import shortuuid
-from utils.medicineID import MEDICINE_ID
+from utils.direct_search import CaptchaRequired, DirectSearchClient, fetch_pages
+from utils.pacing import AdaptivePacer
+from utils.parsers import PARSERS, ParseContext
 from utils.save import Save
+from utils.wait import Waiter
+
+# 京东安全验证页面的元素
+CAPTCHA_LOCATORS = ["text:验证一下，购物无忧", "text:快速验证"]
 
 
 class JD:
     logInfo = Signal(str)
 
-    def __init__(self, save_dir: Path):
-        self.medicine_name = None
-        self.brand_name = None
+    def __init__(
+        self,
+        save_dir: Path,
+        waiter: Optional[Waiter] = None,
+        tab=None,
+        pacer: Optional[AdaptivePacer] = None,
+    ):
+        """
+        Args:
+            waiter: 等待验证码等使用的 Waiter, 多个实例共用时统计合并在一起
+            tab: 使用的标签页, 多个标签页同时搜索时每个实例使用自己的标签页,
+                默认使用浏览器最新的标签页
+            pacer: 滑动、翻页的间隔, 多个标签页共用时根据整体的延迟和验证码调整
+        """
         self.keyword = None
         self.save_dir = save_dir
 
         self.save = Save()
 
-        self.bro = Chromium()
-
-    def check_brand_product_name(self, name: str) -> bool:
-        medicine_name_temp = (
-            self.medicine_name[:3]
-            if len(self.medicine_name) > 2
-            else self.medicine_name
-        )
-
-        # 药品名和品牌名包含其中一个即可
-        if medicine_name_temp in name:
-            return True
+        self.waiter = waiter or Waiter()
+        self.pacer = pacer or AdaptivePacer("京东")
 
-        # 至少要包含其中一个品牌名
-        for brand in self.brand_name:
-            if brand in name:
-                return True
+        self.bro = Chromium()
+        self.tab = tab
 
-        return False
+    def parse_with(self, parser_name: str, html_str: str, filename: Path):
+        """使用注册表中的解析器解析响应, 并保存到暂存库"""
+        parser = PARSERS.get(parser_name)
 
-    @staticmethod
-    def extract_data(html_obj, xpath_str: str):
         try:
-            return html_obj.xpath(xpath_str)[0]
+            rows = parser.parse(html_str, ParseContext(self.keyword))
         except Exception as e:
-            return ""
-
-    def parse_search(self, html_str: str, filename: Path):
-        html = etree.HTML(html_str)
-
-        datas = []
-
-        try:
-            for li in html.xpath('//div[@id="J_goodsList"]//li'):
-                # 药品名称
-                productName = li.xpath("string(./div/div[3]/a/em)")
-
-                if not self.check_brand_product_name(productName):
-                    continue
-
-                price = self.extract_data(li, "./div/div[2]/strong/i/text()")
-
-                productImg = "https:" + self.extract_data(
-                    li, './div[1]/div[@class="p-img"]//img/@data-lazy-img'
-                )
+            self.logInfo.emit(f"解析{parser_name}数据失败: {e}")
+            return
 
-                storeName = self.extract_data(
-                    li, './div[1]/div[@class="p-shop"]/span/a/@title'
-                )
-                if storeName == "乐药师大药房旗舰店" or storeName == "乐药师药品专卖店":
-                    continue
+        if rows:
+            self.save.to_excel(filename, rows, parser.platform)
 
-                storeUrl = "https:" + self.extract_data(li, "./div/div[5]/span/a/@href")
+    def parse_search(self, html_str: str, filename: Path):
+        self.parse_with("京东", html_str, filename)
 
-                productName = self.keyword
+    def parse_xhr(self, html_str: str, filename: Path):
+        self.parse_with("京东 xhr", html_str, filename)
 
-                # 获取药品ID
-                medicine_id = MEDICINE_ID.get(productName, "")
+    def scroll_down(self, tab):
+        for _ in range(self.pacer.scroll_steps()):
+            tab.scroll.down(random.randint(50, 1000))
+            self.pacer.sleep()
 
-                price = str(price)
-                productImg = str(productImg)
-                storeName = str(storeName)
+        self.logInfo.emit("滑动到最底部")
+        tab.scroll.to_bottom()
 
-                storeUrl = str(storeUrl)
-                t = time.strftime("%Y-%m-%d", time.localtime())
+    def wait_xhr(self, tab, started: float, filename: Path) -> None:
+        """
+        等待翻页触发的第一个 XHR 并解析, 记录从翻页到返回的延迟
 
-                # 添加数据
-                # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                datas.append(
-                    [
-                        shortuuid.uuid(),
-                        storeName,
-                        storeUrl,
-                        "",
-                        productName,
-                        medicine_id,
-                        productImg,
-                        price,
-                        "京东",
-                        t,
-                    ]
-                )
+        Args:
+            started: 翻页的时间, time.monotonic()
+        """
+        package = tab.listen.wait(timeout=5)
+        if not package:
+            return
 
-            if not datas:
-                return
+        self.pacer.record_latency(time.monotonic() - started)
 
-            self.save.to_excel(filename, datas, "京东")
+        res = package.response.body
+        if res and len(res) >= 140:
+            self.logInfo.emit("解析京东 xhr 结果")
+            self.parse_xhr(res, filename=filename)
 
-        except Exception as e:
-            self.logInfo.emit(f"{self.keyword} {e}")
+    def on_captcha(self):
+        self.pacer.record_captcha()
+        self.logInfo.emit("出现安全验证, 请在浏览器中完成验证")
 
-    def parse_xhr(self, html_str: str, filename: Path):
+    def wait_captcha(self, tab) -> bool:
         """
-        1. 一行行删除 jd.html 文件中的内容，直到 <li data-sku= 有这个标签，然后再删除这一行之前的内容，即可得到京东的商品列表
-        2. 删除倒数几行的 script 标签
-        """
-        content = html_str
-
-        try:
-            # 删除不需要的内容
-            for i in range(len(content)):
-                if "li data-sku=" in content[i]:
-                    content = content[i:]
-                    break
+        出现安全验证时等待用户在浏览器中完成验证
 
-            for i in range(len(content)):
-                if "<script>" in content[i]:
-                    content = content[:i]
-                    break
+        Returns:
+            bool: 是否已经通过验证, 超时返回 False
+        """
+        passed = self.waiter.while_present(
+            tab,
+            CAPTCHA_LOCATORS,
+            reason="京东验证码",
+            on_blocked=self.on_captcha,
+        )
 
-            # 解析文件
-            html = etree.HTML(content)
+        if not passed:
+            self.logInfo.emit(f"等待京东验证码超时: {self.keyword}")
 
-            # 商品列表
-            try:
-                li = html.xpath("//li")
-            except:
-                return
+        return passed
 
-            datas = []
-            # 解析商品信息
-            for i in li:
-                # 商品名称
-                productName = i.xpath("string(./div/div[3]//em)").split("\n")[0]
+    def search_direct(
+        self, keyword: str, client: DirectSearchClient, max_pages: int = 10
+    ):
+        """
+        直接请求搜索页面, 不打开浏览器页面, 需要验证时回退到浏览器搜索
 
-                if not self.check_brand_product_name(productName):
-                    continue
+        每一页分两次请求: 搜索页面包含前 30 个商品, 再请求滑动时加载的后 30 个商品
+        """
+        self.keyword = keyword
 
-                # 商品价格
-                price = i.xpath(".//div/div[2]/strong/i/text()")[0]
+        filename = self.save_dir / f"{self.keyword}.xlsx"
 
-                # 商品图片
-                productImg = "https:" + i.xpath("./div[1]//img/@data-lazy-img")[0]
+        self.save.logInfo = self.logInfo
 
-                # 店铺名称
-                storeName = i.xpath('.//div[@class="p-shop"]/span/a/@title')[0]
-                if storeName == "乐药师大药房旗舰店" or storeName == "乐药师药品专卖店":
+        try:
+            for page, html_str in enumerate(
+                fetch_pages(client.jd_search, keyword, max_pages, self.pacer),
+                start=1,
+            ):
+                self.logInfo.emit("解析京东搜索结果")
+                self.parse_search(html_str, filename=filename)
+
+                # 与浏览器中滑动到底部一样, 间隔一段时间后再请求后 30 个商品
+                self.pacer.sleep()
+                self.pacer.record_request()
+                started = time.monotonic()
+                try:
+                    xhr_str, count = client.jd_search_more(keyword, page)
+                except CaptchaRequired:
+                    self.pacer.record_captcha()
+                    raise
+                except Exception as e:
+                    self.logInfo.emit(f"请求京东后 30 个商品出错: {e}")
+                    count = 0
+
+                if not count:
+                    self.logInfo.emit(
+                        f"京东第 {page} 页的后 30 个商品获取失败, {keyword} 的京东结果不完整"
+                    )
                     continue
 
-                # 店铺链接
-                storeUrl = "https:" + i.xpath(".//div/div[5]/span/a/@href")[0]
-
-                productName = self.keyword
-
-                # 获取药品ID
-                medicine_id = MEDICINE_ID.get(productName, "")
-
-                price = str(price)
-                productImg = str(productImg)
-                storeName = str(storeName)
+                self.pacer.record_latency(time.monotonic() - started)
+                self.logInfo.emit("解析京东 xhr 结果")
+                self.parse_xhr(xhr_str, filename=filename)
+        except CaptchaRequired as e:
+            self.logInfo.emit(f"京东需要验证, 改用浏览器搜索: {e}")
+            self.search(keyword)
 
-                storeUrl = str(storeUrl)
-                t = time.strftime("%Y-%m-%d", time.localtime())
-
-                # 添加数据
-                # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                datas.append(
-                    [
-                        shortuuid.uuid(),
-                        storeName,
-                        storeUrl,
-                        "",
-                        productName,
-                        medicine_id,
-                        productImg,
-                        price,
-                        "京东",
-                        t,
-                    ]
-                )
-
-            if not datas:
-                return
-
-            self.save.to_excel(filename, datas, "京东")
-
-        except Exception as e:
-            self.logInfo.emit(f"解析京东搜索结果出错 {self.keyword} {e}")
-
-    def scroll_down(self, tab):
-        for _ in range(random.randint(4, 12)):
-            tab.scroll.down(random.randint(50, 1000))
-            time.sleep(random.uniform(0.0, 2.0))
-
-        self.logInfo.emit("滑动到最底部")
-        tab.scroll.to_bottom()
+            # 浏览器中验证后 cookie 会更新
+            client.refresh_cookies(self.tab or self.bro.latest_tab)
 
     def search(self, keyword: str):
         self.keyword = keyword
 
-        keywords = self.keyword.split(" ")
-        self.brand_name, self.medicine_name = keywords[:-1], keywords[-1]
-
         filename = self.save_dir / f"{self.keyword}.xlsx"
 
         self.save.logInfo = self.logInfo
 
-        tab = self.bro.latest_tab
+        tab = self.tab or self.bro.latest_tab
 
         tab.listen.start("search.jd.com/Search")
 
@@ -236,9 +187,19 @@ class JD:
         # 点击搜索按钮
         self.logInfo.emit("点击搜索按钮")
         ele_search = tab.ele("@@tag()=button@@text()=搜索", timeout=60)
+        self.pacer.record_request()
         ele_search.click()
 
-        time.sleep(2)
+        # 等待搜索结果或者安全验证出现, 最多 2 秒, 代替固定的 sleep(2)
+        self.waiter.until(
+            lambda: tab.ele("#J_goodsList", timeout=0)
+            or any(tab.ele(locator, timeout=0) for locator in CAPTCHA_LOCATORS),
+            timeout=2,
+        )
+
+        # 出现安全验证时等待, 没有验证时立即继续
+        if not self.wait_captcha(tab):
+            return
 
         # 监听搜索结果
         self.logInfo.emit("开始监听搜索结果...")
@@ -287,7 +248,10 @@ class JD:
                 ele_next_page = tab.ele(".pn-next", timeout=2)
 
                 if ele_next_page:
+                    self.pacer.record_request()
+                    started = time.monotonic()
                     ele_next_page.click()
+                    self.wait_xhr(tab, started, filename)
 
                     # 滑动
                     self.logInfo.emit("往下滑动")
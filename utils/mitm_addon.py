@@ -1,19 +1,26 @@
-import json
-import re
+import multiprocessing
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional
 
 import httpx
-import shortuuid
 from loguru import logger
-from lxml import etree
 from mitmproxy import http
 from PySide6.QtCore import QThread, Signal
 
-from utils.medicineID import MEDICINE_ID
-from utils.save import Save
+from utils.parsers import (
+    PARSERS,
+    PROXY_UNCHECKED,
+    ParseContext,
+    Parser,
+    ParserRegistry,
+    parse_compact,
+)
+from utils.routing import FlowStats, Route, Router
+from utils.save import Save, SaveWriter
 
 
 class Addon(QThread):
@@ -24,8 +31,13 @@ class Addon(QThread):
 
     add_text = Signal(str)  # 用于向UI发送文本信息的信号
 
-    def __init__(self):
-        """初始化Addon类"""
+    def __init__(self, parse_processes: int = 0):
+        """
+        初始化Addon类
+
+        Args:
+            parse_processes: 解析响应的子进程数, 0 表示在线程池中解析
+        """
         super().__init__()
 
         # HTTP客户端，用于发送请求
@@ -40,756 +52,154 @@ class Addon(QThread):
         # 实例化保存类
         self.save = Save()
 
-        # 创建线程池，用于并行处理数据保存等耗时操作
+        # 单写线程, 合并各解析线程的数据后统一写入
+        self.writer = SaveWriter(self.save)
+        self.writer.start()
+
+        # 创建线程池，用于并行解析各平台数据
         self.thread = ThreadPoolExecutor(max_workers=5)
 
-        # 药品品牌名和药品名称，从关键词中解析
-        self.brand_name = []
-        self.medicine_name = ""
+        # lxml 和大的 json 在子进程中解析, 不占用代理所在进程的 GIL
+        # 使用 spawn, 避免 fork 时复制 Qt 和 mitmproxy 的线程状态
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        if parse_processes > 0:
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=parse_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
 
-    def check_brand_product_name(self, name: str) -> bool:
-        """
-        检查产品名称是否符合搜索条件
+        # 各平台的解析器和路由表, 替换注册表中的解析器后下一个响应生效
+        self.parsers: ParserRegistry = PARSERS
+        self.parsers_version = -1
+        self.router = Router()
+        self.sync_routes()
 
-        Args:
-            name: 产品名称
+        # 流式转发和缓冲的响应统计
+        self.flow_stats = FlowStats()
 
-        Returns:
-            bool: 是否符合搜索条件
-        """
-        # 关键词为空则返回False
-        if not self.keyword:
-            return False
-
-        # 解析关键词，分割品牌名和药品名
-        keywords = self.keyword.split(" ")
-        self.brand_name, self.medicine_name = keywords[:-1], keywords[-1]
-
-        # 取药品名的前3个字符进行匹配，如果药品名长度不足3则用全部
-        medicine_name_temp = (
-            self.medicine_name[:3]
-            if len(self.medicine_name) > 2
-            else self.medicine_name
-        )
+        # 各文件正在解析的响应数, 切换关键词时等旧文件的解析完成后再导出
+        self.inflight_lock = threading.Lock()
+        self.inflight: dict[Path, int] = {}
+        self.pending_exports: set[Path] = set()
 
-        # 药品名必须在产品名中
-        if medicine_name_temp not in name:
-            return False
+        # 本次运行写入过的文件, 关闭时全部导出
+        self.filenames: set[Path] = set()
 
-        # 特殊处理"一口"品牌
-        if "一口" in self.brand_name:
-            return "一口" in name
-        else:
-            # 至少要包含其中一个品牌名
-            for brand in self.brand_name:
-                if brand in name:
-                    return True
+        self.closed = False
 
-        return False
+    def sync_routes(self) -> None:
+        """根据解析器注册表重新建立路由, 统计保留"""
+        self.router.clear()
 
-    def jd(self, res: str) -> None:
-        """
-        解析京东搜索结果页面
+        for parser in self.parsers.all():
+            self.router.add(parser.name, parser.host, parser.path_pattern, parser)
 
-        Args:
-            res: 响应内容
-        """
-        try:
-            html = etree.HTML(res)
-            datas = []
-
-            for li in html.xpath('//div[@id="J_goodsList"]//li'):
-                try:
-                    # 药品名称
-                    productName = li.xpath("string(./div/div[3]/a/em)")
-
-                    # 检查是否符合搜索条件
-                    if not self.check_brand_product_name(productName):
-                        continue
-
-                    # 提取价格、图片、店铺名称等信息
-                    price = li.xpath("./div/div[2]/strong/i/text()")[0]
-                    productImg = (
-                        "https:"
-                        + li.xpath('./div[1]/div[@class="p-img"]//img/@data-lazy-img')[
-                            0
-                        ]
-                    )
-                    storeName = li.xpath('./div[1]/div[@class="p-shop"]/span/a/@title')[
-                        0
-                    ]
-                    storeUrl = "https:" + li.xpath("./div/div[5]/span/a/@href")[0]
-
-                    # 转为字符串类型
-                    productName = str(productName)
-                    price = str(price)
-                    productImg = str(productImg)
-                    storeName = str(storeName)
-                    storeUrl = str(storeUrl)
-
-                    # 跳过乐药师大药房旗舰店的商品
-                    if (
-                        storeName == "乐药师大药房旗舰店"
-                        or storeName == "乐药师药品专卖店"
-                    ):
-                        continue
-
-                    # 获取当前日期
-                    t = time.strftime("%Y-%m-%d", time.localtime())
-
-                    # 使用搜索关键词作为产品名
-                    productName = self.keyword
-
-                    # 获取药品ID
-                    medicine_id = MEDICINE_ID.get(productName, "")
-
-                    # 添加数据
-                    # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                    datas.append(
-                        [
-                            shortuuid.uuid(),
-                            storeName,
-                            storeUrl,
-                            "",
-                            productName,
-                            medicine_id,
-                            productImg,
-                            price,
-                            "京东",
-                            t,
-                        ]
-                    )
-                except Exception as e:
-                    logger.error(f"解析京东商品失败: {e}")
-                    continue
-
-            # 保存数据
-            self.save.to_excel(self.filename, datas, "京东")
-        except Exception as e:
-            logger.error(f"解析京东页面失败: {e}")
-
-    def jd_xhr(self, html_str: str) -> None:
-        """
-        解析京东XHR数据
+        self.parsers_version = self.parsers.version
 
-        Args:
-            html_str: HTML字符串
+    def export(self) -> None:
         """
-        # 将字符串转换为列表以便按行处理
-        html_lines = html_str.split("\n")
+        把当前关键词暂存的数据生成 Excel 文件
 
-        # 删除不需要的内容
-        start_idx = -1
-        end_idx = len(html_lines)
+        还有正在解析的响应时先记下, 等这个文件的解析全部完成后再导出
+        """
+        filename = self.filename
+        if filename is None:
+            return
 
-        for i, line in enumerate(html_lines):
-            if "li data-sku=" in line:
-                start_idx = i
-                break
+        with self.inflight_lock:
+            if self.inflight.get(filename):
+                self.pending_exports.add(filename)
+                return
 
-        for i, line in enumerate(html_lines[start_idx:], start=start_idx):
-            if "<script>" in line:
-                end_idx = i
-                break
+        self.writer.export(filename)
 
-        if start_idx == -1:
+    def begin_parse(self, filename: Optional[Path]) -> None:
+        """提交解析任务前调用"""
+        if filename is None:
             return
 
-        # 提取有效HTML内容
-        html_content = "\n".join(html_lines[start_idx:end_idx])
+        with self.inflight_lock:
+            self.inflight[filename] = self.inflight.get(filename, 0) + 1
+            self.filenames.add(filename)
 
-        # 解析HTML
-        try:
-            html = etree.HTML(html_content)
-            li_elements = html.xpath("//li")
-        except Exception as e:
-            logger.error(f"解析京东HTML失败: {e}")
+    def end_parse(self, filename: Optional[Path]) -> None:
+        """解析结果交给写线程后调用, 文件等待导出且没有正在解析的响应时导出"""
+        if filename is None:
             return
 
-        datas = []
-        # 解析商品信息
-        for li in li_elements:
-            try:
-                # 商品名称
-                productName = li.xpath("string(./div/div[3]//em)").split("\n")[0]
-
-                # 商品价格
-                price = li.xpath(".//div/div[2]/strong/i/text()")[0]
-
-                # 商品图片
-                productImg = "https:" + li.xpath("./div[1]//img/@data-lazy-img")[0]
-
-                # 店铺名称
-                storeName = li.xpath('.//div[@class="p-shop"]/span/a/@title')[0]
-
-                # 店铺链接
-                storeUrl = "https:" + li.xpath(".//div/div[5]/span/a/@href")[0]
-
-                # 转为字符串类型
-                productName = str(productName)
-                price = str(price)
-                productImg = str(productImg)
-                storeName = str(storeName)
-                storeUrl = str(storeUrl)
-
-                # 跳过乐药师大药房旗舰店的商品
-                if storeName == "乐药师大药房旗舰店" or storeName == "乐药师药品专卖店":
-                    continue
-
-                # 获取当前日期
-                t = time.strftime("%Y-%m-%d", time.localtime())
-
-                # 使用搜索关键词作为产品名
-                productName = self.keyword
-
-                # 获取药品ID
-                medicine_id = MEDICINE_ID.get(productName, "")
-
-                # 添加数据
-                # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                datas.append(
-                    [
-                        shortuuid.uuid(),
-                        storeName,
-                        storeUrl,
-                        "",
-                        productName,
-                        medicine_id,
-                        productImg,
-                        price,
-                        "京东",
-                        t,
-                    ]
-                )
-            except Exception as e:
-                logger.error(f"解析京东商品数据失败: {e}")
-                continue
-
-        msg = "\n准备保存京东后 30 条数据\n"
-        self.add_text.emit(msg)
+        with self.inflight_lock:
+            self.inflight[filename] -= 1
+            if self.inflight[filename] or filename not in self.pending_exports:
+                return
+            self.pending_exports.discard(filename)
 
-        # 保存数据
-        self.save.to_excel(self.filename, datas, "京东")
+        # 写线程按提交顺序处理, 导出排在这个文件的所有数据之后
+        self.writer.export(filename)
 
-    def yfw(self, res: str) -> None:
+    def done(self) -> None:
         """
-        解析药房网搜索结果
+        mitmproxy 关闭时调用, 等待解析完成并导出本次运行写入过的所有文件
 
-        Args:
-            res: 响应内容
-        """
-        try:
-            html = etree.HTML(res)
-            datas = []
-
-            # 提取商品列表
-            li_elements = html.xpath('//*[@id="slist"]/ul//li')
-            for li in li_elements:
-                try:
-                    # 提取店铺名、链接等信息
-                    storeName = li.xpath('.//div[@class="clearfix"]/a/@title')[0]
-                    storeUrl = (
-                        "https:" + li.xpath('.//div[@class="clearfix"]/a/@href')[0]
-                    )
-                    productImg = (
-                        "https:" + li.xpath('.//div[@class="img"]/a/img/@src')[0]
-                    )
-                    price = li.xpath(
-                        './/div[@class="clearfix"]/a/@data-commodity_price'
-                    )[0]
-
-                    # 获取当前日期
-                    t = time.strftime("%Y-%m-%d", time.localtime())
-
-                    # 使用搜索关键词作为产品名
-                    productName = self.keyword
-
-                    # 获取药品ID
-                    medicine_id = MEDICINE_ID.get(productName, "")
-
-                    # 添加数据
-                    # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                    datas.append(
-                        [
-                            shortuuid.uuid(),
-                            storeName,
-                            storeUrl,
-                            storeName,
-                            productName,
-                            medicine_id,
-                            productImg,
-                            price,
-                            "药房网",
-                            t,
-                        ]
-                    )
-                except Exception as e:
-                    logger.error(f"解析药房网商品失败: {e}")
-                    continue
-
-            # 保存数据
-            self.save.to_excel(self.filename, datas, "药房网")
-        except Exception as e:
-            logger.error(f"解析药房网页面失败: {e}")
-
-    def pdd(self, res: str) -> None:
+        关闭写入线程、解析线程池和解析进程, 重复调用时直接返回
         """
-        解析拼多多搜索结果页面
+        if self.closed:
+            return
+        self.closed = True
 
-        Args:
-            res: 响应内容
-        """
-        datas = []
+        self.thread.shutdown(wait=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True)
 
-        try:
-            if isinstance(res, str):
-                # 使用正则表达式提取window.rawData
-                raw_data_match = re.findall(r"window\.rawData=(.*?);document", res)
-                if not raw_data_match:
-                    return
-
-                # 解析JSON数据
-                raw_data = json.loads("".join(raw_data_match))
-
-                # 获取商品列表
-                goods_list = (
-                    raw_data.get("stores", {})
-                    .get("store", {})
-                    .get("data", {})
-                    .get("ssrListData", {})
-                    .get("list", [])
-                )
-
-                for data in goods_list:
-                    try:
-                        mall_id = str(data["mallEntrance"]["mall_id"])
-
-                        # 跳过乐药师大药房旗舰店
-                        if mall_id == "397292525":
-                            continue
-
-                        storeUrl = f"https://mobile.yangkeduo.com/mall_page.html?mall_id={mall_id}"
-                        productName = data.get("goodsName", "")
-
-                        # 检查是否符合搜索条件
-                        if not self.check_brand_product_name(productName):
-                            continue
-
-                        productImg = data.get("imgUrl", "")
-                        price = data.get("priceInfo", "")
-                        t = time.strftime("%Y-%m-%d", time.localtime())
-
-                        # 使用搜索关键词作为产品名
-                        productName = self.keyword
-
-                        # 获取药品ID
-                        medicine_id = MEDICINE_ID.get(productName, "")
-
-                        # 添加数据
-                        # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                        datas.append(
-                            [
-                                shortuuid.uuid(),
-                                "",
-                                storeUrl,
-                                "",
-                                productName,
-                                medicine_id,
-                                productImg,
-                                price,
-                                "拼多多",
-                                t,
-                            ]
-                        )
-
-                    except Exception as e:
-                        logger.error(f"解析拼多多商品失败: {e}")
-                        continue
-            elif isinstance(res, dict):
-                goods_list = res.get("items", [])
-
-                for item in goods_list:
-                    try:
-                        data = item.get("item_data", {}).get("goods_model", {})
-
-                        mall_id = str(data["mall_id"])
-
-                        # 跳过乐药师大药房旗舰店
-                        if mall_id == "397292525":
-                            continue
-
-                        storeUrl = f"https://mobile.yangkeduo.com/mall_page.html?mall_id={mall_id}"
-                        productName = data.get("goods_name", "")
-
-                        # 检查是否符合搜索条件
-                        if not self.check_brand_product_name(productName):
-                            continue
-
-                        productImg = data.get("hd_url", "")
-                        price = data.get("price_info", "")
-                        t = time.strftime("%Y-%m-%d", time.localtime())
-
-                        # 使用搜索关键词作为产品名
-                        productName = self.keyword
-
-                        # 获取药品ID
-                        medicine_id = MEDICINE_ID.get(productName, "")
-
-                        # 添加数据
-                        # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                        datas.append(
-                            [
-                                shortuuid.uuid(),
-                                "",
-                                storeUrl,
-                                "",
-                                productName,
-                                medicine_id,
-                                productImg,
-                                price,
-                                "拼多多",
-                                t,
-                            ]
-                        )
-
-                    except Exception as e:
-                        logger.error(f"解析拼多多商品失败: {e}")
-                        continue
-
-        except Exception as e:
-            logger.error(f"解析拼多多页面失败: {e}")
-
-        # 如果有数据则保存
-        if datas:
-            self.save.to_excel(self.filename, datas, "拼多多")
-
-    def pdd_xhr(self, res: Dict[str, Any]) -> None:
-        """
-        解析拼多多 xhr 数据
+        with self.inflight_lock:
+            filenames = self.filenames | self.pending_exports
+            self.pending_exports.clear()
+        if self.filename is not None:
+            filenames.add(self.filename)
 
-        Args:
-            res: JSON响应数据
-        """
-        datas = []
+        for filename in filenames:
+            self.writer.export(filename)
+        self.writer.close()
 
-        try:
-            # 获取商品列表
-            items = res.get("items", [])
-
-            for item in items:
-                try:
-                    # 获取商品数据
-                    data = item.get("item_data", {}).get("goods_model", {})
-
-                    mall_id = data.get("mall_id")
-                    storeUrl = (
-                        f"https://mobile.yangkeduo.com/mall_page.html?mall_id={mall_id}"
-                    )
-                    productName = data.get("goods_name", "")
-
-                    # 检查是否符合搜索条件
-                    if not self.check_brand_product_name(productName):
-                        continue
-
-                    productImg = data.get("hd_thumb_url", "")
-                    price = data.get("price_info", "")
-                    t = time.strftime("%Y-%m-%d", time.localtime())
-
-                    # 使用搜索关键词作为产品名
-                    productName = self.keyword
-
-                    # 获取药品ID
-                    medicine_id = MEDICINE_ID.get(productName, "")
-
-                    # 添加数据
-                    # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                    datas.append(
-                        [
-                            shortuuid.uuid(),
-                            "",
-                            storeUrl,
-                            "",
-                            productName,
-                            medicine_id,
-                            productImg,
-                            price,
-                            "拼多多",
-                            t,
-                        ]
-                    )
-                except Exception as e:
-                    logger.error(f"解析拼多多XHR商品失败: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"解析拼多多XHR数据失败: {e}")
-
-        # 如果有数据则保存
-        if datas:
-            self.save.to_excel(self.filename, datas, "拼多多")
-
-    def meituan(self, res: Dict[str, Any]) -> None:
+        logger.info(f"路由统计:\n{self.router.summary()}")
+        logger.info(f"流量统计: {self.flow_stats.snapshot()}")
+
+    def request(self, flow: http.HTTPFlow) -> None:
         """
-        解析美团搜索结果
+        处理请求
 
         Args:
-            res: JSON响应数据
+            flow: 请求流
         """
-        # 检查数据有效性
-        if res.get("data") is None or isinstance(res.get("data"), str):
-            return
-
-        datas = []
+        url = flow.request.url
 
-        try:
-            # 遍历模块列表
-            for module in res.get("data", {}).get("module_list", []):
-                try:
-                    string_data = module.get("string_data")
-                    if not string_data:
-                        continue
-
-                    # 解析JSON数据
-                    data = json.loads(string_data)
-                    storeName = data.get("name", "")  # 药店名称
-
-                    # 跳过乐药师大药房旗舰店
-                    if (
-                        storeName == "乐药师大药房旗舰店"
-                        or storeName == "乐药师药品专卖店"
-                    ):
-                        continue
-
-                    # 只处理快递电商店铺
-                    temp_str = "快递电商"
-                    if temp_str not in storeName:
-                        continue
-
-                    # 去除后缀
-                    storeName = storeName.replace("（快递电商）", "")
-
-                    # 处理产品列表
-                    for product in data.get("product_list", []):
-                        productName = product.get("product_name", "")  # 药品名称
-
-                        # 检查是否符合搜索条件
-                        if not self.check_brand_product_name(productName):
-                            continue
-
-                        productImg = product.get("picture", "")  # 药品图片
-                        price = product.get("price", "")  # 挂网价格
-                        original_price = product.get("original_price", "")  # 原价
-                        t = time.strftime("%Y-%m-%d", time.localtime())  # 排查日期
-
-                        # 使用搜索关键词作为产品名
-                        productName = self.keyword
-
-                        # 获取药品ID
-                        medicine_id = MEDICINE_ID.get(productName, "")
-
-                        # 添加数据
-                        # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                        datas.append(
-                            [
-                                shortuuid.uuid(),
-                                storeName,
-                                "",
-                                "",
-                                productName,
-                                medicine_id,
-                                productImg,
-                                price,
-                                "美团（快递）",
-                                t,
-                            ]
-                        )
-                except Exception as e:
-                    logger.error(f"解析美团模块失败: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"解析美团数据失败: {e}")
-
-        # 如果有数据则保存并输出信息
-        if datas:
-            self.add_text.emit(str(datas))
-            self.save.to_excel(self.filename, datas, "美团")
-
-    def taobao(self, res: str) -> None:
-        """
-        解析淘宝天猫搜索结果
+        # 记录京东API的Cookie
+        if "api.m.jd.com" in url:
+            logger.info(flow.request.headers.get("Cookie"))
 
-        Args:
-            res: 响应内容
+    def responseheaders(self, flow: http.HTTPFlow) -> None:
         """
-        datas = []
+        收到响应头时决定是否需要缓冲响应
 
-        try:
-            # 将JSONP转为JSON
-            res = re.sub(r"mtopjsonp\d+\(", "", res)
-            res = res[:-1]  # 去掉最后一个括号
-
-            # 解析JSON数据
-            data = json.loads(res)
-
-            # 获取商品列表
-            items = data.get("data", {}).get("itemsArray", [])
-
-            for item in items:
-                try:
-                    storeName = item.get("shopInfo", {}).get("title", "")  # 店铺名称
-
-                    # 跳过乐药师大药房旗舰店
-                    if (
-                        storeName == "乐药师大药房旗舰店"
-                        or storeName == "乐药师药品专卖店"
-                    ):
-                        continue
-
-                    storeUrl = "https:" + item.get("shopInfo", {}).get(
-                        "url", ""
-                    )  # 店铺链接
-                    productName = item.get("title", "")  # 药品名称
-
-                    # 提取中文字符
-                    chinese_pattern = re.compile(r"[\u4e00-\u9fff]+", re.UNICODE)
-                    chinese_text = re.findall(chinese_pattern, productName)
-
-                    # 合并中文字符并截取
-                    if chinese_text:
-                        productName = "".join(chinese_text)
-                        if len(productName) > 3:
-                            productName = productName[:-3]
-
-                    # 获取价格和图片
-                    price = item.get("priceShow", {}).get("price", "")
-                    productImg = item.get("pic_path", "")
-                    t = time.strftime("%Y-%m-%d", time.localtime())
-
-                    # 使用搜索关键词作为产品名
-                    productName = self.keyword
-
-                    # 获取药品ID
-                    medicine_id = MEDICINE_ID.get(productName, "")
-
-                    # 添加数据
-                    # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                    datas.append(
-                        [
-                            shortuuid.uuid(),
-                            storeName,
-                            storeUrl,
-                            "",
-                            productName,
-                            medicine_id,
-                            productImg,
-                            price,
-                            "淘宝天猫",
-                            t,
-                        ]
-                    )
-                except Exception as e:
-                    logger.error(f"解析淘宝商品失败: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"解析淘宝数据失败: {e}")
-
-        # 如果有数据则保存
-        if datas:
-            self.save.to_excel(self.filename, datas, "淘宝天猫")
-
-    def ele(self, res: Dict[str, Any]) -> None:
-        """
-        解析饿了么搜索结果
+        没有命中路由的响应 (图片、视频、js 等) 直接流式转发, 不在代理中缓冲
 
         Args:
-            res: JSON响应数据
+            flow: 响应流
         """
-        datas = []
+        request = flow.request
 
-        try:
-            # 获取结果数据
-            data = res.get("data", {}).get("result", {})
-
-            # 处理数据格式
-            if isinstance(data, list) and data:
-                data = data[0]
-
-            # 遍历商品列表
-            for item in data.get("listItems", []):
-                try:
-                    restaurant = item.get("info", {}).get("restaurant")
-
-                    if restaurant is None:
-                        continue
-
-                    storeName = restaurant.get("name", "")  # 药店名称
-
-                    # 获取配送模式, 判断是否为快递
-                    delivery_mode = restaurant.get("deliveryMode", {}).get("text", "")
-
-                    # 跳过乐药师大药房旗舰店
-                    if (
-                        storeName == "乐药师大药房旗舰店"
-                        or storeName == "乐药师药品专卖店"
-                        or delivery_mode != "快递发货"
-                    ):
-                        continue
-
-                    # 遍历食品列表（药品）
-                    for food in item.get("info", {}).get("foods", []):
-                        productName = food.get("name", "")  # 药品名
-
-                        # 检查是否符合搜索条件
-                        if not self.check_brand_product_name(productName):
-                            continue
-
-                        productImg = food.get("imagePath", "")  # 药品图片
-                        price = food.get("price", "")  # 挂网价格
-                        t = time.strftime("%Y-%m-%d", time.localtime())
-
-                        # 使用搜索关键词作为产品名
-                        productName = self.keyword
-
-                        # 获取药品ID
-                        medicine_id = MEDICINE_ID.get(productName, "")
-
-                        # 添加数据
-                        # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                        datas.append(
-                            [
-                                shortuuid.uuid(),
-                                storeName,
-                                "",
-                                "",
-                                productName,
-                                medicine_id,
-                                productImg,
-                                price,
-                                "饿了么（快递）",
-                                t,
-                            ]
-                        )
-                except Exception as e:
-                    logger.error(f"解析饿了么商品失败: {e}")
-                    continue
-        except Exception as e:
-            logger.error(f"解析饿了么数据失败: {e}")
-
-        # 如果有数据则保存
-        if datas:
-            self.save.to_excel(self.filename, datas, "饿了么")
+        if self.parsers.version != self.parsers_version:
+            self.sync_routes()
 
-    def request(self, flow: http.HTTPFlow) -> None:
-        """
-        处理请求
+        route = None
+        if request.scheme == "https":
+            route = self.router.match(request.pretty_host, request.path)
 
-        Args:
-            flow: 请求流
-        """
-        url = flow.request.url
+        if route is None:
+            flow.response.stream = True
+            self.flow_stats.add_streamed()
+            return
 
-        # 记录京东API的Cookie
-        if "api.m.jd.com" in url:
-            logger.info(flow.request.headers.get("Cookie"))
+        flow.metadata["route"] = route
 
     def response(self, flow: http.HTTPFlow) -> None:
         """
@@ -798,105 +208,82 @@ class Addon(QThread):
         Args:
             flow: 响应流
         """
-        url = flow.request.url
+        # 路由在 responseheaders 中已经匹配, 流式转发的响应没有路由
+        route: Optional[Route] = flow.metadata.get("route")
+        if route is None:
+            return
 
-        # 处理各平台的响应数据
-
-        # 京东搜索结果
-        if re.match("https://search.jd.com/Search", url):
-            res = flow.response.text
-            msg = f"\n京东 {url[:50]}\n"
-            self.add_text.emit(msg)
-            self.thread.submit(self.jd, res)
-
-        # 京东后30条数据
-        elif re.match(
-            r"https://api.m.jd.com/\?appid=search-pc-java&functionId=pc_search_s_new*",
-            url,
-        ):
-            res = flow.response.text
-            if not res:
-                return
+        content = flow.response.content
+        self.flow_stats.add_buffered(
+            len(flow.response.raw_content or b""),
+            (flow.response.timestamp_end or time.time()) - flow.request.timestamp_start,
+        )
 
-            msg = f"京东 xhr 数据 {url[:50]}\n"
-            self.add_text.emit(msg)
-            self.thread.submit(self.jd_xhr, res)
-
-        # 药房网
-        elif re.match(r"https://www.yaofangwang.com/medicine/\d+/*", url):
-            res = flow.response.text
-            msg = f"药房网 {url[:50]}"
-            self.add_text.emit(msg)
-            self.thread.submit(self.yfw, res)
-
-        # 拼多多搜索结果
-        elif re.match(r"https://mobile.yangkeduo.com/search_result.html", url):
-            res = flow.response.text
-            if not res:
-                return
+        if not content:
+            return
 
-            msg = f"\n拼多多 {url[:50]}\n"
-            self.add_text.emit(msg)
-            self.thread.submit(self.pdd, res)
+        # 关键词和文件在提交时确定, 解析期间切换关键词不会写错文件
+        ctx = ParseContext(self.keyword, match_all=True, unchecked=PROXY_UNCHECKED)
+        filename = self.filename
+        self.begin_parse(filename)
+
+        if self.process_pool is not None:
+            # 解析器随任务一起发送到子进程, 运行时替换的解析器同样生效
+            future = self.process_pool.submit(parse_compact, route.handler, content, ctx)
+            future.add_done_callback(
+                partial(self.on_parsed, route, ctx, filename, flow.request.url)
+            )
+            return
 
-        # 拼多多XHR数据
-        elif re.match(r"https://mobile.yangkeduo.com/proxy/api/search*", url):
-            try:
-                res = flow.response.json()
-                if not res:
-                    return
+        self.thread.submit(
+            self.parse_route, route, content, ctx, filename, flow.request.url
+        )
 
-                msg = f"\n拼多多 xhr {url[:50]}\n"
-                self.add_text.emit(msg)
-                self.thread.submit(self.pdd, res)
-            except Exception as e:
-                logger.error(f"解析拼多多XHR响应失败: {e}")
-                return
+    def parse_route(
+        self, route: Route, content: bytes, ctx: ParseContext, filename: Path, url: str
+    ) -> None:
+        """在线程池中解析响应, 并记录解析耗时"""
+        parser: Parser = route.handler
 
-        # 美团
-        elif re.match("https://i.waimai.meituan.com/openh5/search/globalpage*", url):
+        try:
+            start = time.perf_counter()
+            error = False
             try:
-                res = flow.response.json()
-                msg = f"\n美团 {url[:50]}\n"
-                self.add_text.emit(msg)
-                self.thread.submit(self.meituan, res)
+                rows = parser.parse(content, ctx)
             except Exception as e:
-                logger.error(f"解析美团响应失败: {e}")
-                return
-
-        # 淘宝天猫
-        elif re.match(
-            "https://h5api.m.taobao.com/h5/mtop.relationrecommend.wirelessrecommend.recommend/2.0/*",
-            url,
-        ):
-            res = flow.response.text
-            msg = f'\n淘宝天猫 {url.split("?")[0]}\n'
-            self.add_text.emit(msg)
-            self.thread.submit(self.taobao, res)
-
-        # 饿了么
-        elif re.match(
-            "https://waimai-guide.ele.me/h5/mtop.relationrecommend.tinyapprecommend.recommend*",
-            url,
-        ) or re.match(
-            "https://waimai-guide.ele.me/h5/mtop.relationrecommend.elemetinyapprecommend.recommend*",
-            url,
-        ):
+                error = True
+                rows = []
+                logger.error(f"解析{route.name}数据失败: {e}")
+            finally:
+                self.router.record(route.name, time.perf_counter() - start, error)
+
+            self.save_rows(route, rows, filename, url)
+        finally:
+            self.end_parse(filename)
+
+    def on_parsed(
+        self, route: Route, ctx: ParseContext, filename: Path, url: str, future: Future
+    ) -> None:
+        """子进程解析完成后调用, 补全精简的行并保存"""
+        try:
             try:
-                res = flow.response.json()
-
-                # 检查数据有效性
-                if (
-                    not res
-                    or not res.get("data")
-                    or not res.get("data").get("result")
-                    or not res.get("data").get("result")[0].get("listItems")
-                ):
-                    return
-
-                msg = f'\n饿了么 {url.split("?")[0]}\n'
-                self.add_text.emit(msg)
-                self.thread.submit(self.ele, res)
+                compact_rows, seconds = future.result()
             except Exception as e:
-                logger.error(f"解析饿了么响应失败: {e}")
+                self.router.record(route.name, 0.0, error=True)
+                logger.error(f"解析{route.name}数据失败: {e}")
                 return
+
+            self.router.record(route.name, seconds)
+            self.save_rows(
+                route, [ctx.expand(row) for row in compact_rows], filename, url
+            )
+        finally:
+            self.end_parse(filename)
+
+    def save_rows(self, route: Route, rows: list, filename: Path, url: str) -> None:
+        """把解析出的行交给写线程"""
+        if not rows:
+            return
+
+        self.add_text.emit(f"\n{route.name} {url.split('?')[0]}\n")
+        self.writer.put(filename, rows, route.handler.platform)
@@ -0,0 +1,203 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    令牌桶限速
+
+    多个标签页共用同一个平台的 RateLimiter, 保证这个平台的总请求速度不超过 rate
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: 每分钟最多多少次, 0 表示不限速
+            burst: 空闲后最多可以连续发出多少次
+        """
+        self.rate = rate
+        self.burst = burst
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate: float) -> None:
+        """调整限速"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate / 60
+            )
+        self.updated = now
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> float:
+        """
+        取得一个令牌, 没有令牌时休眠到可以发出请求为止
+
+        Args:
+            stop: 设置后立即返回
+
+        Returns:
+            float: 等待的时间, 单位秒
+        """
+        with self.lock:
+            if self.rate <= 0:
+                return 0.0
+
+            self._refill(time.monotonic())
+
+            # 令牌可以为负数, 表示已经被前面的线程预订
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens * 60 / self.rate
+
+        if wait > 0:
+            if stop is not None:
+                stop.wait(wait)
+            else:
+                time.sleep(wait)
+
+        return wait
+
+
+class AdaptivePacer:
+    """
+    自适应的操作间隔
+
+    根据验证码出现的频率调整滑动、翻页之间的间隔和每页滑动的次数:
+    一切正常时逐渐缩短到 min_delay, 出现验证码时成倍增加
+
+    同时统计从翻页到搜索结果 (XHR) 返回的延迟, 不包括页面加载和等待验证码的时间
+
+    同一个平台的所有标签页共用一个实例
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_delay: float = 1.0,
+        min_delay: float = 0.2,
+        max_delay: float = 8.0,
+        min_scrolls: int = 4,
+        max_scrolls: int = 12,
+        recover: float = 0.85,
+        captcha_backoff: float = 2.0,
+        jitter: float = 0.3,
+    ):
+        """
+        Args:
+            name: 平台名称, 用于日志
+            min_scrolls: 一切正常时每页滑动的次数
+            max_scrolls: 间隔达到 max_delay 时每页滑动的次数
+            recover: 每次正常返回后, 间隔乘以这个系数
+            captcha_backoff: 每次出现验证码后, 间隔乘以这个系数
+            jitter: 实际休眠时间在间隔上下浮动的比例, 避免操作过于规律
+        """
+        self.name = name
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_scrolls = min_scrolls
+        self.max_scrolls = max_scrolls
+        self.recover = recover
+        self.captcha_backoff = captcha_backoff
+        self.jitter = jitter
+
+        self.lock = threading.Lock()
+        self.delay = initial_delay
+
+        # 延迟的指数移动平均
+        self.latency: Optional[float] = None
+
+        self.captchas = 0
+
+        # 最近一分钟内的请求时间, 用于计算每分钟请求数
+        self.requests: deque[float] = deque()
+
+    def _clamp(self, value: float) -> float:
+        return max(self.min_delay, min(self.max_delay, value))
+
+    def record_latency(self, seconds: float) -> None:
+        """
+        记录一次正常返回的延迟, 并缩短间隔
+
+        Args:
+            seconds: 从滑动、翻页到第一个 XHR 返回的时间
+        """
+        with self.lock:
+            self.latency = (
+                seconds if self.latency is None else 0.3 * seconds + 0.7 * self.latency
+            )
+
+            self.delay = self._clamp(self.delay * self.recover)
+
+    def record_captcha(self) -> None:
+        """记录一次验证码, 并增加间隔"""
+        with self.lock:
+            self.captchas += 1
+            self.delay = self._clamp(self.delay * self.captcha_backoff)
+
+    def record_request(self) -> None:
+        """记录一次请求 (搜索、翻页)"""
+        now = time.monotonic()
+
+        with self.lock:
+            self.requests.append(now)
+            while self.requests and now - self.requests[0] > 60:
+                self.requests.popleft()
+
+    def requests_per_minute(self) -> int:
+        now = time.monotonic()
+
+        with self.lock:
+            while self.requests and now - self.requests[0] > 60:
+                self.requests.popleft()
+            return len(self.requests)
+
+    def scroll_steps(self) -> int:
+        """
+        每页滑动的次数
+
+        间隔越长 (最近出现过验证码) 滑动次数越多, 一切正常时接近 min_scrolls
+        """
+        with self.lock:
+            ratio = (self.delay - self.min_delay) / (self.max_delay - self.min_delay)
+
+        steps = self.min_scrolls + ratio * (self.max_scrolls - self.min_scrolls)
+        steps *= random.uniform(1 - self.jitter, 1 + self.jitter)
+
+        return max(self.min_scrolls, min(self.max_scrolls, round(steps)))
+
+    def sleep(self, stop: Optional[threading.Event] = None) -> float:
+        """
+        按当前间隔休眠
+
+        Returns:
+            float: 实际休眠的时间, 单位秒
+        """
+        with self.lock:
+            delay = self.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+        if stop is not None:
+            stop.wait(delay)
+        else:
+            time.sleep(delay)
+
+        return delay
+
+    def summary(self) -> str:
+        with self.lock:
+            latency = "-" if self.latency is None else f"{self.latency:.2f}s"
+            delay = self.delay
+            captchas = self.captchas
+
+        return (
+            f"{self.name}: {self.requests_per_minute()} 次/分钟, "
+            f"间隔 {delay:.2f}s, 平均延迟 {latency}, 验证码 {captchas} 次"
+        )
@@ -0,0 +1,612 @@
+"""
+各平台搜索结果的解析器
+
+代理插件 (utils/mitm_addon.py)、浏览器自动化 (utils/jd.py、utils/tb.py) 和离线回放共用同一套解析器,
+解析器只负责把响应转换为行, 保存由调用方统一处理
+
+每一行的格式:
+    [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Any, Iterable, Iterator, Optional, Union
+
+import shortuuid
+from loguru import logger
+from lxml import etree
+
+from utils.medicineID import MEDICINE_ID
+
+# 自家店铺, 不需要排查
+EXCLUDED_STORES = ("乐药师大药房旗舰店", "乐药师药品专卖店")
+
+# 拼多多上自家店铺的 mall_id
+EXCLUDED_PDD_MALL_ID = "397292525"
+
+CHINESE_PATTERN = re.compile(r"[\u4e00-\u9fff]+", re.UNICODE)
+JSONP_PATTERN = re.compile(r"^\s*mtopjsonp\d+\(")
+
+# 代理中这两个接口的商品不检查商品名, 与其他平台不同
+PROXY_UNCHECKED = ("京东 xhr", "淘宝天猫")
+
+Row = list
+
+# 精简的行, 只包含解析出的字段: (药店名称, 店铺主页, 资质名称, 药品图片, 挂网价格, 平台)
+CompactRow = tuple
+
+
+class ParseContext:
+    """
+    解析时需要的搜索条件
+
+    代理和浏览器自动化对商品名的检查方式不同:
+        代理: 药品名必须包含, 并且至少包含一个品牌名 (match_all=True)
+        浏览器: 包含药品名或者其中一个品牌名即可 (match_all=False)
+    """
+
+    def __init__(
+        self,
+        keyword: str,
+        match_all: bool = False,
+        unchecked: Iterable[str] = (),
+    ):
+        """
+        Args:
+            keyword: 搜索关键词, 最后一个词为药品名, 前面的为品牌名
+            match_all: 是否要求药品名和品牌名都包含
+            unchecked: 不检查商品名的解析器名称
+        """
+        self.keyword = keyword or ""
+        self.match_all = match_all
+        self.unchecked = frozenset(unchecked)
+
+        keywords = self.keyword.split(" ")
+        self.brand_name, self.medicine_name = keywords[:-1], keywords[-1]
+
+        # 取药品名的前3个字符进行匹配，如果药品名长度不足3则用全部
+        self.medicine_prefix = (
+            self.medicine_name[:3]
+            if len(self.medicine_name) > 2
+            else self.medicine_name
+        )
+
+        self.medicine_id = MEDICINE_ID.get(self.keyword, "")
+
+    def check(self, parser: str, name: str) -> bool:
+        """
+        检查商品名称是否符合搜索条件
+
+        Args:
+            parser: 解析器名称
+            name: 商品名称
+        """
+        if parser in self.unchecked:
+            return True
+
+        if not self.keyword:
+            return False
+
+        if not self.match_all:
+            # 药品名和品牌名包含其中一个即可
+            return self.medicine_prefix in name or any(
+                brand in name for brand in self.brand_name
+            )
+
+        # 药品名必须在产品名中
+        if self.medicine_prefix not in name:
+            return False
+
+        # 特殊处理"一口"品牌
+        if "一口" in self.brand_name:
+            return "一口" in name
+
+        # 至少要包含其中一个品牌名
+        return any(brand in name for brand in self.brand_name)
+
+    def row(
+        self,
+        store_name: str,
+        store_url: str,
+        image: str,
+        price: Any,
+        platform: str,
+        cert_name: str = "",
+    ) -> Row:
+        """使用搜索关键词作为药品名, 生成一行数据"""
+        return [
+            shortuuid.uuid(),
+            str(store_name),
+            str(store_url),
+            str(cert_name),
+            self.keyword,
+            self.medicine_id,
+            str(image),
+            str(price),
+            platform,
+            time.strftime("%Y-%m-%d", time.localtime()),
+        ]
+
+    def expand(self, compact: CompactRow) -> Row:
+        """把子进程返回的精简行还原为完整的行"""
+        store_name, store_url, cert_name, image, price, platform = compact
+        return self.row(store_name, store_url, image, price, platform, cert_name)
+
+
+class Parser:
+    """
+    解析器基类
+
+    子类设置 name、platform、host、path, 实现 parse_body
+
+    Attributes:
+        name: 解析器名称, 同名的解析器注册时会替换旧的
+        platform: 保存时的平台标签
+        host: 响应所在的域名
+        path: 路径正则, 从路径开头匹配, 路径包含查询参数
+        body: text 表示按文本解析, json 表示先解析为 json
+    """
+
+    name = ""
+    platform = ""
+    host = ""
+    path = ""
+    body = "text"
+
+    def __init__(self):
+        self.path_pattern = re.compile(self.path)
+
+    def match(self, host: str, path: str) -> bool:
+        return host == self.host and self.path_pattern.match(path) is not None
+
+    def decode(self, data: Union[bytes, str, dict]) -> Any:
+        """把原始响应转换为 parse_body 需要的类型"""
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+
+        if self.body == "json" and isinstance(data, str):
+            return json.loads(data)
+
+        return data
+
+    def parse(self, data: Union[bytes, str, dict], ctx: ParseContext) -> list[Row]:
+        """
+        解析一个响应
+
+        Args:
+            data: 原始响应, bytes、文本或者已经解析的 json
+
+        Returns:
+            list: 符合搜索条件的行
+
+        Raises:
+            Exception: 响应格式不对时抛出, 由调用方记录错误
+        """
+        if not data:
+            return []
+
+        return list(self.parse_body(self.decode(data), ctx))
+
+    def parse_body(self, res: Any, ctx: ParseContext) -> Iterator[Row]:
+        raise NotImplementedError
+
+
+def parse_compact(
+    parser: Parser, content: bytes, ctx: ParseContext
+) -> tuple[list[CompactRow], float]:
+    """
+    在子进程中解析响应
+
+    只返回解析出的字段, uuid、关键词、药品ID 和日期由主进程补全, 减少进程间传输的数据
+
+    Returns:
+        tuple: (精简的行, 解析耗时)
+    """
+    start = time.perf_counter()
+    rows = parser.parse(content, ctx)
+
+    return [
+        (row[1], row[2], row[3], row[6], row[7], row[8]) for row in rows
+    ], time.perf_counter() - start
+
+
+def first(element, xpath: str) -> str:
+    """xpath 的第一个结果, 没有结果时返回空字符串"""
+    result = element.xpath(xpath)
+    return str(result[0]) if result else ""
+
+
+class JdSearchParser(Parser):
+    """京东搜索结果页面"""
+
+    name = "京东"
+    platform = "京东"
+    host = "search.jd.com"
+    path = r"/Search"
+
+    def parse_body(self, res: str, ctx: ParseContext) -> Iterator[Row]:
+        html = etree.HTML(res)
+        if html is None:
+            return
+
+        for li in html.xpath('//div[@id="J_goodsList"]//li'):
+            # 药品名称
+            productName = li.xpath("string(./div/div[3]/a/em)")
+
+            if not ctx.check(self.name, productName):
+                continue
+
+            storeName = first(li, './div[1]/div[@class="p-shop"]/span/a/@title')
+            if storeName in EXCLUDED_STORES:
+                continue
+
+            storeUrl = first(li, "./div/div[5]/span/a/@href")
+            price = first(li, "./div/div[2]/strong/i/text()")
+
+            # 广告、推荐位等不完整的商品没有店铺、价格或链接, 跳过
+            if not storeName or not storeUrl or not price:
+                continue
+
+            yield ctx.row(
+                storeName,
+                "https:" + storeUrl,
+                "https:"
+                + first(li, './div[1]/div[@class="p-img"]//img/@data-lazy-img'),
+                price,
+                "京东",
+            )
+
+
+class JdXhrParser(Parser):
+    """京东滑动后加载的后 30 条数据"""
+
+    name = "京东 xhr"
+    platform = "京东"
+    host = "api.m.jd.com"
+    path = r"/\?appid=search-pc-java&functionId=pc_search_s_new"
+
+    def parse_body(self, res: str, ctx: ParseContext) -> Iterator[Row]:
+        # 只保留从 <li data-sku= 开始到 <script> 之前的商品列表
+        start = res.find("li data-sku=")
+        if start == -1:
+            return
+
+        start = res.rfind("\n", 0, start) + 1
+        end = res.find("<script>", start)
+        if end != -1:
+            end = res.rfind("\n", start, end) + 1 or end
+
+        html = etree.HTML(res[start:] if end == -1 else res[start:end])
+        if html is None:
+            return
+
+        for li in html.xpath("//li"):
+            try:
+                # 商品名称
+                productName = li.xpath("string(./div/div[3]//em)").split("\n")[0]
+
+                if not ctx.check(self.name, productName):
+                    continue
+
+                # 店铺名称
+                storeName = li.xpath('.//div[@class="p-shop"]/span/a/@title')[0]
+                if storeName in EXCLUDED_STORES:
+                    continue
+
+                yield ctx.row(
+                    storeName,
+                    "https:" + li.xpath(".//div/div[5]/span/a/@href")[0],
+                    "https:" + li.xpath("./div[1]//img/@data-lazy-img")[0],
+                    li.xpath(".//div/div[2]/strong/i/text()")[0],
+                    "京东",
+                )
+            except Exception as e:
+                logger.error(f"解析京东商品数据失败: {e}")
+
+
+class YfwParser(Parser):
+    """药房网药品页面, 页面本身就是搜索的药品, 不检查商品名"""
+
+    name = "药房网"
+    platform = "药房网"
+    host = "www.yaofangwang.com"
+    path = r"/medicine/\d+"
+
+    def parse_body(self, res: str, ctx: ParseContext) -> Iterator[Row]:
+        html = etree.HTML(res)
+        if html is None:
+            return
+
+        for li in html.xpath('//*[@id="slist"]/ul//li'):
+            try:
+                storeName = li.xpath('.//div[@class="clearfix"]/a/@title')[0]
+
+                # 药房网的资质名称即店铺名称
+                yield ctx.row(
+                    storeName,
+                    "https:" + li.xpath('.//div[@class="clearfix"]/a/@href')[0],
+                    "https:" + li.xpath('.//div[@class="img"]/a/img/@src')[0],
+                    li.xpath('.//div[@class="clearfix"]/a/@data-commodity_price')[0],
+                    "药房网",
+                    cert_name=storeName,
+                )
+            except Exception as e:
+                logger.error(f"解析药房网商品失败: {e}")
+
+
+def pdd_store_url(mall_id: str) -> str:
+    return f"https://mobile.yangkeduo.com/mall_page.html?mall_id={mall_id}"
+
+
+class PddSearchParser(Parser):
+    """拼多多搜索结果页面, 商品在 window.rawData 中"""
+
+    name = "拼多多"
+    platform = "拼多多"
+    host = "mobile.yangkeduo.com"
+    path = r"/search_result\.html"
+
+    RAW_DATA_PATTERN = re.compile(r"window\.rawData=(.*?);document")
+
+    def parse_body(self, res: str, ctx: ParseContext) -> Iterator[Row]:
+        raw_data_match = self.RAW_DATA_PATTERN.findall(res)
+        if not raw_data_match:
+            return
+
+        raw_data = json.loads("".join(raw_data_match))
+
+        # 获取商品列表
+        goods_list = (
+            raw_data.get("stores", {})
+            .get("store", {})
+            .get("data", {})
+            .get("ssrListData", {})
+            .get("list", [])
+        )
+
+        for data in goods_list:
+            try:
+                mall_id = str(data["mallEntrance"]["mall_id"])
+                if mall_id == EXCLUDED_PDD_MALL_ID:
+                    continue
+
+                if not ctx.check(self.name, data.get("goodsName", "")):
+                    continue
+
+                yield ctx.row(
+                    "",
+                    pdd_store_url(mall_id),
+                    data.get("imgUrl", ""),
+                    data.get("priceInfo", ""),
+                    "拼多多",
+                )
+            except Exception as e:
+                logger.error(f"解析拼多多商品失败: {e}")
+
+
+class PddXhrParser(Parser):
+    """拼多多翻页时的搜索接口"""
+
+    name = "拼多多 xhr"
+    platform = "拼多多"
+    host = "mobile.yangkeduo.com"
+    path = r"/proxy/api/search"
+    body = "json"
+
+    def parse_body(self, res: dict, ctx: ParseContext) -> Iterator[Row]:
+        for item in res.get("items", []):
+            try:
+                data = item.get("item_data", {}).get("goods_model", {})
+
+                mall_id = str(data["mall_id"])
+                if mall_id == EXCLUDED_PDD_MALL_ID:
+                    continue
+
+                if not ctx.check(self.name, data.get("goods_name", "")):
+                    continue
+
+                yield ctx.row(
+                    "",
+                    pdd_store_url(mall_id),
+                    data.get("hd_url", ""),
+                    data.get("price_info", ""),
+                    "拼多多",
+                )
+            except Exception as e:
+                logger.error(f"解析拼多多商品失败: {e}")
+
+
+class MeituanParser(Parser):
+    """美团外卖搜索, 只保留快递电商店铺"""
+
+    name = "美团"
+    platform = "美团"
+    host = "i.waimai.meituan.com"
+    path = r"/openh5/search/globalpage"
+    body = "json"
+
+    def parse_body(self, res: dict, ctx: ParseContext) -> Iterator[Row]:
+        if not isinstance(res.get("data"), dict):
+            return
+
+        for module in res["data"].get("module_list", []):
+            try:
+                string_data = module.get("string_data")
+                if not string_data:
+                    continue
+
+                data = json.loads(string_data)
+                storeName = data.get("name", "")  # 药店名称
+
+                # 只处理快递电商店铺
+                if storeName in EXCLUDED_STORES or "快递电商" not in storeName:
+                    continue
+
+                # 去除后缀
+                storeName = storeName.replace("（快递电商）", "")
+
+                for product in data.get("product_list", []):
+                    if not ctx.check(self.name, product.get("product_name", "")):
+                        continue
+
+                    yield ctx.row(
+                        storeName,
+                        "",
+                        product.get("picture", ""),
+                        product.get("price", ""),
+                        "美团（快递）",
+                    )
+            except Exception as e:
+                logger.error(f"解析美团模块失败: {e}")
+
+
+class TaobaoParser(Parser):
+    """淘宝天猫搜索接口, jsonp 格式"""
+
+    name = "淘宝天猫"
+    platform = "淘宝天猫"
+    host = "h5api.m.taobao.com"
+    path = r"/h5/mtop\.relationrecommend\.wirelessrecommend\.recommend/2\.0"
+
+    def parse_body(self, res: str, ctx: ParseContext) -> Iterator[Row]:
+        # 将 JSONP 转为 JSON, 去掉最后一个括号
+        data = json.loads(JSONP_PATTERN.sub("", res).rstrip()[:-1])
+
+        for item in (data.get("data") or {}).get("itemsArray") or []:
+            try:
+                shop = item.get("shopInfo")
+                if not shop:
+                    continue
+
+                storeName = shop.get("title", "")  # 店铺名称
+                if storeName in EXCLUDED_STORES:
+                    continue
+
+                # 只保留标题中的中文, 并去掉最后 3 个字
+                productName = "".join(CHINESE_PATTERN.findall(item.get("title", "")))
+                if not ctx.check(self.name, productName[:-3]):
+                    continue
+
+                yield ctx.row(
+                    storeName,
+                    "https:" + shop.get("url", ""),
+                    item.get("pic_path", ""),
+                    (item.get("priceShow") or {}).get("price", ""),
+                    "淘宝天猫",
+                )
+            except Exception as e:
+                logger.error(f"解析淘宝商品失败: {e}")
+
+
+class EleParser(Parser):
+    """饿了么搜索, 只保留快递发货的店铺"""
+
+    name = "饿了么"
+    platform = "饿了么"
+    host = "waimai-guide.ele.me"
+    path = r"/h5/mtop\.relationrecommend\.(?:tinyapp|elemetinyapp)recommend\.recommend"
+    body = "json"
+
+    def parse_body(self, res: dict, ctx: ParseContext) -> Iterator[Row]:
+        data = (res.get("data") or {}).get("result") or {}
+
+        if isinstance(data, list):
+            data = data[0] if data else {}
+
+        for item in data.get("listItems") or []:
+            try:
+                restaurant = item.get("info", {}).get("restaurant")
+                if restaurant is None:
+                    continue
+
+                storeName = restaurant.get("name", "")  # 药店名称
+
+                # 获取配送模式, 判断是否为快递
+                delivery_mode = restaurant.get("deliveryMode", {}).get("text", "")
+                if storeName in EXCLUDED_STORES or delivery_mode != "快递发货":
+                    continue
+
+                for food in item.get("info", {}).get("foods", []):
+                    if not ctx.check(self.name, food.get("name", "")):
+                        continue
+
+                    yield ctx.row(
+                        storeName,
+                        "",
+                        food.get("imagePath", ""),
+                        food.get("price", ""),
+                        "饿了么（快递）",
+                    )
+            except Exception as e:
+                logger.error(f"解析饿了么商品失败: {e}")
+
+
+class ParserRegistry:
+    """
+    解析器注册表
+
+    按域名分组, 注册同名的解析器会替换旧的, 可以在运行时替换某个平台的解析器
+    """
+
+    def __init__(self, parsers: Iterable[Parser] = ()):
+        self.lock = threading.Lock()
+        self.parsers: dict[str, Parser] = {}
+        self.hosts: dict[str, list[Parser]] = {}
+
+        # 修改后加一, 使用方据此判断是否需要重新建立路由
+        self.version = 0
+
+        for parser in parsers:
+            self.register(parser)
+
+    def _reindex(self) -> None:
+        hosts: dict[str, list[Parser]] = {}
+        for parser in self.parsers.values():
+            hosts.setdefault(parser.host, []).append(parser)
+
+        self.hosts = hosts
+        self.version += 1
+
+    def register(self, parser: Parser) -> None:
+        with self.lock:
+            self.parsers[parser.name] = parser
+            self._reindex()
+
+    def unregister(self, name: str) -> None:
+        with self.lock:
+            if self.parsers.pop(name, None) is not None:
+                self._reindex()
+
+    def get(self, name: str) -> Parser:
+        return self.parsers[name]
+
+    def all(self) -> list[Parser]:
+        with self.lock:
+            return list(self.parsers.values())
+
+    def find(self, host: str, path: str) -> Optional[Parser]:
+        """查找能解析这个响应的解析器"""
+        for parser in self.hosts.get(host, ()):
+            if parser.path_pattern.match(path):
+                return parser
+
+        return None
+
+
+def default_parsers() -> list[Parser]:
+    return [
+        JdSearchParser(),
+        JdXhrParser(),
+        YfwParser(),
+        PddSearchParser(),
+        PddXhrParser(),
+        MeituanParser(),
+        TaobaoParser(),
+        EleParser(),
+    ]
+
+
+# 默认的注册表, 代理、浏览器自动化和离线回放共用
+PARSERS = ParserRegistry(default_parsers())
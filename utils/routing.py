@@ -0,0 +1,173 @@
+import re
+import threading
+from typing import Any, NamedTuple, Optional, Union
+
+
+class Route(NamedTuple):
+    """
+    一条路由: 域名 + 路径前缀的正则, 命中后由 handler 解析响应
+
+    Attributes:
+        name: 路由名称, 用于统计和日志
+        host: 完整域名, 例如 search.jd.com
+        path: 预编译的路径正则, 从路径开头匹配, 路径包含查询参数
+        handler: 处理响应的对象, 例如 utils.parsers 中的解析器
+    """
+
+    name: str
+    host: str
+    path: re.Pattern
+    handler: Any
+
+
+class RouteStat:
+    """一条路由的命中次数和解析耗时"""
+
+    __slots__ = ("hits", "parsed", "errors", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.hits = 0
+        self.parsed = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.seconds / self.parsed * 1000 if self.parsed else 0.0
+
+
+class Router:
+    """
+    按域名分组的路由表
+
+    先用域名在字典中查找, 域名不在表中的请求 (图片、js 等) 直接返回,
+    再依次匹配这个域名下预编译的路径正则
+    """
+
+    def __init__(self):
+        self.routes: dict[str, list[Route]] = {}
+
+        self.lock = threading.Lock()
+        self.stats: dict[str, RouteStat] = {}
+
+        # 没有命中任何路由的响应数
+        self.skipped = 0
+
+    def add(self, name: str, host: str, path: Union[str, re.Pattern], handler) -> None:
+        """
+        注册一条路由
+
+        Args:
+            path: 路径正则, 从路径开头匹配
+        """
+        route = Route(name, host, re.compile(path), handler)
+        self.routes.setdefault(host, []).append(route)
+
+        with self.lock:
+            self.stats.setdefault(name, RouteStat())
+
+    def clear(self) -> None:
+        """删除所有路由, 保留统计"""
+        self.routes = {}
+
+    def match(self, host: str, path: str) -> Optional[Route]:
+        """
+        查找请求对应的路由, 并记录命中次数
+
+        Returns:
+            Route: 没有匹配的路由时返回 None
+        """
+        routes = self.routes.get(host)
+        if routes is not None:
+            for route in routes:
+                if route.path.match(path):
+                    with self.lock:
+                        self.stats[route.name].hits += 1
+                    return route
+
+        with self.lock:
+            self.skipped += 1
+
+        return None
+
+    def record(self, name: str, seconds: float, error: bool = False) -> None:
+        """记录一次解析的耗时"""
+        with self.lock:
+            stat = self.stats[name]
+            stat.parsed += 1
+            stat.seconds += seconds
+            stat.max_seconds = max(stat.max_seconds, seconds)
+            if error:
+                stat.errors += 1
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """各路由统计的副本, 可以在其他线程中读取"""
+        with self.lock:
+            return {
+                name: {
+                    "hits": stat.hits,
+                    "parsed": stat.parsed,
+                    "errors": stat.errors,
+                    "avg_ms": stat.avg_ms,
+                    "max_ms": stat.max_seconds * 1000,
+                }
+                for name, stat in self.stats.items()
+            }
+
+    def summary(self) -> str:
+        lines = [
+            f"{name}: 命中 {s['hits']:.0f} 次, 解析 {s['parsed']:.0f} 次, "
+            f"平均 {s['avg_ms']:.1f}ms, 最长 {s['max_ms']:.1f}ms, 出错 {s['errors']:.0f} 次"
+            for name, s in self.snapshot().items()
+            if s["hits"]
+        ]
+
+        with self.lock:
+            lines.append(f"未命中: {self.skipped} 次")
+
+        return "\n".join(lines)
+
+
+class FlowStats:
+    """
+    代理流量统计
+
+    只有命中路由的响应会被完整缓冲, 其余的响应直接流式转发
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.streamed = 0
+        self.buffered = 0
+        self.buffered_bytes = 0
+
+        # 命中路由的请求从发出到响应结束的耗时
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+    def add_streamed(self) -> None:
+        with self.lock:
+            self.streamed += 1
+
+    def add_buffered(self, size: int, latency: float) -> None:
+        with self.lock:
+            self.buffered += 1
+            self.buffered_bytes += size
+            self.latency_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+
+    def snapshot(self) -> dict[str, float]:
+        with self.lock:
+            return {
+                "streamed": self.streamed,
+                "buffered": self.buffered,
+                "buffered_mb": self.buffered_bytes / 1024 / 1024,
+                "avg_latency_ms": (
+                    self.latency_seconds / self.buffered * 1000
+                    if self.buffered
+                    else 0.0
+                ),
+                "max_latency_ms": self.max_latency_seconds * 1000,
+            }
@@ -1,13 +1,95 @@
+import queue
+import threading
+import time
 from pathlib import Path
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Dict, Tuple
 
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment, Font
 import polars as pl
-import shortuuid
+import xlsxwriter
 from loguru import logger
 from PySide6.QtCore import Signal
 
+from utils.staging import get_store, release_store
+
+# 列宽和对齐方式: {列名: (列宽, 水平对齐)}
+COLUMN_FORMATS = {
+    "uuid": (30, "center"),
+    "药店名称": (45, "center"),
+    "店铺主页": (20, "left"),
+    "资质名称": (50, "center"),
+    "药品名": (35, "center"),
+    "药品ID": (15, "center"),
+    "药品图片": (20, "left"),
+    "挂网价格": (23, "center"),
+    "平台": (15, "center"),
+    "排查日期": (18, "center"),
+}
+
+# 数字、日期列的显示格式: {列名: 格式}, 只对数字和日期单元格生效, 文本原样显示
+NUMBER_FORMATS = {
+    "药品ID": "0",
+    "挂网价格": "0.00",
+}
+
+# 没有单独设置格式的日期列, 按类型使用的格式
+DTYPE_FORMATS = {
+    pl.Date: "yyyy-mm-dd",
+    pl.Datetime: "yyyy-mm-dd hh:mm:ss",
+}
+
+
+def write_styled_excel(df: pl.DataFrame, filename: Path) -> None:
+    """
+    一次性写入带格式的 Excel 文件
+
+    表头字体、列宽、缩放和对齐方式都在写入时以列格式设置, 不需要再用 openpyxl 重新打开逐个单元格修改
+
+    Args:
+        df: 要写入的数据
+        filename: 保存路径
+    """
+    workbook = xlsxwriter.Workbook(
+        filename,
+        {
+            # 逐行写入, 内存占用与行数无关
+            "constant_memory": True,
+            # 保持原样写入字符串, 不自动转换为链接或数字
+            "strings_to_urls": False,
+            "strings_to_numbers": False,
+            "strings_to_formulas": False,
+        },
+    )
+
+    try:
+        worksheet = workbook.add_worksheet()
+
+        # 设置缩放为 100%
+        worksheet.set_zoom(100)
+
+        # 设置每一列的列宽、对齐方式和数字格式, 没有单独设置格式的单元格使用列格式
+        for col, (name, dtype) in enumerate(df.schema.items()):
+            width, align = COLUMN_FORMATS.get(name, (20, "center"))
+            properties = {"align": align, "valign": "vcenter"}
+
+            num_format = NUMBER_FORMATS.get(name) or DTYPE_FORMATS.get(dtype.base_type())
+            if num_format:
+                properties["num_format"] = num_format
+
+            cell_format = workbook.add_format(properties)
+            worksheet.set_column(col, col, width, cell_format)
+
+        # 设置第一行字体、对齐方式及行高
+        header_format = workbook.add_format(
+            {"bold": True, "font_size": 15, "align": "center", "valign": "vcenter"}
+        )
+        worksheet.set_row(0, 25)
+        worksheet.write_row(0, 0, df.columns, header_format)
+
+        for row, values in enumerate(df.iter_rows(), start=1):
+            worksheet.write_row(row, 0, values)
+    finally:
+        workbook.close()
+
 
 class Save:
     logInfo = Signal(str)
@@ -18,7 +100,7 @@ class Save:
         self, filename: Path, datas: List[List[Any]], tag: Optional[str] = None
     ) -> None:
         """
-        保存数据到Excel文件
+        保存数据到 Excel 文件对应的暂存库, 调用 export 时才真正写入 Excel
 
         Args:
             filename: 保存路径
@@ -29,115 +111,230 @@ class Save:
         if not datas:
             return
 
-        headers = [
-            "uuid",
-            "药店名称",
-            "店铺主页",
-            "资质名称",
-            "药品名",
-            "药品ID",
-            "药品图片",
-            "挂网价格",
-            "平台",
-            "排查日期",
-        ]
-
-        new_data = pl.DataFrame(datas, schema=headers, orient="row")
-        existing_df: Optional[pl.DataFrame] = None
-
-        #  如果文件存在, 读取数据并去重
-        if filename.exists():
-            try:
-                existing_df = pl.read_excel(filename)
-            except Exception as e:
-                logger.error(f"读取Excel文件失败: {e}")
-                self.logInfo.emit(f"读取Excel文件失败: {e}\n请检查文件格式或路径")
-                return
+        store = get_store(filename)
+
+        try:
+            saved_count = store.append(datas)
+            total = store.count()
+        except Exception as e:
+            logger.error(f"保存数据到暂存库失败: {e}")
+            self.logInfo.emit(f"保存数据到暂存库失败: {e}\n请检查文件格式或路径")
+            return
+
+        msg = f"\n\n{filename.stem} {tag}-保存了 {saved_count} 条, 数据总条数: {total}\n\n"
+        self.logInfo.emit(msg)
+
+    def export(self, filename: Path) -> None:
+        """
+        把暂存库中的数据一次性写入 Excel 文件, 并设置格式
+
+        Args:
+            filename: 保存路径
+        """
+        store = get_store(filename)
 
-            # 对齐数据类型, 全部转换为字符串
-            existing_df = existing_df.with_columns(pl.all().cast(pl.Utf8))
-            new_data = new_data.with_columns(pl.all().cast(pl.Utf8))
+        if not store.db_path.exists():
+            return
 
-            # 去重
-            combined_df = pl.concat([existing_df, new_data], how="vertical")
-            combined_df = combined_df.unique(
-                subset=["药店名称", "店铺主页", "药品名", "挂网价格", "平台"]
-            )
+        try:
+            combined_df = store.to_dataframe()
+        except Exception as e:
+            logger.error(f"读取暂存库失败: {e}")
+            self.logInfo.emit(f"读取暂存库失败: {e}")
+            return
 
-        else:
-            combined_df = new_data
+        if combined_df.is_empty():
+            return
+
+        # 暂存库写入时已经按哈希索引去重, 这里不需要再去重
 
         # 按平台列升序排序
         combined_df = combined_df.sort("平台")
 
         # 保存数据到Excel
         try:
-            combined_df.write_excel(filename)
+            write_styled_excel(combined_df, filename)
         except Exception as e:
             logger.error(f"保存数据到Excel失败: {e}")
             self.logInfo.emit(f"保存数据到Excel失败: {e}\n请检查文件格式或路径")
             return
 
-        saved_count = (
-            combined_df.shape[0] - existing_df.shape[0]
-            if existing_df is not None
-            else combined_df.shape[0]
-        )
+        try:
+            store.mark_exported()
+        except Exception as e:
+            logger.error(f"记录导出时间失败: {e}")
+        finally:
+            # 导出后关闭连接, 下次写入时重新打开并检查 Excel 是否被修改过
+            release_store(filename)
 
-        msg = f"\n\n{filename.stem} {tag}-保存了 {saved_count} 条, 数据总条数: {combined_df.shape[0]}\n\n"
+        msg = f"\n\n{filename.stem} 导出 Excel 完成, 数据总条数: {combined_df.shape[0]}\n\n"
         self.logInfo.emit(msg)
 
-        # 格式化 Excel 文件
+
+class SaveWriter(threading.Thread):
+    """
+    单写线程
+
+    各个解析线程只把数据放进有界队列, 由该线程按文件合并后,
+    每隔 flush_interval 秒或累计 flush_rows 条时统一写入暂存库
+    """
+
+    # 停止标记
+    _STOP = object()
+
+    def __init__(
+        self,
+        save: Save,
+        max_queue: int = 1000,
+        flush_interval: float = 1.0,
+        flush_rows: int = 500,
+    ):
+        """
+        Args:
+            save: 实际负责写入的 Save 实例
+            max_queue: 队列上限, 队列满时 put 会阻塞 (背压)
+            flush_interval: 最长多久写入一次, 单位秒
+            flush_rows: 累计多少条数据立即写入
+        """
+        super().__init__(daemon=True)
+
+        self.save = save
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+
+        # 待写入的数据, 按文件合并: {文件: (数据, 平台标签)}
+        self.pending: Dict[Path, Tuple[List[List[Any]], List[str]]] = {}
+        self.pending_rows = 0
+
+        self.closed = False
+
+    def backlog(self) -> int:
+        """队列中还未处理的批次数"""
+        return self.queue.qsize()
+
+    def put(
+        self,
+        filename: Path,
+        datas: List[List[Any]],
+        tag: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        提交要保存的数据, 队列满时阻塞等待
+
+        Args:
+            filename: 保存路径
+            datas: 要保存的数据列表
+            tag: 标签-指明哪个平台
+            timeout: 最长等待时间, None 表示一直等待
+
+        Returns:
+            bool: 是否提交成功
+        """
+        if not datas or filename is None:
+            return False
+
+        if self.closed:
+            logger.error(f"写入线程已关闭, 丢弃 {len(datas)} 条数据")
+            return False
+
+        try:
+            self.queue.put_nowait(("save", filename, datas, tag))
+        except queue.Full:
+            logger.warning(f"写入队列已满 ({self.queue.maxsize}), 等待写入...")
+            try:
+                self.queue.put(("save", filename, datas, tag), timeout=timeout)
+            except queue.Full:
+                logger.error(f"写入队列已满, 丢弃 {len(datas)} 条数据")
+                return False
+
+        return True
+
+    def export(self, filename: Path) -> None:
+        """写入已提交的数据后, 生成 Excel 文件"""
+        if filename is None or self.closed:
+            return
+
+        self.queue.put(("export", filename, None, None))
+
+    def flush(self) -> None:
+        """
+        把合并后的数据写入暂存库
+
+        一个文件写入失败只丢弃这个文件的这一批数据, 不影响其他文件
+        """
+        pending, self.pending = self.pending, {}
+        self.pending_rows = 0
+
+        for filename, (datas, tags) in pending.items():
+            try:
+                self.save.to_excel(filename, datas, "/".join(tags))
+            except Exception as e:
+                logger.error(f"写入 {filename.name} 失败, 丢弃 {len(datas)} 条数据: {e}")
+
+    def handle(self, item: tuple) -> bool:
+        """
+        处理队列中的一项
+
+        Returns:
+            bool: 是否已经写入暂存库
+        """
+        kind, filename, datas, tag = item
+
+        if kind == "save":
+            rows, tags = self.pending.setdefault(filename, ([], []))
+            rows.extend(datas)
+            if tag and tag not in tags:
+                tags.append(tag)
+            self.pending_rows += len(datas)
+            return False
+
+        self.flush()
+
         try:
-            wb = load_workbook(filename)
-            ws = wb.active
-
-            # 设置缩放为 100%
-            ws.sheet_view.zoomScale = 100
-
-            # 设置第一行字体及对齐方式
-            for cell in ws[1]:
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.font = Font(size=15, bold=True)
-
-            # 设置第一行的行高
-            ws.row_dimensions[1].height = 25
-
-            # 定义列宽和对齐方式
-            column_formats = {
-                "A": 30,  # uuid
-                "B": 45,  # 药店名称
-                "C": 20,  # 店铺主页
-                "D": 50,  # 资质名称
-                "E": 35,  # 药品名称
-                "F": 15,  # 药品ID
-                "G": 20,  # 药品图片
-                "H": 23,  # 挂网价格
-                "I": 15,  # 平台
-                "J": 18,  # 排查日期
-            }
-
-            for col, width in column_formats.items():
-                ws.column_dimensions[col].width = width
-                for row in ws.iter_rows(min_row=2):
-                    for cell in row:
-                        # 第 3 列店铺主页居左
-                        if cell.column == 2:
-                            cell.alignment = Alignment(
-                                horizontal="left", vertical="center"
-                            )
-                        # 第 7 列药品图片居左
-                        elif cell.column == 6:
-                            cell.alignment = Alignment(
-                                horizontal="left", vertical="center"
-                            )
-                        else:
-                            cell.alignment = Alignment(
-                                horizontal="center", vertical="center"
-                            )
-
-            # 保存格式化后的文件
-            wb.save(filename)
+            self.save.export(filename)
         except Exception as e:
-            self.logInfo.emit(f"格式化Excel文件失败: {e}")
-            logger.error(f"格式化Excel文件失败: {e}")
+            logger.error(f"导出 {filename.name} 失败: {e}")
+
+        return True
+
+    def run(self) -> None:
+        last_flush = time.monotonic()
+
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self.flush()
+                break
+
+            # 写入线程不能因为异常退出, 否则队列满后所有 put 会一直阻塞
+            if item is not None:
+                try:
+                    if self.handle(item):
+                        last_flush = time.monotonic()
+                except Exception as e:
+                    logger.exception(f"写入线程处理 {item[0]} 出错: {e}")
+
+            if (
+                self.pending_rows >= self.flush_rows
+                or time.monotonic() - last_flush >= self.flush_interval
+            ):
+                if self.pending:
+                    self.flush()
+                last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """停止写入线程, 并写入剩余的数据"""
+        if self.closed:
+            return
+
+        self.closed = True
+        self.queue.put(self._STOP)
+        self.join()
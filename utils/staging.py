@@ -0,0 +1,286 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Any, Optional, Set, Tuple, Dict
+
+import polars as pl
+from loguru import logger
+
+# Excel 的表头, 暂存库的列与之一一对应
+HEADERS = [
+    "uuid",
+    "药店名称",
+    "店铺主页",
+    "资质名称",
+    "药品名",
+    "药品ID",
+    "药品图片",
+    "挂网价格",
+    "平台",
+    "排查日期",
+]
+
+# 用于去重的列
+DEDUP_COLUMNS = ["药店名称", "店铺主页", "药品名", "挂网价格", "平台"]
+DEDUP_INDEXES = [HEADERS.index(c) for c in DEDUP_COLUMNS]
+
+
+def row_key(row: List[Optional[str]]) -> str:
+    """根据去重列计算一行数据的哈希值"""
+    values = ("" if row[i] is None else row[i] for i in DEDUP_INDEXES)
+    return hashlib.blake2b(
+        "\x1f".join(values).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+class StagingStore:
+    """
+    Excel 文件对应的暂存库
+
+    解析出来的数据只追加到 Excel 旁边的 SQLite 文件中, 不再每次读写整个 Excel,
+    需要时再通过 Save.export 一次性生成带格式的 Excel 文件
+
+    同时在暂存库中维护去重列的哈希索引, 新数据写入前在内存中过滤重复行
+
+    每次导出后记录 Excel 的修改时间, 打开时如果 Excel 被删除或者在导出后被修改过 (例如删除了行),
+    说明暂存库已经过期, 删除后根据 Excel 重新建立
+    """
+
+    def __init__(self, filename: Path):
+        """
+        Args:
+            filename: 对应的 Excel 文件路径
+        """
+        self.filename = filename
+
+        # 暂存库放在 Excel 旁边, 以 . 开头避免被当成 Excel 处理
+        self.db_path = filename.with_name(f".{filename.stem}.staging.db")
+
+        # 多个解析线程可能同时写入, 用锁串行化
+        self.lock = threading.Lock()
+
+        self.conn: Optional[sqlite3.Connection] = None
+
+        # 已保存数据的去重哈希
+        self.keys: Set[str] = set()
+
+    def is_stale(self) -> bool:
+        """
+        暂存库是否已经过期
+
+        只有导出过的暂存库才检查, 还没导出过的数据不能丢
+        """
+        if not self.db_path.exists():
+            return False
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'exported_mtime'"
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return False
+
+        if not self.filename.exists():
+            return True
+
+        return self.filename.stat().st_mtime_ns != int(row[0])
+
+    def open(self) -> None:
+        """打开暂存库, 第一次创建时导入已存在的 Excel 数据"""
+        if self.conn is not None:
+            return
+
+        if self.is_stale():
+            logger.info(f"Excel 在导出后被修改或删除, 重建暂存库: {self.db_path}")
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.db_path}{suffix}").unlink(missing_ok=True)
+
+        is_new = not self.db_path.exists()
+
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        columns = ", ".join(f'"{h}" TEXT' for h in HEADERS)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS rows ({columns})")
+        conn.execute("CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        self.keys = {key for (key,) in conn.execute("SELECT key FROM keys")}
+
+        # 没有索引的旧暂存库, 根据已有数据重建索引, 同时删除重复行, 每个哈希只保留 rowid 最小的一行
+        if not self.keys:
+            first: Dict[str, int] = {}
+            duplicates: List[int] = []
+            for rowid, *row in conn.execute("SELECT rowid, * FROM rows ORDER BY rowid"):
+                key = row_key(row)
+                if key in first:
+                    duplicates.append(rowid)
+                else:
+                    first[key] = rowid
+
+            self.keys = set(first)
+            with conn:
+                conn.executemany(
+                    "DELETE FROM rows WHERE rowid = ?", ((r,) for r in duplicates)
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO keys VALUES (?)",
+                    ((key,) for key in self.keys),
+                )
+
+            if duplicates:
+                logger.info(f"暂存库删除重复行 {len(duplicates)} 条: {self.db_path}")
+
+        # 旧的 Excel 文件先导入暂存库, 保证导出时不丢数据
+        if is_new and self.filename.exists():
+            try:
+                existing_df = pl.read_excel(self.filename)
+                existing_df = existing_df.with_columns(pl.all().cast(pl.Utf8))
+                existing_df = existing_df.select(
+                    [
+                        (
+                            pl.col(h)
+                            if h in existing_df.columns
+                            else pl.lit(None, dtype=pl.Utf8).alias(h)
+                        )
+                        for h in HEADERS
+                    ]
+                )
+                self._insert(conn, self._filter(existing_df.rows()))
+            except Exception:
+                conn.close()
+                self.keys = set()
+                self.db_path.unlink(missing_ok=True)
+                raise
+
+        self.conn = conn
+
+    def _filter(self, datas: List[List[Any]]) -> List[Tuple[str, List[Any]]]:
+        """
+        过滤掉已保存过的数据 (包括同一批中的重复行), 只需 O(批次大小)
+
+        Returns:
+            list: (哈希, 数据) 列表
+        """
+        rows = []
+
+        for row in datas:
+            row = [str(v) if v is not None else None for v in row]
+            key = row_key(row)
+
+            if key in self.keys:
+                continue
+
+            self.keys.add(key)
+            rows.append((key, row))
+
+        return rows
+
+    @staticmethod
+    def _insert(
+        conn: sqlite3.Connection, rows: List[Tuple[str, List[Any]]]
+    ) -> None:
+        if not rows:
+            return
+
+        placeholders = ", ".join("?" for _ in HEADERS)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO rows VALUES ({placeholders})", (row for _, row in rows)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO keys VALUES (?)", ((key,) for key, _ in rows)
+            )
+
+    def append(self, datas: List[List[Any]]) -> int:
+        """
+        追加数据到暂存库
+
+        Args:
+            datas: 要保存的数据列表
+
+        Returns:
+            int: 去重后实际保存的条数
+        """
+        with self.lock:
+            self.open()
+            rows = self._filter(datas)
+            try:
+                self._insert(self.conn, rows)
+            except Exception:
+                self.keys.difference_update(key for key, _ in rows)
+                raise
+
+        return len(rows)
+
+    def count(self) -> int:
+        """暂存库中的数据条数"""
+        with self.lock:
+            self.open()
+            return len(self.keys)
+
+    def to_dataframe(self) -> pl.DataFrame:
+        """读取暂存库中的全部数据"""
+        with self.lock:
+            self.open()
+            rows = self.conn.execute("SELECT * FROM rows").fetchall()
+
+        return pl.DataFrame(
+            rows, schema={h: pl.Utf8 for h in HEADERS}, orient="row"
+        )
+
+    def mark_exported(self) -> None:
+        """导出 Excel 后记录它的修改时间, 下次打开时据此判断 Excel 是否被修改过"""
+        mtime = self.filename.stat().st_mtime_ns
+
+        with self.lock:
+            self.open()
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('exported_mtime', ?)",
+                    (str(mtime),),
+                )
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+                logger.info(f"关闭暂存库: {self.db_path}")
+
+
+# 同一个 Excel 文件只对应一个暂存库实例, 保证内存中的哈希索引一致
+_stores: Dict[Path, StagingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(filename: Path) -> StagingStore:
+    """获取 Excel 文件对应的暂存库"""
+    key = filename.resolve()
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = StagingStore(filename)
+            _stores[key] = store
+
+    return store
+
+
+def release_store(filename: Path) -> None:
+    """关闭暂存库并从缓存中移除, 下次使用时重新打开"""
+    with _stores_lock:
+        store = _stores.pop(filename.resolve(), None)
+
+    if store is not None:
+        store.close()
@@ -1,143 +1,147 @@
-import json
 import random
-import re
 import time
 from pathlib import Path
+from typing import Optional
 
-import shortuuid
 from DrissionPage import Chromium
 from PySide6.QtCore import Signal
 
-from utils.medicineID import MEDICINE_ID
+from utils.direct_search import CaptchaRequired, DirectSearchClient, fetch_pages
+from utils.pacing import AdaptivePacer
+from utils.parsers import PARSERS, ParseContext
 from utils.save import Save
+from utils.wait import Waiter
+
+# 淘宝验证码页面的元素
+CAPTCHA_LOCATORS = ["text:验证码", "#nocaptcha"]
 
 
 class TB:
     logInfo = Signal(str)
 
-    def __init__(self, save_dir: Path):
-        self.medicine_name = None
-        self.brand_name = None
+    def __init__(
+        self,
+        save_dir: Path,
+        waiter: Optional[Waiter] = None,
+        tab=None,
+        pacer: Optional[AdaptivePacer] = None,
+    ):
+        """
+        Args:
+            waiter: 等待验证码等使用的 Waiter, 多个实例共用时统计合并在一起
+            tab: 使用的标签页, 多个标签页同时搜索时每个实例使用自己的标签页,
+                默认使用浏览器最新的标签页
+            pacer: 滑动、翻页的间隔, 多个标签页共用时根据整体的延迟和验证码调整
+        """
         self.keyword = None
         self.save_dir = save_dir
 
         self.save = Save()
 
-        self.bro = Chromium()
-
-    def check_brand_product_name(self, name: str) -> bool:
-        medicine_name_temp = (
-            self.medicine_name[:3]
-            if len(self.medicine_name) > 2
-            else self.medicine_name
-        )
-
-        # 药品名和品牌名包含其中一个即可
-        if medicine_name_temp in name:
-            return True
+        self.waiter = waiter or Waiter()
+        self.pacer = pacer or AdaptivePacer("淘宝")
 
-        # 至少要包含其中一个品牌名
-        for brand in self.brand_name:
-            if brand in name:
-                return True
-
-        return False
+        self.bro = Chromium()
+        self.tab = tab
 
     def parse(self, html_str: str, filename: Path = None):
+        """使用注册表中的淘宝解析器解析响应, 并保存到暂存库"""
         if type(html_str) is not str:
             return
 
-        datas = []
+        parser = PARSERS.get("淘宝天猫")
 
         try:
-            # 将 res 转为 json 格式
-            res = re.sub(r"mtopjsonp\d+\(", "", html_str)
-
-            # 把 res 最后一个括号去掉
-            res = res[:-1]
-
-            res = "".join(res)
-
-            res = json.loads(res)
-
-            for data in res.get("data").get("itemsArray"):
-                if not data.get("shopInfo"):
-                    continue
-
-                storeName = data.get("shopInfo").get("title")  # 店铺名称
-                if storeName == "乐药师大药房旗舰店" or storeName == "乐药师药品专卖店":
-                    continue
-
-                storeUrl = "https:" + data.get("shopInfo").get("url")  # 店铺链接
+            rows = parser.parse(html_str, ParseContext(self.keyword))
+        except Exception as e:
+            self.logInfo.emit(f"解析淘宝数据失败: {e}")
+            return
 
-                # 提取药品名称
-                productName = data.get("title")  # 药品名称
+        if rows:
+            self.save.to_excel(filename, rows, parser.platform)
 
-                # 正则表达式匹配中文字符
-                chinese_pattern = re.compile(r"[\u4e00-\u9fff]+", re.UNICODE)
+    def scroll_down(self, tab):
+        for _ in range(self.pacer.scroll_steps()):
+            tab.scroll.down(random.randint(50, 1000))
+            self.pacer.sleep()
 
-                # 使用正则表达式搜索并提取中文字符
-                chinese_text = re.findall(chinese_pattern, productName)
+        self.logInfo.emit("滑动到最底部")
+        tab.scroll.to_bottom()
 
-                # 将提取出的中文字符合并为一个字符串
-                productName = "".join(chinese_text)[:-3]
+    def wait_xhr(self, tab, started: float, filename: Path) -> None:
+        """
+        等待翻页触发的第一个 XHR 并解析, 记录从翻页到返回的延迟
 
-                if not self.check_brand_product_name(productName):
-                    continue
+        Args:
+            started: 翻页的时间, time.monotonic()
+        """
+        package = tab.listen.wait(timeout=5)
+        if not package:
+            return
 
-                price = data.get("priceShow").get("price")
-                productImg = data.get("pic_path")
-                t = time.strftime("%Y-%m-%d", time.localtime())
+        self.pacer.record_latency(time.monotonic() - started)
 
-                productName = self.keyword
+        res = package.response.body
+        if res:
+            self.logInfo.emit("解析淘宝搜索结果")
+            self.parse(res, filename=filename)
 
-                # 获取药品ID
-                medicine_id = MEDICINE_ID.get(productName, "")
+    def on_captcha(self):
+        self.pacer.record_captcha()
+        self.logInfo.emit("出现验证码, 请在浏览器中完成验证")
+
+    def wait_captcha(self, tab) -> bool:
+        """
+        出现验证码时等待用户在浏览器中完成验证
+
+        Returns:
+            bool: 是否已经通过验证, 超时返回 False
+        """
+        passed = self.waiter.while_present(
+            tab,
+            CAPTCHA_LOCATORS,
+            reason="淘宝验证码",
+            on_blocked=self.on_captcha,
+        )
 
-                # 添加数据
-                # [uuid, 药店名称, 店铺主页, 资质名称, 药品名, 药品ID, 药品图片, 挂网价格, 平台, 排查日期]
-                datas.append(
-                    [
-                        shortuuid.uuid(),
-                        storeName,
-                        storeUrl,
-                        "",
-                        productName,
-                        medicine_id,
-                        productImg,
-                        price,
-                        "淘宝天猫",
-                        t,
-                    ]
-                )
+        if not passed:
+            self.logInfo.emit(f"等待淘宝验证码超时: {self.keyword}")
 
-            if not datas:
-                return
+        return passed
 
-            self.save.to_excel(filename, datas, "淘宝天猫")
+    def search_direct(
+        self, keyword: str, client: DirectSearchClient, max_pages: int = 10
+    ):
+        """
+        直接请求搜索接口, 不打开浏览器页面, 需要验证时回退到浏览器搜索
+        """
+        self.keyword = keyword
 
-        except Exception as e:
-            self.logInfo.emit(f"解析淘宝搜索结果出错: {self.keyword} {e}")
+        filename = self.save_dir / f"{self.keyword}.xlsx"
 
-    def scroll_down(self, tab):
-        for _ in range(random.randint(4, 12)):
-            tab.scroll.down(random.randint(50, 1000))
-            time.sleep(random.uniform(0.0, 2.0))
+        self.save.logInfo = self.logInfo
 
-        self.logInfo.emit("滑动到最底部")
-        tab.scroll.to_bottom()
+        try:
+            for res in fetch_pages(
+                client.taobao_search, keyword, max_pages, self.pacer
+            ):
+                self.logInfo.emit("解析淘宝搜索结果")
+                self.parse(res, filename=filename)
+        except CaptchaRequired as e:
+            self.logInfo.emit(f"淘宝需要验证, 改用浏览器搜索: {e}")
+            self.search(keyword)
+
+            # 浏览器中验证后 cookie 会更新
+            client.refresh_cookies(self.tab or self.bro.latest_tab)
 
     def search(self, keyword: str):
         self.keyword = keyword
 
-        keywords = self.keyword.split(" ")
-        self.brand_name, self.medicine_name = keywords[:-1], keywords[-1]
-
         filename = self.save_dir / f"{self.keyword}.xlsx"
 
         self.save.logInfo = self.logInfo
 
-        tab = self.bro.latest_tab
+        tab = self.tab or self.bro.latest_tab
 
         # 监听搜索结果
         tab.listen.start(
@@ -145,6 +149,7 @@ class TB:
         )
 
         self.logInfo.emit("\n\n打开淘宝首页")
+        self.pacer.record_request()
         tab.get(
             f"https://s.taobao.com/search?commend=all&ie=utf8&initiative_id=tbindexz_20170306&page=1&preLoadOrigin=https%3A%2F%2Fwww.taobao.com&q={self.keyword}&search_type=item&sourceId=tb.index&spm=a21bo.jianhua%2Fa.201856.d13&ssid=s5-e&tab=all"
         )
@@ -166,17 +171,8 @@ class TB:
         except Exception as e:
             self.logInfo.emit(f"关闭弹窗出错: {e}")
 
-        while tab.ele("text:验证码", timeout=0.5):
-            ...
-
-        while tab.ele("#nocaptcha", timeout=0.5):
-            ...
-
-        while tab.ele("text:验证码", timeout=0.5):
-            ...
-
-        while tab.ele("#nocaptcha", timeout=0.5):
-            ...
+        if not self.wait_captcha(tab):
+            return
 
         for package in tab.listen.steps(timeout=12):
             res = package.response.body
@@ -194,11 +190,8 @@ class TB:
             return
 
         # 如果出现验证码，则等待
-        while tab.ele("text:验证码", timeout=0.5):
-            ...
-
-        while tab.ele("#nocaptcha", timeout=0.5):
-            ...
+        if not self.wait_captcha(tab):
+            return
 
         # 往下滑动
         self.logInfo.emit("往下滑动")
@@ -213,7 +206,10 @@ class TB:
             try:
                 # 如果有下一页, 就点击下一页
                 if ele_next_page:
+                    self.pacer.record_request()
+                    started = time.monotonic()
                     ele_next_page.click()
+                    self.wait_xhr(tab, started, filename)
 
                     # 检查是否还有下一页
                     if not ele_next_page or "disabled" not in ele_next_page.attrs:
@@ -0,0 +1,163 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# 不传 timeout 时使用 Waiter 的默认超时时间
+_DEFAULT = object()
+
+
+class BlockedStats:
+    """
+    阻塞时间统计
+
+    按原因 (验证码、等待登录等) 累计等待的次数和时间, 多个标签页共用时线程安全
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+
+    def add(self, reason: str, seconds: float) -> None:
+        with self.lock:
+            self.seconds[reason] = self.seconds.get(reason, 0.0) + seconds
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+
+    def total(self) -> float:
+        """全部原因的阻塞时间之和, 单位秒"""
+        with self.lock:
+            return sum(self.seconds.values())
+
+    def summary(self) -> str:
+        with self.lock:
+            if not self.seconds:
+                return "没有被阻塞"
+
+            return ", ".join(
+                f"{reason}: {self.counts[reason]} 次, 共 {seconds:.1f}s"
+                for reason, seconds in sorted(
+                    self.seconds.items(), key=lambda item: -item[1]
+                )
+            )
+
+
+class Waiter:
+    """
+    带退避的等待
+
+    轮询间隔从 interval 开始, 每次乘以 backoff, 最大为 max_interval,
+    等待期间线程休眠, 不会持续占用 CPU 和浏览器连接, 其他标签页的线程可以继续工作
+
+    调用 wake() 可以立即重新检查, 调用 stop() 可以让所有等待立即返回 False
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        interval: float = 0.2,
+        max_interval: float = 2.0,
+        backoff: float = 1.5,
+        stats: Optional[BlockedStats] = None,
+    ):
+        """
+        Args:
+            timeout: 默认的超时时间, 单位秒, None 表示一直等待
+            interval: 第一次轮询的间隔
+            max_interval: 最大轮询间隔
+            backoff: 每次轮询后间隔的增长倍数
+            stats: 阻塞时间统计, 默认新建一个
+        """
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stats = stats or BlockedStats()
+
+        self.event = threading.Event()
+        self.stopped = False
+
+    def wake(self) -> None:
+        """让正在等待的线程立即重新检查"""
+        self.event.set()
+
+    def stop(self) -> None:
+        """停止所有等待"""
+        self.stopped = True
+        self.event.set()
+
+    def until(
+        self,
+        predicate: Callable[[], Any],
+        reason: str = "",
+        timeout: Any = _DEFAULT,
+        on_blocked: Optional[Callable[[], None]] = None,
+    ) -> bool:
+        """
+        等待 predicate 返回真值
+
+        Args:
+            reason: 阻塞的原因, 用于统计阻塞时间, 为空时不统计
+            timeout: 超时时间, 单位秒, None 表示一直等待, 不传时使用默认超时时间
+            on_blocked: 第一次检查没有通过时调用, 例如提示用户处理验证码
+
+        Returns:
+            bool: 条件是否满足, 超时或者被停止时返回 False
+        """
+        if timeout is _DEFAULT:
+            timeout = self.timeout
+
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        interval = self.interval
+        blocked = False
+
+        try:
+            while not self.stopped:
+                if predicate():
+                    return True
+
+                if not blocked:
+                    blocked = True
+                    if on_blocked is not None:
+                        on_blocked()
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return False
+
+                delay = interval if deadline is None else min(interval, deadline - now)
+
+                # 被唤醒时立即重新检查, 并重新开始退避
+                if self.event.wait(delay):
+                    self.event.clear()
+                    interval = self.interval
+                else:
+                    interval = min(interval * self.backoff, self.max_interval)
+
+            return False
+        finally:
+            if blocked and reason:
+                self.stats.add(reason, time.monotonic() - start)
+
+    def while_present(
+        self,
+        tab,
+        locators: list[str],
+        reason: str = "",
+        timeout: Any = _DEFAULT,
+        on_blocked: Optional[Callable[[], None]] = None,
+    ) -> bool:
+        """
+        等待页面上的元素全部消失, 例如等待用户完成验证码
+
+        每次只检查一次元素, 不使用 DrissionPage 自带的等待
+
+        Returns:
+            bool: 元素是否已经消失
+        """
+        return self.until(
+            lambda: not any(tab.ele(locator, timeout=0) for locator in locators),
+            reason,
+            timeout,
+            on_blocked,
+        )
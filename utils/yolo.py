@@ -0,0 +1,829 @@
+import hashlib
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Union
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+from loguru import logger
+
+# 图优化级别
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+# 执行模式, parallel 时 inter_threads 才会生效
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+# 支持的图片格式
+SUPPORTED_FORMATS = {".jpeg", ".jpg", ".webp", ".png", ".avif", ".gif"}
+
+
+class Detection(NamedTuple):
+    """一个检测结果"""
+
+    class_id: int
+    class_name: str
+    confidence: float
+    box: tuple[float, float, float, float]  # 原图坐标 (x1, y1, x2, y2)
+
+
+class ModelInput(NamedTuple):
+    """模型的输入信息"""
+
+    name: str
+    static_batch: Optional[int]  # 批次维度是固定值时的大小, 动态批次为 None
+    height: int
+    width: int
+
+
+def create_session(
+    model_path: Path,
+    intra_threads: int = 0,
+    inter_threads: int = 0,
+    graph_optimization: str = "all",
+    execution_mode: str = "sequential",
+    cache_optimized: bool = False,
+    enable_mem_arena: bool = True,
+) -> ort.InferenceSession:
+    """
+    按配置创建推理会话
+
+    Args:
+        intra_threads: 单个算子使用的线程数, 0 表示由 onnxruntime 决定
+        inter_threads: 算子之间并行的线程数, 0 表示由 onnxruntime 决定
+        graph_optimization: 图优化级别, 见 GRAPH_OPTIMIZATION_LEVELS
+        execution_mode: 执行模式, 见 EXECUTION_MODES
+        cache_optimized: 是否把优化后的模型保存在模型旁边, 下次直接加载, 跳过图优化
+        enable_mem_arena: 是否使用 CPU 内存池
+    """
+    use_gpu = ort.get_device() == "GPU"
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_threads
+    options.inter_op_num_threads = inter_threads
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    options.execution_mode = EXECUTION_MODES[execution_mode]
+    options.enable_cpu_mem_arena = enable_mem_arena
+
+    # 优化后的模型先写入临时文件, 创建会话后再替换, 其他进程不会读到写了一半的文件
+    tmp_path: Optional[Path] = None
+
+    if cache_optimized and graph_optimization != "disable":
+        # 优化结果和执行设备有关, 不同设备、不同级别分别保存
+        optimized_path = model_path.with_name(
+            f"{model_path.stem}.{graph_optimization}.{'gpu' if use_gpu else 'cpu'}.opt.onnx"
+        )
+
+        if (
+            optimized_path.exists()
+            and optimized_path.stat().st_mtime >= model_path.stat().st_mtime
+        ):
+            # 已经优化过的模型不需要再优化
+            logger.info(f"加载优化后的模型: {optimized_path}")
+            model_path = optimized_path
+            options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS["disable"]
+        else:
+            # 多个推理进程同时优化时各自写入自己的临时文件, 后替换的覆盖先替换的
+            tmp_path = optimized_path.with_name(
+                f"{optimized_path.stem}.{os.getpid()}.tmp.onnx"
+            )
+            options.optimized_model_filepath = str(tmp_path)
+
+    try:
+        session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=(
+                ["CUDAExecutionProvider"] if use_gpu else ["CPUExecutionProvider"]
+            ),
+        )
+    except Exception:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+        raise
+
+    if tmp_path is not None and tmp_path.exists():
+        os.replace(tmp_path, optimized_path)
+
+    return session
+
+
+def model_input(session: ort.InferenceSession) -> ModelInput:
+    """读取模型的输入信息, 动态尺寸时使用 640x640"""
+    meta = session.get_inputs()[0]
+    batch, _, height, width = meta.shape
+
+    return ModelInput(
+        meta.name,
+        batch if isinstance(batch, int) else None,
+        height if isinstance(height, int) else 640,
+        width if isinstance(width, int) else 640,
+    )
+
+
+def letterbox(
+    img: np.ndarray,
+    canvas: np.ndarray,
+    color=(114, 114, 114),
+) -> tuple[float, tuple[int, int]]:
+    """
+    将图像进行 letterbox 填充，保持纵横比不变，直接写入预先分配的画布
+
+    只缩放一次, 填充量精确计算, 画布尺寸即模型输入尺寸
+
+    Returns:
+        tuple: (缩放比例, (左侧填充, 上方填充))
+    """
+    h, w = img.shape[:2]  # 当前图像的高宽
+    new_h, new_w = canvas.shape[:2]
+
+    # 选择宽高中最小的缩放比
+    r = min(new_h / h, new_w / w)
+
+    # 缩放后的未填充尺寸
+    unpad_w = min(new_w, int(round(w * r)))
+    unpad_h = min(new_h, int(round(h * r)))
+
+    # 填充均分到两侧
+    left = (new_w - unpad_w) // 2
+    top = (new_h - unpad_h) // 2
+
+    # 只填充边框部分
+    canvas[:top] = color
+    canvas[top + unpad_h :] = color
+    canvas[top : top + unpad_h, :left] = color
+    canvas[top : top + unpad_h, left + unpad_w :] = color
+
+    # 缩放图像写入画布中间
+    if (w, h) != (unpad_w, unpad_h):
+        img = cv2.resize(img, (unpad_w, unpad_h), interpolation=cv2.INTER_LINEAR)
+    canvas[top : top + unpad_h, left : left + unpad_w] = img
+
+    return r, (left, top)
+
+
+def to_input(canvas: np.ndarray, out: np.ndarray) -> None:
+    """
+    把 letterbox 后的画布写入输入张量
+
+    等价于 cv2.dnn.blobFromImage(scalefactor=1/255, swapRB=True),
+    但直接写入预先分配的 float32 CHW 张量, 没有 float64 中间结果
+    """
+    # HWC BGR -> CHW RGB, 只是视图, 不复制
+    chw = canvas.transpose(2, 0, 1)[::-1]
+    np.multiply(chw, np.float32(1 / 255.0), out=out)
+
+
+def read_image(image_path: Path) -> np.ndarray:
+    """读取并解码图片, 支持中文路径"""
+    img = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"无法解码图片: {image_path}")
+
+    return img
+
+
+def postprocess(
+    output: np.ndarray,
+    ratio: float,
+    pad: tuple[int, int],
+    classes: list[str],
+    conf_thresh: float,
+    iou_thresh: float,
+) -> list[Detection]:
+    """
+    解析单张图片的模型输出, 返回 NMS 之后按置信度降序排列的检测结果
+
+    Args:
+        output: 模型输出, 形状为 (1, 4 + 类别数, 锚点数)
+        ratio: letterbox 的缩放比例
+        pad: letterbox 的填充 (左侧, 上方)
+    """
+    # (4 + 类别数, 锚点数) -> (锚点数, 4 + 类别数)
+    preds = np.squeeze(output, axis=0).T
+
+    # 一次性计算每个锚点的最高置信度和类别
+    scores = preds[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confs = scores[np.arange(scores.shape[0]), class_ids]
+
+    mask = confs >= conf_thresh
+    if not mask.any():
+        return []
+
+    boxes, confs, class_ids = preds[mask, :4], confs[mask], class_ids[mask]
+
+    # 中心点 xywh -> 左上角 xywh, 并还原到原图坐标
+    xywh = boxes.copy()
+    xywh[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad[0]) / ratio
+    xywh[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad[1]) / ratio
+    xywh[:, 2:] = boxes[:, 2:] / ratio
+
+    keep = cv2.dnn.NMSBoxes(xywh.tolist(), confs.tolist(), conf_thresh, iou_thresh)
+    keep = np.array(keep, dtype=np.int64).reshape(-1)
+
+    # 按置信度降序排序
+    keep = keep[np.argsort(-confs[keep])]
+
+    return [
+        Detection(
+            int(class_ids[k]),
+            classes[int(class_ids[k])],
+            float(confs[k]),
+            (
+                float(xywh[k, 0]),
+                float(xywh[k, 1]),
+                float(xywh[k, 0] + xywh[k, 2]),
+                float(xywh[k, 1] + xywh[k, 3]),
+            ),
+        )
+        for k in keep
+    ]
+
+
+def medicine_label(image_path: Path) -> str:
+    """图片对应的药品名, 即文件名中第一个 _ 之前的部分"""
+    return image_path.stem.split("_")[0]
+
+
+def content_hash(data: Union[bytes, memoryview]) -> str:
+    """图片或模型内容的哈希值"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的哈希值, 用于较大的模型文件"""
+    h = hashlib.blake2b(digest_size=16)
+
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+class InferenceCache:
+    """
+    推理结果缓存
+
+    以 (图片内容哈希, 模型文件哈希, 置信度阈值) 为键, 保存置信度最高的检测结果,
+    再次识别同一个文件夹时只推理新增或者修改过的图片
+    """
+
+    FILENAME = ".yolo_cache.db"
+
+    def __init__(self, cache_dir: Path, model_path: Path, conf_thresh: float):
+        """
+        Args:
+            cache_dir: 缓存文件所在的文件夹
+            model_path: onnx 模型文件
+            conf_thresh: 置信度阈值
+        """
+        self.model_hash = file_hash(model_path)
+        self.conf_thresh = round(float(conf_thresh), 4)
+
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(cache_dir / self.FILENAME, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                image_hash TEXT NOT NULL,
+                model_hash TEXT NOT NULL,
+                conf_thresh REAL NOT NULL,
+                class_id INTEGER,
+                class_name TEXT,
+                confidence REAL,
+                x1 REAL,
+                y1 REAL,
+                x2 REAL,
+                y2 REAL,
+                PRIMARY KEY (image_hash, model_hash, conf_thresh)
+            )
+            """
+        )
+
+        # 当前模型和阈值的全部结果先读到内存, 预处理线程只读字典
+        self.results: dict[str, Optional[Detection]] = {}
+        for image_hash, class_id, class_name, confidence, *box in self.conn.execute(
+            """
+            SELECT image_hash, class_id, class_name, confidence, x1, y1, x2, y2
+            FROM results WHERE model_hash = ? AND conf_thresh = ?
+            """,
+            (self.model_hash, self.conf_thresh),
+        ):
+            self.results[image_hash] = (
+                None
+                if class_id is None
+                else Detection(class_id, class_name, confidence, tuple(box))
+            )
+
+        logger.info(f"加载推理缓存 {len(self.results)} 条")
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_hash: str) -> tuple[bool, Optional[Detection]]:
+        """
+        查找缓存
+
+        Returns:
+            tuple: (是否命中, 检测结果), 命中但没有检测到物体时检测结果为 None
+        """
+        with self.lock:
+            if image_hash in self.results:
+                self.hits += 1
+                return True, self.results[image_hash]
+
+            self.misses += 1
+            return False, None
+
+    def put_many(self, items: list[tuple[str, Optional[Detection]]]) -> None:
+        """保存一批推理结果"""
+        with self.lock:
+            for image_hash, detection in items:
+                self.results[image_hash] = detection
+
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (
+                            image_hash,
+                            self.model_hash,
+                            self.conf_thresh,
+                            *(
+                                (None,) * 7
+                                if detection is None
+                                else (
+                                    detection.class_id,
+                                    detection.class_name,
+                                    detection.confidence,
+                                    *detection.box,
+                                )
+                            ),
+                        )
+                        for image_hash, detection in items
+                    ),
+                )
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class ImageCalibrationReader:
+    """
+    静态量化的校准数据, 按模型输入尺寸逐批读取样本图片
+
+    实现 onnxruntime.quantization.CalibrationDataReader 的接口
+    """
+
+    def __init__(self, images: list[Path], model: ModelInput):
+        self.images = images
+        self.model = model
+        self.batch_size = model.static_batch or 1
+        self.index = 0
+
+        self.canvas = np.empty((model.height, model.width, 3), dtype=np.uint8)
+
+    def get_next(self) -> Optional[dict[str, np.ndarray]]:
+        while self.index < len(self.images):
+            batch = np.zeros(
+                (self.batch_size, 3, self.model.height, self.model.width),
+                dtype=np.float32,
+            )
+
+            count = 0
+            while count < self.batch_size and self.index < len(self.images):
+                image_path = self.images[self.index]
+                self.index += 1
+                try:
+                    letterbox(read_image(image_path), self.canvas)
+                except Exception as e:
+                    logger.warning(f"跳过校准图片 {image_path}: {e}")
+                    continue
+
+                to_input(self.canvas, batch[count])
+                count += 1
+
+            if count:
+                return {self.model.name: batch}
+
+        return None
+
+    def rewind(self) -> None:
+        self.index = 0
+
+
+def quantize_model(
+    model_path: Path,
+    mode: str = "dynamic",
+    calibration_images: Optional[list[Path]] = None,
+) -> Path:
+    """
+    把模型量化为 INT8
+
+    Args:
+        mode: dynamic 动态量化, 只量化权重; static 静态量化, 需要校准图片
+        calibration_images: 静态量化使用的校准图片
+
+    Returns:
+        Path: 量化后的模型路径
+    """
+    # 量化工具依赖 onnx, 只在需要时导入
+    try:
+        from onnxruntime.quantization import (
+            QuantFormat,
+            QuantType,
+            quantize_dynamic,
+            quantize_static,
+        )
+    except ImportError as e:
+        raise RuntimeError(f"量化需要安装 onnx: {e}") from e
+
+    output_path = model_path.with_name(f"{model_path.stem}.int8-{mode}.onnx")
+
+    if mode == "dynamic":
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8)
+    elif mode == "static":
+        if not calibration_images:
+            raise ValueError("静态量化需要校准图片")
+
+        session = create_session(model_path, graph_optimization="disable")
+        reader = ImageCalibrationReader(calibration_images, model_input(session))
+        del session
+
+        # QDQ 格式在 CPU 上有较好的算子支持
+        quantize_static(
+            model_path,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    else:
+        raise ValueError(f"不支持的量化方式: {mode}")
+
+    return output_path
+
+
+class EvalResult(NamedTuple):
+    """模型在样本上的评估结果"""
+
+    name: str
+    images: int
+    accuracy: float  # 识别结果包含文件名中药品名的比例
+    throughput: float  # 纯推理吞吐量, 张/秒
+    size_mb: float
+    class_ids: list[Optional[int]]  # 每张图片置信度最高的类别, 用于比较模型之间的一致性
+
+
+def evaluate_model(
+    name: str,
+    model_path: Path,
+    images: list[Path],
+    classes: list[str],
+    conf_thresh: float = 0.85,
+    iou_thresh: float = 0.5,
+    **session_kwargs,
+) -> EvalResult:
+    """
+    在带标注的样本上评估模型, 标注即文件名中的药品名
+
+    Args:
+        name: 报告中显示的模型名称
+        session_kwargs: 传给 create_session 的参数
+    """
+    session = create_session(model_path, **session_kwargs)
+    model = model_input(session)
+    batch_size = model.static_batch or 1
+
+    canvas = np.empty((model.height, model.width, 3), dtype=np.uint8)
+    inputs = np.zeros((batch_size, 3, model.height, model.width), dtype=np.float32)
+
+    evaluated = 0
+    correct = 0
+    infer_seconds = 0.0
+    class_ids: list[Optional[int]] = []
+
+    for image_path in images:
+        try:
+            ratio, pad = letterbox(read_image(image_path), canvas)
+        except Exception as e:
+            logger.warning(f"跳过样本图片 {image_path}: {e}")
+            class_ids.append(None)
+            continue
+
+        to_input(canvas, inputs[0])
+        evaluated += 1
+
+        start = time.perf_counter()
+        outputs = session.run(None, {model.name: inputs})
+        infer_seconds += time.perf_counter() - start
+
+        detections = postprocess(
+            outputs[0][:1], ratio, pad, classes, conf_thresh, iou_thresh
+        )
+        top = detections[0] if detections else None
+
+        class_ids.append(None if top is None else top.class_id)
+        if top is not None and medicine_label(image_path) in top.class_name:
+            correct += 1
+
+    return EvalResult(
+        name,
+        evaluated,
+        correct / evaluated if evaluated else 0.0,
+        evaluated / infer_seconds if infer_seconds else 0.0,
+        model_path.stat().st_size / 1024 / 1024,
+        class_ids,
+    )
+
+
+def compare_report(baseline: EvalResult, others: list[EvalResult]) -> list[str]:
+    """生成模型之间准确率、吞吐量的对比报告"""
+    lines = [
+        f"{'模型':<16}{'图片数':>8}{'准确率':>10}{'一致率':>10}{'吞吐量(张/秒)':>16}{'大小(MB)':>12}"
+    ]
+
+    for result in [baseline, *others]:
+        # 与原模型置信度最高的类别一致的比例
+        same = sum(a == b for a, b in zip(baseline.class_ids, result.class_ids))
+        agreement = same / len(baseline.class_ids) if baseline.class_ids else 0.0
+
+        lines.append(
+            f"{result.name:<16}{result.images:>8}{result.accuracy:>10.2%}"
+            f"{agreement:>10.2%}{result.throughput:>16.1f}{result.size_mb:>12.1f}"
+        )
+
+    for result in others:
+        if baseline.throughput:
+            lines.append(
+                f"{result.name}: 吞吐量为原模型的 {result.throughput / baseline.throughput:.2f} 倍, "
+                f"准确率变化 {(result.accuracy - baseline.accuracy) * 100:+.2f} 个百分点"
+            )
+
+    return lines
+
+
+class ShardResult(NamedTuple):
+    """推理进程返回的单张图片结果, 只包含可以跨进程传递的简单类型"""
+
+    image_path: str
+    image_hash: str
+    detection: Optional[Detection]
+    cached: bool
+    error: Optional[str]
+
+
+def _infer_shard(
+    shard_id: int,
+    images: list[str],
+    model_path: Path,
+    cache_dir: Optional[Path],
+    classes: list[str],
+    conf_thresh: float,
+    iou_thresh: float,
+    batch_size: int,
+    cpus: Optional[set[int]],
+    session_kwargs: dict,
+    results: multiprocessing.Queue,
+    chunk_size: int = 32,
+) -> None:
+    """
+    推理进程的入口, 推理一个分片中的全部图片
+
+    结果按 chunk_size 分批放入 results, 最后放入 ("done", 分片编号, 推理耗时)
+    """
+    try:
+        # 绑定到指定的 CPU 核, 避免多个进程的线程互相抢占
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+
+        session = create_session(model_path, **session_kwargs)
+        model = model_input(session)
+        batch_size = model.static_batch or batch_size
+
+        cache = (
+            InferenceCache(cache_dir, model_path, conf_thresh) if cache_dir else None
+        )
+
+        canvas = np.empty((model.height, model.width, 3), dtype=np.uint8)
+        inputs = np.zeros((batch_size, 3, model.height, model.width), dtype=np.float32)
+
+        pending: list[tuple[str, str, float, tuple[int, int]]] = []
+        chunk: list[ShardResult] = []
+        infer_seconds = 0.0
+
+        def infer_pending():
+            nonlocal infer_seconds
+
+            # 固定批次的模型, 不足一批时用 0 补齐
+            if model.static_batch:
+                inputs[len(pending) :] = 0
+                feed = inputs
+            else:
+                feed = inputs[: len(pending)]
+
+            try:
+                start = time.perf_counter()
+                outputs = session.run(None, {model.name: feed})
+                infer_seconds += time.perf_counter() - start
+            except Exception as e:
+                chunk.extend(
+                    ShardResult(path, image_hash, None, False, str(e))
+                    for path, image_hash, _, _ in pending
+                )
+            else:
+                for j, (path, image_hash, ratio, pad) in enumerate(pending):
+                    detections = postprocess(
+                        outputs[0][j : j + 1],
+                        ratio,
+                        pad,
+                        classes,
+                        conf_thresh,
+                        iou_thresh,
+                    )
+                    chunk.append(
+                        ShardResult(
+                            path,
+                            image_hash,
+                            detections[0] if detections else None,
+                            False,
+                            None,
+                        )
+                    )
+
+            pending.clear()
+
+        for image_path in images:
+            try:
+                data = np.fromfile(image_path, dtype=np.uint8)
+                image_hash = content_hash(data)
+
+                cached, detection = (
+                    cache.get(image_hash) if cache is not None else (False, None)
+                )
+                if cached:
+                    chunk.append(
+                        ShardResult(image_path, image_hash, detection, True, None)
+                    )
+                else:
+                    img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+                    if img is None:
+                        raise ValueError(f"无法解码图片: {image_path}")
+
+                    ratio, pad = letterbox(img, canvas)
+                    to_input(canvas, inputs[len(pending)])
+                    pending.append((image_path, image_hash, ratio, pad))
+            except Exception as e:
+                chunk.append(ShardResult(image_path, "", None, False, str(e)))
+
+            if len(pending) >= batch_size:
+                infer_pending()
+
+            if len(chunk) >= chunk_size:
+                results.put(("results", chunk))
+                chunk = []
+
+        if pending:
+            infer_pending()
+
+        if chunk:
+            results.put(("results", chunk))
+
+        if cache is not None:
+            cache.close()
+
+        results.put(("done", shard_id, infer_seconds))
+    except Exception as e:
+        results.put(("error", shard_id, str(e)))
+
+
+class ShardedInference:
+    """
+    多进程推理
+
+    图片轮流分配到 N 个进程, 每个进程各自加载模型, 并使用 CPU 核数 / N 个线程,
+    结果在调用方所在的线程中汇总, 图片的移动等操作仍然由调用方完成
+    """
+
+    def __init__(
+        self,
+        model_path: Path,
+        processes: int,
+        classes: list[str],
+        conf_thresh: float = 0.85,
+        iou_thresh: float = 0.5,
+        batch_size: int = 8,
+        cache_dir: Optional[Path] = None,
+        **session_kwargs,
+    ):
+        """
+        Args:
+            processes: 进程数
+            cache_dir: 推理缓存所在的文件夹, 为 None 时不使用缓存
+            session_kwargs: 传给 create_session 的参数, intra_threads 为 0 时按进程数平分 CPU 核
+        """
+        self.model_path = model_path
+        self.processes = max(1, processes)
+        self.classes = classes
+        self.conf_thresh = conf_thresh
+        self.iou_thresh = iou_thresh
+        self.batch_size = batch_size
+        self.cache_dir = cache_dir
+
+        cpu_count = os.cpu_count() or 1
+        self.threads = max(1, cpu_count // self.processes)
+
+        self.session_kwargs = dict(session_kwargs)
+        if not self.session_kwargs.get("intra_threads"):
+            self.session_kwargs["intra_threads"] = self.threads
+        if not self.session_kwargs.get("inter_threads"):
+            self.session_kwargs["inter_threads"] = 1
+
+        # 每个进程绑定的 CPU 核, 核数不够平分时不绑定
+        self.pin = self.threads * self.processes <= cpu_count
+
+        # 各进程推理耗时之和
+        self.infer_seconds = 0.0
+
+    def run(self, images: list[Path]) -> Iterator[ShardResult]:
+        """启动推理进程, 按完成顺序返回每张图片的结果"""
+        # 使用 spawn, 避免 fork 时复制 Qt 和 onnxruntime 的线程状态
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+
+        workers = []
+        for shard_id in range(self.processes):
+            shard = [str(image) for image in images[shard_id :: self.processes]]
+            if not shard:
+                continue
+
+            cpus = (
+                set(range(shard_id * self.threads, (shard_id + 1) * self.threads))
+                if self.pin
+                else None
+            )
+
+            process = ctx.Process(
+                target=_infer_shard,
+                args=(
+                    shard_id,
+                    shard,
+                    self.model_path,
+                    self.cache_dir,
+                    self.classes,
+                    self.conf_thresh,
+                    self.iou_thresh,
+                    self.batch_size,
+                    cpus,
+                    self.session_kwargs,
+                    results,
+                ),
+                daemon=True,
+            )
+            process.start()
+            workers.append(process)
+
+        running = len(workers)
+
+        try:
+            while running:
+                try:
+                    message = results.get(timeout=1)
+                except queue.Empty:
+                    # 进程异常退出时不会发送 done
+                    if not any(process.is_alive() for process in workers):
+                        raise RuntimeError("推理进程意外退出")
+                    continue
+
+                kind = message[0]
+                if kind == "results":
+                    yield from message[1]
+                elif kind == "done":
+                    running -= 1
+                    self.infer_seconds += message[2]
+                elif kind == "error":
+                    raise RuntimeError(f"推理进程 {message[1]} 出错: {message[2]}")
+        finally:
+            for process in workers:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
@@ -0,0 +1,101 @@
+import importlib
+import time
+from typing import NamedTuple, Optional, override
+
+from loguru import logger
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import QApplication, QVBoxLayout, QWidget
+
+
+class LoadTime(NamedTuple):
+    """一个界面的加载耗时, 单位秒"""
+
+    name: str
+    import_seconds: float
+    create_seconds: float
+
+
+# 已经加载的界面的耗时, 按加载顺序
+LOAD_TIMES: list[LoadTime] = []
+
+
+class LazyInterface(QWidget):
+    """
+    延迟加载的界面
+
+    导航栏中先放一个空白的占位界面, 第一次切换到这个界面时才导入模块并创建真正的界面,
+    启动时不需要导入 cv2、onnxruntime、mitmproxy 等体积较大的依赖
+    """
+
+    def __init__(self, module: str, class_name: str, object_name: str, parent=None):
+        """
+        Args:
+            module: 界面所在的模块, 例如 view.interface.yoloinference
+            class_name: 界面的类名, 构造函数只接受 parent 参数
+            object_name: 与真正界面相同的 objectName, 导航栏通过它定位界面
+        """
+        super().__init__(parent=parent)
+
+        self.module = module
+        self.class_name = class_name
+        self.interface: Optional[QWidget] = None
+
+        self.vBoxLayout = QVBoxLayout(self)
+        self.vBoxLayout.setContentsMargins(0, 0, 0, 0)
+
+        self.setObjectName(object_name)
+
+    def load(self) -> QWidget:
+        """导入模块并创建界面, 已经创建过时直接返回"""
+        if self.interface is not None:
+            return self.interface
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            start = time.perf_counter()
+            cls = getattr(importlib.import_module(self.module), self.class_name)
+            imported = time.perf_counter()
+
+            self.interface = cls(self)
+            created = time.perf_counter()
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        # 界面内部会设置自己的 objectName, 导航栏仍然使用占位界面的 objectName
+        self.vBoxLayout.addWidget(self.interface)
+
+        load_time = LoadTime(self.class_name, imported - start, created - imported)
+        LOAD_TIMES.append(load_time)
+        logger.info(
+            f"加载 {load_time.name}: 导入 {load_time.import_seconds:.3f}s, "
+            f"创建 {load_time.create_seconds:.3f}s"
+        )
+
+        return self.interface
+
+    @override
+    def showEvent(self, event):
+        super().showEvent(event)
+
+        # 等窗口绘制完成后再加载, 启动时默认显示的界面不会挡住主窗口的第一次绘制
+        if self.interface is None:
+            QTimer.singleShot(0, self.load)
+
+
+def load_report() -> list[str]:
+    """
+    按导入耗时从大到小排列的加载报告
+
+    多个界面共同依赖的模块只在第一次导入时计时, 会算在先加载的界面上
+    """
+    lines = [
+        f"{t.name:<30} 导入 {t.import_seconds:7.3f}s  创建 {t.create_seconds:7.3f}s"
+        for t in sorted(LOAD_TIMES, key=lambda t: -t.import_seconds)
+    ]
+
+    lines.append(
+        f"{'合计':<30} 导入 {sum(t.import_seconds for t in LOAD_TIMES):7.3f}s  "
+        f"创建 {sum(t.create_seconds for t in LOAD_TIMES):7.3f}s"
+    )
+
+    return lines
@@ -78,9 +78,9 @@ class DeleteRowWorker(QThread):
         with ThreadPoolExecutor() as t:
             futures = []
 
-            # 只遍历文件夹
+            # 只遍历文件夹, 跳过 .img_cache 等隐藏文件夹
             for folder in self.root_dir.iterdir():
-                if not folder.is_dir():
+                if not folder.is_dir() or folder.name.startswith("."):
                     continue
 
                 future = t.submit(self.getPicList, folder)
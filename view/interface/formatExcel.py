@@ -5,12 +5,13 @@ from typing import Optional, override
 
 import polars as pl
 from openpyxl import load_workbook
-from openpyxl.styles import Alignment, Font
 from PySide6.QtCore import Qt, QThread, Signal, Slot
 from PySide6.QtWidgets import QFileDialog, QHBoxLayout, QVBoxLayout, QWidget
 from qfluentwidgets import BodyLabel, InfoBar, InfoBarPosition, PushButton, TextEdit
 
 from common.config import cfg
+from utils.save import write_styled_excel
+from utils.staging import HEADERS
 from view.components.dropable_lineEdit import DropableLineEditDir
 from view.interface.gallery_interface import GalleryInterface
 
@@ -22,52 +23,44 @@ class FormatWorker(QThread):
         super().__init__()
         self.excel_dir = excel_dir
 
+    @staticmethod
+    def is_saved_excel(excel_path: Path) -> bool:
+        """
+        是否是 Save 导出的 Excel: 只有一个工作表, 并且表头与 Save 的列一致
+
+        其他 Excel 重新写入会丢失其他工作表、链接和单元格类型, 不能格式化
+        """
+        workbook = load_workbook(excel_path, read_only=True)
+        try:
+            if len(workbook.sheetnames) != 1:
+                return False
+
+            header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+
+        return {h for h in header if h is not None} == set(HEADERS)
+
     def format_cell(self, excel_path: Path):
         """设置单元格格式"""
-        wb = load_workbook(excel_path)
-        ws = wb.active
-
-        # 设置缩放为 100%
-        ws.sheet_view.zoomScale = 100
-
-        # 设置第一行字体及对齐方式
-        for cell in ws[1]:
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.font = Font(size=15, bold=True)
-
-        # 设置第一行的行高
-        ws.row_dimensions[1].height = 25
-
-        # 定义列宽和对齐方式
-        column_formats = {
-            "A": 30,  # uuid
-            "B": 45,  # 药店名称
-            "C": 20,  # 店铺主页
-            "D": 50,  # 资质名称
-            "E": 35,  # 药品名称
-            "F": 15,  # 药品ID
-            "G": 20,  # 药品图片
-            "H": 23,  # 挂网价格
-            "I": 15,  # 平台
-            "J": 18,  # 排查日期
-        }
-
-        for col, width in column_formats.items():
-            ws.column_dimensions[col].width = width
-            for row in ws.iter_rows(min_row=2):
-                for cell in row:
-                    # 第 3 列店铺主页居左
-                    if cell.column == 2:
-                        cell.alignment = Alignment(horizontal="left", vertical="center")
-                    # 第 7 列药品图片居左
-                    elif cell.column == 6:
-                        cell.alignment = Alignment(horizontal="left", vertical="center")
-                    else:
-                        cell.alignment = Alignment(
-                            horizontal="center", vertical="center"
-                        )
-
-        wb.save(excel_path)
+        try:
+            if not self.is_saved_excel(excel_path):
+                self.logInfo.emit(f"{excel_path.name} 不是导出的药品数据, 跳过")
+                return
+
+            df = pl.read_excel(excel_path)
+
+            # 保留数字、日期等类型, 只把混合类型的列转换为字符串
+            df = df.with_columns(
+                pl.col(name).cast(pl.Utf8)
+                for name, dtype in df.schema.items()
+                if dtype == pl.Object
+            )
+
+            write_styled_excel(df, excel_path)
+        except Exception as e:
+            self.logInfo.emit(f"{excel_path.name} 格式化失败: {e}")
+            return
 
         self.logInfo.emit(f"{excel_path.name} 格式化完成")
 
@@ -1,16 +1,16 @@
 # coding:utf-8
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, override
 
-import httpx
-import pandas as pd
+import polars as pl
 from loguru import logger
 from PySide6.QtCore import Qt, QThread, Signal, Slot
 from PySide6.QtWidgets import QFileDialog, QHBoxLayout, QVBoxLayout, QWidget
 from qfluentwidgets import (
     BodyLabel,
+    CheckBox,
     InfoBar,
     InfoBarPosition,
     ProgressBar,
@@ -19,6 +19,14 @@ from qfluentwidgets import (
 )
 
 from common.config import cfg
+from utils.downloader import (
+    AsyncImageDownloader,
+    BlobCache,
+    DownloadError,
+    DownloadManifest,
+    DownloadResult,
+    DownloadTask,
+)
 from view.components.dropable_lineEdit import DropableLineEdit
 from view.interface.gallery_interface import GalleryInterface
 
@@ -28,19 +36,26 @@ class ImagesDownloader(QThread):
     setProgress = Signal(int)
     setProgressInfo = Signal(int, int)
 
-    def __init__(self, root_dir: Path):
+    def __init__(self, root_dir: Path, resume: bool = False):
         super(ImagesDownloader, self).__init__()
 
         self.root_dir = root_dir
 
+        # 只重新下载清单中失败或者大小为 0 的图片
+        self.resume = resume
+
+        # 下载清单
+        self.manifest: Optional[DownloadManifest] = None
+
+        # 按内容寻址的图片缓存
+        self.cache: Optional[BlobCache] = None
+
         # 统计下载图片的数量
         self.download_count = 0
+        self.fail_count = 0
 
         self.total_rows = 0
 
-        # httpx 客户端
-        self.session = httpx.Client()
-
     @staticmethod
     def count_time(func):
         def wrapper(*args, **kwargs):
@@ -50,120 +65,123 @@ class ImagesDownloader(QThread):
 
         return wrapper
 
-    # 根据图片 url 下载图片
-    def download_img(self, session: httpx.Client, img_url: str) -> bytes:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-
-        res = session.get(img_url, headers=headers, follow_redirects=True)
-        res.raise_for_status()  # 如果请求失败，抛出异常
-        return res.content
-
-    # 将图片写入文件
-    def write_img(self, content: bytes, filename: Path):
-        try:
-            with open(filename, mode="wb") as f:
-                f.write(content)
-        except Exception as e:
-            logger.error(f"图片保存失败: {filename} {e}")
-
-    def process_excel_file(self, excel_path):
+    def collect_tasks(self, excel_path: Path) -> list[DownloadTask]:
+        """读取 Excel 文件中需要下载的图片"""
         # 创建保存图片的目录
         save_dir = self.root_dir / excel_path.stem
         save_dir.mkdir(parents=True, exist_ok=True)
 
-        try:
-            df = pd.read_excel(excel_path, usecols=["uuid", "药品图片"])
-
-            tasks = []
-
-            for row in df.itertuples(index=False):
-                uuid = row[0]  # uuid
-                img_url = str(row[1])  # 药品图片 url
+        # 只读取需要的两列, 使用 calamine 引擎
+        df = pl.read_excel(
+            excel_path, engine="calamine", columns=["uuid", "药品图片"]
+        )
 
-                # 不是有效的 url
-                if not str(img_url).startswith("http"):
-                    continue
+        tasks = []
 
-                filename = (
-                    save_dir / f'{excel_path.stem}_{uuid}.{str(img_url).split(".")[-1]}'
-                )
+        for uuid, img_url in df.iter_rows():
+            img_url = str(img_url)  # 药品图片 url
 
-                if filename.exists():
-                    msg = f"\t图片已存在: {excel_path.stem} {uuid}"
-                    logger.info(msg)
-                    self.logInfo.emit(msg)
-                    continue
+            # 不是有效的 url
+            if not str(img_url).startswith("http"):
+                continue
 
-                tasks.append((img_url, filename))
+            filename = (
+                save_dir / f'{excel_path.stem}_{uuid}.{str(img_url).split(".")[-1]}'
+            )
 
-            # 多线程下载图片
-            with ThreadPoolExecutor() as t:
-                futures = [
-                    t.submit(self.download_and_save_img, img_url, filename)
-                    for img_url, filename in tasks
-                ]
+            # 大小为 0 的文件是之前下载失败留下的, 需要重新下载
+            if filename.exists() and filename.stat().st_size > 0:
+                msg = f"\t图片已存在: {excel_path.stem} {uuid}"
+                logger.info(msg)
+                self.logInfo.emit(msg)
+                continue
 
-                # 等待所有任务完成
-                for future in futures:
-                    future.result()
+            tasks.append(DownloadTask(img_url, filename, str(uuid)))
 
-        except Exception as e:
-            msg = f"处理失败: {excel_path} {e}"
-            logger.error(msg)
-            self.logInfo.emit(msg)
+        return tasks
 
-    def download_and_save_img(self, img_url, filename: Path):
-        try:
-            content = self.download_img(self.session, img_url)
-            self.write_img(content, filename)
+    def on_success(self, task: DownloadTask, result: DownloadResult):
+        self.manifest.record_success(task, result)
 
-            self.download_count += 1
+        self.download_count += 1
 
-            # 更新进度条
-            self.setProgress.emit(self.download_count / self.total_rows * 100)
-            self.setProgressInfo.emit(self.download_count, self.total_rows)
+        # 更新进度条
+        self.setProgress.emit(self.download_count / self.total_rows * 100)
+        self.setProgressInfo.emit(self.download_count, self.total_rows)
 
-        except Exception as e:
-            filename.touch()
-            msg = f"下载失败: {filename.stem} {img_url} {e}"
-            logger.error(msg)
-            self.logInfo.emit(msg)
+    def on_failure(self, task: DownloadTask, e: DownloadError):
+        # 失败只记录到清单, 不再留下空文件, 下次运行时会重新下载
+        self.manifest.record_failure(task, e)
 
-    def count_rows(self) -> int:
-        total_rows = 0
+        self.fail_count += 1
+        msg = f"下载失败: {task.filename.stem} {task.url} {e}"
+        self.logInfo.emit(msg)
 
-        for excelFile in self.root_dir.glob("*.xlsx"):
-            if excelFile.stem.startswith("~"):
-                continue
+    def add_total(self, count: int):
+        """增加需要下载的图片数量"""
+        self.total_rows += count
+        self.setProgressInfo.emit(self.download_count, self.total_rows)
+
+    async def download_all(self):
+        """所有 Excel 文件的图片放进同一个队列下载"""
+        async with AsyncImageDownloader(
+            self.on_success, self.on_failure, cache=self.cache
+        ) as downloader:
+            if self.resume:
+                tasks = self.manifest.pending()
+                self.add_total(len(tasks))
+
+                for task in tasks:
+                    await downloader.put(task)
+                return
+
+            for excel_file in self.root_dir.glob("*.xlsx"):
+                if (
+                    excel_file.stem.startswith("~")
+                    or "对照" in excel_file.stem
+                    or "排查" in excel_file.stem
+                ):
+                    continue
 
-            df = pd.read_excel(excelFile, usecols=["uuid"])
+                try:
+                    tasks = await asyncio.to_thread(self.collect_tasks, excel_file)
+                except Exception as e:
+                    msg = f"处理失败: {excel_file} {e}"
+                    logger.error(msg)
+                    self.logInfo.emit(msg)
+                    continue
 
-            total_rows += int(df.shape[0])
+                # 边读取边下载, 总数随之增加
+                self.add_total(len(tasks))
 
-        return total_rows
+                for task in tasks:
+                    await downloader.put(task)
 
     @override
     def run(self):
-        self.total_rows = self.count_rows()
+        self.manifest = DownloadManifest(self.root_dir)
+        self.cache = BlobCache(self.root_dir)
 
-        self.setProgressInfo.emit(0, self.total_rows)
-        self.logInfo.emit(f"开始下载图片, 共 {self.total_rows} 张\n")
+        if self.resume:
+            self.logInfo.emit("开始重新下载失败的图片\n")
+        else:
+            self.logInfo.emit("开始下载图片\n")
 
-        for excel_file in self.root_dir.glob("*.xlsx"):
-            if (
-                excel_file.stem.startswith("~")
-                or "对照" in excel_file.stem
-                or "排查" in excel_file.stem
-            ):
-                continue
+        self.setProgressInfo.emit(0, 0)
 
-            self.process_excel_file(excel_file)
+        try:
+            asyncio.run(self.download_all())
+        finally:
+            self.manifest.close()
+            self.cache.close()
 
-        self.session.close()
+        msg = f"\n下载图片完成, 共下载 {self.download_count}  张图片, 失败 {self.fail_count} 张. 应该有要下载 {self.total_rows} 张"
+        self.logInfo.emit(msg)
 
-        msg = f"\n下载图片完成, 共下载 {self.download_count}  张图片. 应该有要下载 {self.total_rows} 张"
+        msg = (
+            f"缓存命中率: {self.cache.hit_rate():.1%} "
+            f"(url 命中 {self.cache.url_hits} 张, 内容相同 {self.cache.content_hits} 张, 新图片 {self.cache.misses} 张)"
+        )
         self.logInfo.emit(msg)
 
 
@@ -199,6 +217,9 @@ class ImagesDownloadInterface(GalleryInterface):
             )
         )
 
+        # 只重新下载失败的图片
+        self.checkBox_resume = CheckBox(text="只重新下载失败的图片")
+
         # 下载按钮
         self.btn_download = PushButton(text="下载")
         self.btn_download.clicked.connect(self.start_download)
@@ -216,6 +237,7 @@ class ImagesDownloadInterface(GalleryInterface):
         self.hBoxLayout.addWidget(self.label_excel_path)
         self.hBoxLayout.addWidget(self.lineEdit_excel_path)
         self.hBoxLayout.addWidget(self.btn_select_path)
+        self.hBoxLayout.addWidget(self.checkBox_resume)
 
         self.hBoxLayout_progress.addWidget(self.progressBar)
         self.hBoxLayout_progress.addWidget(self.label_progress)
@@ -296,6 +318,7 @@ class ImagesDownloadInterface(GalleryInterface):
     @Slot()
     def finished(self):
         self.lineEdit_excel_path.setEnabled(True)
+        self.checkBox_resume.setEnabled(True)
         self.btn_download.setEnabled(True)
 
         if self.stateTooltip is not None:
@@ -315,10 +338,11 @@ class ImagesDownloadInterface(GalleryInterface):
         excel_path = Path(self.lineEdit_excel_path.text())
 
         self.lineEdit_excel_path.setEnabled(False)
+        self.checkBox_resume.setEnabled(False)
         self.btn_download.setEnabled(False)
 
         # 创建下载器
-        self.worker = ImagesDownloader(excel_path)
+        self.worker = ImagesDownloader(excel_path, self.checkBox_resume.isChecked())
 
         self.worker.logInfo.connect(self.logInfo)
         self.worker.finished.connect(self.finished)
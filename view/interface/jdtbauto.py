@@ -1,25 +1,34 @@
 # coding:utf-8
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, override
 
 # from openpyxl.reader.excel import load_workbook
 import polars as pl
+from DrissionPage import Chromium
 from PySide6.QtCore import Qt, QThread, Signal, Slot
 from PySide6.QtWidgets import QFileDialog, QHBoxLayout, QVBoxLayout, QWidget
 from qfluentwidgets import (
     BodyLabel,
+    CheckBox,
     InfoBar,
     InfoBarPosition,
     ProgressBar,
     PushButton,
+    SpinBox,
     TextEdit,
     LineEdit,
 )
 
 from common.config import cfg
+from utils.direct_search import DirectSearchClient
 from utils.jd import JD
+from utils.pacing import AdaptivePacer, RateLimiter
 from utils.tb import TB
+from utils.wait import Waiter
 from view.components.dropable_lineEdit import DropableLineEditDir, DropableLineEditExcel
 from view.interface.gallery_interface import GalleryInterface
 
@@ -30,19 +39,103 @@ class JdTbWorker(QThread):
     setProgressInfo = Signal(int, int)
 
     def __init__(
-        self, keyword: Optional[str], keywords_path: Optional[Path], output_dir: Path
+        self,
+        keyword: Optional[str],
+        keywords_path: Optional[Path],
+        output_dir: Path,
+        tabs=1,
+        jd_rate=0,
+        tb_rate=0,
+        direct=False,
+        max_pages=10,
     ):
+        """
+        Args:
+            tabs: 同时搜索的标签页数, 每个标签页从同一个队列中取关键词
+            jd_rate: 京东每分钟最多搜索多少次, 0 表示不限速
+            tb_rate: 淘宝每分钟最多搜索多少次, 0 表示不限速
+            direct: 使用浏览器的 cookie 直接请求搜索接口, 需要验证时才使用浏览器
+            max_pages: 直接请求接口时每个平台最多请求多少页
+        """
         super().__init__()
 
         self.keyword = keyword
         self.keywords_path = keywords_path
         self.output_dir = output_dir
+        self.tabs = max(1, tabs)
+        self.direct = direct
+        self.max_pages = max_pages
+        self.client: Optional[DirectSearchClient] = None
+
+        # 所有标签页共用一个 Waiter, 阻塞时间统计在一起
+        self.waiter = Waiter(
+            timeout=cfg.wait_captcha_timeout.value or None,
+            max_interval=cfg.wait_max_interval.value,
+        )
+
+        # 每个平台的限速由所有标签页共享
+        self.jd_limiter = RateLimiter(jd_rate)
+        self.tb_limiter = RateLimiter(tb_rate)
+
+        # 滑动、翻页的间隔根据延迟和验证码自动调整, 同样由所有标签页共享
+        self.jd_pacer = AdaptivePacer("京东")
+        self.tb_pacer = AdaptivePacer("淘宝")
 
-        self.jd = JD(self.output_dir)
-        self.tb = TB(self.output_dir)
+        # 已完成的关键词数
+        self.done = 0
+        self.done_lock = threading.Lock()
+
+    def crawl(self, tab, keywords: queue.SimpleQueue, total: int) -> None:
+        """
+        一个标签页的工作线程, 从队列中取关键词, 依次搜索京东和淘宝
+        """
+        jd = JD(self.output_dir, self.waiter, tab, self.jd_pacer)
+        tb = TB(self.output_dir, self.waiter, tab, self.tb_pacer)
 
         # 连接 JD 和 TB 中的 logInfo 信号到 JdTbWorker 的 logInfo 信号
-        self.jd.logInfo = self.tb.logInfo = self.logInfo
+        jd.logInfo = tb.logInfo = self.logInfo
+
+        while True:
+            try:
+                keyword = keywords.get_nowait()
+            except queue.Empty:
+                return
+
+            # if Path(self.output_dir, f"{keyword}.xlsx").exists():
+            #     self.logInfo.emit(f"{keyword} 已经存在，跳过")
+            #     continue
+
+            try:
+                self.jd_limiter.acquire()
+                if self.client is not None:
+                    jd.search_direct(keyword, self.client, self.max_pages)
+                else:
+                    jd.search(keyword)
+
+                self.tb_limiter.acquire()
+                if self.client is not None:
+                    tb.search_direct(keyword, self.client, self.max_pages)
+                else:
+                    tb.search(keyword)
+
+                self.logInfo.emit(
+                    f"{self.jd_pacer.summary()}; {self.tb_pacer.summary()}"
+                )
+            except Exception as e:
+                self.logInfo.emit(f"{keyword} 搜索出错: {e}")
+            finally:
+                # 一个关键词搜索完成后再一次性生成 Excel, 淘宝出错时也要导出京东已经保存的数据
+                try:
+                    jd.save.export(self.output_dir / f"{keyword}.xlsx")
+                except Exception as e:
+                    self.logInfo.emit(f"{keyword} 导出 Excel 出错: {e}")
+
+            with self.done_lock:
+                self.done += 1
+                done = self.done
+
+            self.setProgress.emit(done / total * 100)
+            self.setProgressInfo.emit(done, total)
 
     @override
     def run(self):
@@ -61,19 +154,51 @@ class JdTbWorker(QThread):
             # 读取商品名称列不为空的数据保存到 keywords, 还要去除重复
             keywords = df.filter(pl.col("商品名称").is_not_null())["商品名称"].to_list()
 
-        for idx, keyword in enumerate(keywords):
-            self.setProgress.emit((idx + 1) // len(keywords) * 100)
-            self.setProgressInfo.emit(idx + 1, len(keywords))
-
-            # if Path(self.output_dir, f"{keyword}.xlsx").exists():
-            #     self.logInfo.emit(f"{keyword} 已经存在，跳过")
-            #     continue
-
-            self.jd.search(keyword)
+        if not keywords:
+            return
 
-            self.tb.search(keyword)
+        pending: queue.SimpleQueue[str] = queue.SimpleQueue()
+        for keyword in keywords:
+            pending.put(keyword)
+
+        self.setProgressInfo.emit(0, len(keywords))
+
+        # 第一个标签页使用浏览器当前的标签页, 其余的新建, 共用同一个浏览器
+        bro = Chromium()
+        tabs = [bro.latest_tab]
+        for _ in range(min(self.tabs, len(keywords)) - 1):
+            tabs.append(bro.new_tab())
+
+        self.logInfo.emit(f"使用 {len(tabs)} 个标签页搜索 {len(keywords)} 个关键词")
+
+        # 直接请求接口时, 所有标签页共用浏览器中已登录的 cookie 和连接池
+        if self.direct:
+            try:
+                self.client = DirectSearchClient(tabs[0])
+                self.logInfo.emit("已读取浏览器 cookie, 直接请求搜索接口")
+            except Exception as e:
+                self.logInfo.emit(f"读取浏览器 cookie 失败, 使用浏览器搜索: {e}")
+
+        with ThreadPoolExecutor(max_workers=len(tabs)) as pool:
+            futures = [
+                pool.submit(self.crawl, tab, pending, len(keywords)) for tab in tabs
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logInfo.emit(f"标签页出错: {e}")
+
+        if self.client is not None:
+            self.client.close()
+
+        # 关闭新建的标签页
+        if len(tabs) > 1:
+            bro.close_tabs(tabs[1:])
 
         self.logInfo.emit(f"\n耗时: {datetime.now() - start}")
+        self.logInfo.emit(f"阻塞时间: {self.waiter.stats.summary()}")
+        self.logInfo.emit(f"{self.jd_pacer.summary()}\n{self.tb_pacer.summary()}")
 
 
 class JdTBbAutoInterface(GalleryInterface):
@@ -89,6 +214,7 @@ class JdTBbAutoInterface(GalleryInterface):
         self.hBoxLayout = QHBoxLayout()
         self.hBoxLayout_keyword = QHBoxLayout()
         self.hBoxLayout_output = QHBoxLayout()
+        self.hBoxLayout_params = QHBoxLayout()
         self.hBoxLayout_progress = QHBoxLayout()
 
         # 关键词
@@ -131,6 +257,42 @@ class JdTBbAutoInterface(GalleryInterface):
             )
         )
 
+        # 同时搜索的标签页数
+        self.label_tabs = BodyLabel(text="标签页数: ")
+        self.spinBox_tabs = SpinBox()
+        self.spinBox_tabs.setRange(1, 8)
+        self.spinBox_tabs.valueChanged.connect(
+            lambda value: cfg.set(cfg.jdtb_tabs, value)
+        )
+
+        # 每个平台每分钟最多搜索多少次, 0 表示不限速
+        self.label_jd_rate = BodyLabel(text="京东每分钟搜索次数: ")
+        self.spinBox_jd_rate = SpinBox()
+        self.spinBox_jd_rate.setRange(0, 120)
+        self.spinBox_jd_rate.valueChanged.connect(
+            lambda value: cfg.set(cfg.jdtb_jd_rate, value)
+        )
+
+        self.label_tb_rate = BodyLabel(text="淘宝每分钟搜索次数: ")
+        self.spinBox_tb_rate = SpinBox()
+        self.spinBox_tb_rate.setRange(0, 120)
+        self.spinBox_tb_rate.valueChanged.connect(
+            lambda value: cfg.set(cfg.jdtb_tb_rate, value)
+        )
+
+        # 直接请求接口, 需要浏览器已登录
+        self.checkBox_direct = CheckBox(text="直接请求搜索接口")
+        self.checkBox_direct.stateChanged.connect(
+            lambda: cfg.set(cfg.jdtb_direct, self.checkBox_direct.isChecked())
+        )
+
+        self.label_max_pages = BodyLabel(text="最多页数: ")
+        self.spinBox_max_pages = SpinBox()
+        self.spinBox_max_pages.setRange(1, 100)
+        self.spinBox_max_pages.valueChanged.connect(
+            lambda value: cfg.set(cfg.jdtb_max_pages, value)
+        )
+
         # 下载按钮
         self.btn_download = PushButton(text="开始")
         self.btn_download.clicked.connect(self.start)
@@ -157,12 +319,23 @@ class JdTBbAutoInterface(GalleryInterface):
         self.hBoxLayout_output.addWidget(self.lineEdit_output_path)
         self.hBoxLayout_output.addWidget(self.btn_select_output_path)
 
+        self.hBoxLayout_params.addWidget(self.label_tabs)
+        self.hBoxLayout_params.addWidget(self.spinBox_tabs)
+        self.hBoxLayout_params.addWidget(self.label_jd_rate)
+        self.hBoxLayout_params.addWidget(self.spinBox_jd_rate)
+        self.hBoxLayout_params.addWidget(self.label_tb_rate)
+        self.hBoxLayout_params.addWidget(self.spinBox_tb_rate)
+        self.hBoxLayout_params.addWidget(self.checkBox_direct)
+        self.hBoxLayout_params.addWidget(self.label_max_pages)
+        self.hBoxLayout_params.addWidget(self.spinBox_max_pages)
+
         self.hBoxLayout_progress.addWidget(self.progressBar)
         self.hBoxLayout_progress.addWidget(self.label_progress)
 
         self.vBoxLayout.addLayout(self.hBoxLayout_keyword)
         self.vBoxLayout.addLayout(self.hBoxLayout)
         self.vBoxLayout.addLayout(self.hBoxLayout_output)
+        self.vBoxLayout.addLayout(self.hBoxLayout_params)
 
         self.vBoxLayout.addWidget(self.btn_download)
         self.vBoxLayout.addWidget(self.textEdit_log)
@@ -175,6 +348,11 @@ class JdTBbAutoInterface(GalleryInterface):
         # 从配置文件中读取路径
         self.lineEdit_keywordPath.setText(cfg.jdtb_keyword_path.value)
         self.lineEdit_output_path.setText(cfg.jdtb_output_path.value)
+        self.spinBox_tabs.setValue(cfg.jdtb_tabs.value)
+        self.spinBox_jd_rate.setValue(cfg.jdtb_jd_rate.value)
+        self.spinBox_tb_rate.setValue(cfg.jdtb_tb_rate.value)
+        self.checkBox_direct.setChecked(cfg.jdtb_direct.value)
+        self.spinBox_max_pages.setValue(cfg.jdtb_max_pages.value)
 
         self.worker: Optional[JdTbWorker] = None
 
@@ -234,6 +412,16 @@ class JdTBbAutoInterface(GalleryInterface):
         """
         self.label_progress.setText(f"{value}/{total}")
 
+    def crawlOptions(self) -> dict:
+        """界面上的并发和限速设置"""
+        return {
+            "tabs": self.spinBox_tabs.value(),
+            "jd_rate": self.spinBox_jd_rate.value(),
+            "tb_rate": self.spinBox_tb_rate.value(),
+            "direct": self.checkBox_direct.isChecked(),
+            "max_pages": self.spinBox_max_pages.value(),
+        }
+
     @Slot()
     def finished(self):
         self.lineEdit_keywordPath.setEnabled(True)
@@ -242,6 +430,12 @@ class JdTBbAutoInterface(GalleryInterface):
         self.lineEdit_output_path.setEnabled(True)
         self.btn_select_output_path.setEnabled(True)
 
+        self.spinBox_tabs.setEnabled(True)
+        self.spinBox_jd_rate.setEnabled(True)
+        self.spinBox_tb_rate.setEnabled(True)
+        self.checkBox_direct.setEnabled(True)
+        self.spinBox_max_pages.setEnabled(True)
+
         self.btn_download.setEnabled(True)
 
         if self.stateTooltip is not None:
@@ -280,6 +474,12 @@ class JdTBbAutoInterface(GalleryInterface):
         self.lineEdit_output_path.setEnabled(False)
         self.btn_select_output_path.setEnabled(False)
 
+        self.spinBox_tabs.setEnabled(False)
+        self.spinBox_jd_rate.setEnabled(False)
+        self.spinBox_tb_rate.setEnabled(False)
+        self.checkBox_direct.setEnabled(False)
+        self.spinBox_max_pages.setEnabled(False)
+
         self.btn_download.setEnabled(False)
 
         output_dir = Path(self.lineEdit_output_path.text())
@@ -289,11 +489,13 @@ class JdTBbAutoInterface(GalleryInterface):
 
             keyword = keyword.strip()
 
-            self.worker = JdTbWorker(keyword, None, output_dir)
+            self.worker = JdTbWorker(keyword, None, output_dir, **self.crawlOptions())
         elif keywords_path:
             keywords_path = Path(self.lineEdit_keywordPath.text())
 
-            self.worker = JdTbWorker(None, keywords_path, output_dir)
+            self.worker = JdTbWorker(
+                None, keywords_path, output_dir, **self.crawlOptions()
+            )
 
         self.worker.logInfo.connect(self.logInfo)
         self.worker.finished.connect(self.finished)
@@ -9,7 +9,7 @@ from typing import Optional, override
 from mitmproxy.options import Options
 from mitmproxy.tools.dump import DumpMaster
 from openpyxl.reader.excel import load_workbook
-from PySide6.QtCore import Qt, QThread, Signal, Slot
+from PySide6.QtCore import Qt, QThread, QTimer, Signal, Slot
 from PySide6.QtWidgets import QFileDialog, QHBoxLayout, QVBoxLayout, QWidget
 from qfluentwidgets import (
     BodyLabel,
@@ -17,6 +17,7 @@ from qfluentwidgets import (
     InfoBarPosition,
     ProgressBar,
     PushButton,
+    SpinBox,
     TextEdit,
     TogglePushButton,
 )
@@ -26,6 +27,11 @@ from utils.mitm_addon import Addon
 from view.components.dropable_lineEdit import DropableLineEditDir, DropableLineEditExcel
 from view.interface.gallery_interface import GalleryInterface
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 
 class MitmProxySearchWorker(QThread):
     logInfo = Signal(str)
@@ -39,6 +45,7 @@ class MitmProxySearchWorker(QThread):
         output_dir: Path,
         proxy_ip: str,
         proxy_port: int,
+        parse_processes: int = 0,
     ):
         super().__init__()
 
@@ -46,13 +53,15 @@ class MitmProxySearchWorker(QThread):
         self.keyword = keyword
         self.output_dir = output_dir
 
-        self.addon = Addon()
+        self.addon = Addon(parse_processes)
         self.addon.add_text = self.logInfo
         self.addon.save.logInfo = self.logInfo
         self.options = Options(listen_host=proxy_ip, listen_port=proxy_port)
         self.m: Optional[DumpMaster] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
 
     async def start_mitm(self):
+        self.loop = asyncio.get_running_loop()
         self.m = DumpMaster(options=self.options)
         self.m.addons.add(self.addon)
         await self.m.run()
@@ -65,6 +74,18 @@ class MitmProxySearchWorker(QThread):
 
         self.logInfo.emit(f"\n耗时: {datetime.now() - start}")
 
+    def stop(self):
+        """
+        关闭代理
+
+        mitmproxy 退出时调用 Addon.done, 导出所有文件并关闭写入线程、解析线程池和解析进程
+        """
+        if self.m is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.m.shutdown)
+        else:
+            # 代理还没有启动, 直接关闭
+            self.addon.done()
+
 
 class MitmProxySearchInterface(GalleryInterface):
     def __init__(self, parent=None):
@@ -81,6 +102,7 @@ class MitmProxySearchInterface(GalleryInterface):
         self.hBoxLayout_output = QHBoxLayout()
         self.hBoxLayout_keyword = QHBoxLayout()
         self.hBoxLayout_progress = QHBoxLayout()
+        self.hBoxLayout_stats = QHBoxLayout()
 
         # 设置代理
         self.label_proxy = BodyLabel(text="设置系统代理: ")
@@ -144,6 +166,14 @@ class MitmProxySearchInterface(GalleryInterface):
         self.btn_next = PushButton(text="修改")
         self.btn_next.clicked.connect(self.set_keyword)
 
+        # 解析响应的子进程数, 0 表示在线程池中解析
+        self.label_parse_processes = BodyLabel(text="解析进程数: ")
+        self.spinBox_parse_processes = SpinBox()
+        self.spinBox_parse_processes.setRange(0, 16)
+        self.spinBox_parse_processes.valueChanged.connect(
+            lambda value: cfg.set(cfg.mitmProxySearch_parse_processes, value)
+        )
+
         # 开始按钮
         self.btn_start = TogglePushButton(text="开始")
         self.btn_start.clicked.connect(self.start)
@@ -158,6 +188,17 @@ class MitmProxySearchInterface(GalleryInterface):
         # 进度提示标签
         self.label_progress = BodyLabel(text="0/0")
 
+        # 代理的内存和延迟统计
+        self.label_memory = BodyLabel(text="内存: -")
+        self.label_flows = BodyLabel(text="直通: 0  缓冲: 0 (0.0 MB)")
+        self.label_latency = BodyLabel(text="延迟: -")
+        self.label_parse = BodyLabel(text="解析: -")
+
+        # 代理运行时每秒刷新一次统计
+        self.timer_stats = QTimer(self)
+        self.timer_stats.setInterval(1000)
+        self.timer_stats.timeout.connect(self.updateStats)
+
         # 布局-设置代理
         self.hBoxLayout_proxy.addWidget(self.label_proxy)
         self.hBoxLayout_proxy.addWidget(self.lineEdit_proxy)
@@ -177,18 +218,27 @@ class MitmProxySearchInterface(GalleryInterface):
         self.hBoxLayout_keyword.addWidget(self.label_keyword)
         self.hBoxLayout_keyword.addWidget(self.lineEdit_keyword)
         self.hBoxLayout_keyword.addWidget(self.btn_next)
+        self.hBoxLayout_keyword.addWidget(self.label_parse_processes)
+        self.hBoxLayout_keyword.addWidget(self.spinBox_parse_processes)
         self.hBoxLayout_keyword.addWidget(self.btn_start)
 
         # 布局-进度条
         self.hBoxLayout_progress.addWidget(self.progressBar)
         self.hBoxLayout_progress.addWidget(self.label_progress)
 
+        # 布局-代理统计
+        self.hBoxLayout_stats.addWidget(self.label_memory)
+        self.hBoxLayout_stats.addWidget(self.label_flows)
+        self.hBoxLayout_stats.addWidget(self.label_latency)
+        self.hBoxLayout_stats.addWidget(self.label_parse)
+
         # 垂直布局
         self.vBoxLayout.addLayout(self.hBoxLayout_proxy)
         self.vBoxLayout.addLayout(self.hBoxLayout_excel)
         self.vBoxLayout.addLayout(self.hBoxLayout_output)
         self.vBoxLayout.addLayout(self.hBoxLayout_keyword)
 
+        self.vBoxLayout.addLayout(self.hBoxLayout_stats)
         self.vBoxLayout.addWidget(self.textEdit_log)
 
         # 进度条
@@ -201,6 +251,9 @@ class MitmProxySearchInterface(GalleryInterface):
         self.lineEdit_excelPath.setText(cfg.mitmProxySearch_excel_path.value)
         self.lineEdit_output_path.setText(cfg.mitmProxySearch_output_path.value)
         self.lineEdit_keyword.setText(cfg.mitmProxySearch_keyword.value)
+        self.spinBox_parse_processes.setValue(
+            cfg.mitmProxySearch_parse_processes.value
+        )
 
         self.worker: Optional[MitmProxySearchWorker] = None
 
@@ -273,12 +326,47 @@ class MitmProxySearchInterface(GalleryInterface):
         """
         self.label_progress.setText(f"{value}/{total}")
 
+    @Slot()
+    def updateStats(self):
+        """刷新代理的内存、流量和延迟统计"""
+        if psutil is not None:
+            rss = psutil.Process().memory_info().rss / 1024 / 1024
+            self.label_memory.setText(f"内存: {rss:.0f} MB")
+        else:
+            self.label_memory.setText("内存: - (未安装 psutil)")
+
+        if self.worker is None:
+            return
+
+        flows = self.worker.addon.flow_stats.snapshot()
+        self.label_flows.setText(
+            f"直通: {flows['streamed']}  缓冲: {flows['buffered']} "
+            f"({flows['buffered_mb']:.1f} MB)"
+        )
+        self.label_latency.setText(
+            f"延迟: 平均 {flows['avg_latency_ms']:.0f}ms, "
+            f"最长 {flows['max_latency_ms']:.0f}ms"
+        )
+
+        routes = self.worker.addon.router.snapshot()
+        parsed = sum(s["parsed"] for s in routes.values())
+        avg_ms = (
+            sum(s["avg_ms"] * s["parsed"] for s in routes.values()) / parsed
+            if parsed
+            else 0.0
+        )
+        self.label_parse.setText(f"解析: {parsed:.0f} 次, 平均 {avg_ms:.1f}ms")
+
     @Slot()
     def set_keyword(self):
         """
         设置关键词
         """
         keyword = self.lineEdit_keyword.text()
+
+        # 切换关键词前先把上一个关键词的数据生成 Excel
+        self.worker.addon.export()
+
         self.worker.addon.keyword = keyword
 
         filename = Path(self.lineEdit_output_path.text()) / f"{keyword}.xlsx"
@@ -362,12 +450,20 @@ class MitmProxySearchInterface(GalleryInterface):
 
     def start(self):
         if self.btn_start_flag:
+            # 关闭代理, 生成所有关键词的 Excel
+            if self.worker is not None:
+                self.worker.stop()
+
+            # 停止刷新统计
+            self.timer_stats.stop()
+
             # 启用控件
             self.lineEdit_excelPath.setEnabled(True)
             self.btn_select_excel_path.setEnabled(True)
 
             self.lineEdit_output_path.setEnabled(True)
             self.btn_select_output_path.setEnabled(True)
+            self.spinBox_parse_processes.setEnabled(True)
 
             self.btn_start.setText("开始")
             self.btn_start_flag = False
@@ -418,6 +514,7 @@ class MitmProxySearchInterface(GalleryInterface):
             self.btn_select_excel_path.setEnabled(False)
 
             self.lineEdit_output_path.setEnabled(False)
+            self.spinBox_parse_processes.setEnabled(False)
 
             self.btn_start.setText("停止")
 
@@ -427,7 +524,12 @@ class MitmProxySearchInterface(GalleryInterface):
             #     )
             # elif keyword:
             self.worker = MitmProxySearchWorker(
-                None, keyword, Path(output_dir), proxy_ip, int(proxy_port)
+                None,
+                keyword,
+                Path(output_dir),
+                proxy_ip,
+                int(proxy_port),
+                self.spinBox_parse_processes.value(),
             )
 
             self.btn_start_flag = True
@@ -439,8 +541,10 @@ class MitmProxySearchInterface(GalleryInterface):
             self.worker.logInfo.connect(self.logInfo)
             self.worker.setProgress.connect(self.setProgress)
             self.worker.setProgressInfo.connect(self.setProgressInfo)
+            self.worker.finished.connect(self.timer_stats.stop)
 
             self.worker.addon.keyword = keyword
             self.worker.addon.filename = filename
 
             self.worker.start()
+            self.timer_stats.start()
@@ -18,6 +18,7 @@ from qfluentwidgets import (
 )
 
 from common.config import cfg
+from utils.wait import Waiter
 from view.components.dropable_lineEdit import DropableLineEditDir, DropableLineEditExcel
 from view.interface.gallery_interface import GalleryInterface
 
@@ -35,6 +36,12 @@ class ReCheckWorker(QThread):
 
         self.bro = Chromium()
 
+        self.waiter = Waiter(
+            timeout=cfg.wait_captcha_timeout.value or None,
+            max_interval=cfg.wait_max_interval.value,
+        )
+        self.page_timeout = cfg.wait_page_timeout.value
+
     def jd(self, store_url: str, medicine_name: str, store_name: str) -> bool:
         res: bool = False
 
@@ -42,9 +49,13 @@ class ReCheckWorker(QThread):
 
         # 等待用户登录
         tab.get("https://www.jd.com/")
-        ele_nickname = tab.ele("tag:a@class=nickname", timeout=70)
-        if not ele_nickname:
-            self.logInfo.emit("请在浏览器中登录京东账号")
+        logged_in = self.waiter.until(
+            lambda: tab.ele("tag:a@class=nickname", timeout=0),
+            reason="等待登录京东",
+            on_blocked=lambda: self.logInfo.emit("请在浏览器中登录京东账号"),
+        )
+        if not logged_in:
+            self.logInfo.emit("等待登录京东超时")
 
         # 进入店铺搜索药品
         new_tab = self.bro.new_tab(store_url)
@@ -72,16 +83,30 @@ class ReCheckWorker(QThread):
 
         # 等待用户登录
         tab.get("https://www.taobao.com/")
-        ele_login_flag = tab.ele("tag:a@class=site-nav-login-info-nick", timeout=70)
-        if not ele_login_flag:
-            self.logInfo.emit("请在浏览器中登录淘宝账号")
+        logged_in = self.waiter.until(
+            lambda: tab.ele("tag:a@class=site-nav-login-info-nick", timeout=0),
+            reason="等待登录淘宝",
+            on_blocked=lambda: self.logInfo.emit("请在浏览器中登录淘宝账号"),
+        )
+        if not logged_in:
+            self.logInfo.emit("等待登录淘宝超时")
 
         # 进入店铺搜索药品
         new_tab = self.bro.new_tab(store_url)
 
-        while "404 Not Found" in new_tab.html:
+        def loaded() -> bool:
+            if "404 Not Found" not in new_tab.html:
+                return True
+
             new_tab.refresh()
-            sleep(1)
+            return False
+
+        # 店铺页面 404 时刷新重试, 超时后放弃
+        if not self.waiter.until(
+            loaded, reason="淘宝店铺 404", timeout=self.page_timeout
+        ):
+            self.bro.close_tabs(new_tab)
+            raise TimeoutError("店铺页面一直 404")
 
         sleep(0.5)
         new_tab.ele("#mq", timeout=10).input(medicine_name)
@@ -155,6 +180,7 @@ class ReCheckWorker(QThread):
         df.to_excel(self.output_dir / "复查结果.xlsx", index=False, engine="openpyxl")
 
         self.logInfo.emit(f"\n耗时: {datetime.now() - start}")
+        self.logInfo.emit(f"阻塞时间: {self.waiter.stats.summary()}")
 
 
 class ReCheckInterface(GalleryInterface):
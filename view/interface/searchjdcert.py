@@ -26,6 +26,7 @@ from qfluentwidgets import (
 )
 
 from common.config import cfg
+from utils.wait import Waiter
 from view.components.dropable_lineEdit import DropableLineEditExcelDir
 from view.interface.gallery_interface import GalleryInterface
 
@@ -47,6 +48,11 @@ class SearchJdCertWorker(QThread):
         self.bro = Chromium()
         self.tab = self.bro.latest_tab
 
+        self.waiter = Waiter(
+            timeout=cfg.wait_captcha_timeout.value or None,
+            max_interval=cfg.wait_max_interval.value,
+        )
+
         # 预先编译正则表达式
         self.store_name_pattern = re.compile(r'document\.title="(.*?)"')
 
@@ -164,11 +170,20 @@ class SearchJdCertWorker(QThread):
             verifyCode = self.ocr_classification(img)
             verifyCode_input.input(verifyCode).input(Keys.ENTER)
 
-            # 验证码错误, 重新识别
-            while self.tab("#verifyCode_error", timeout=3):
+            def verified() -> bool:
+                # 提交后最多等 3 秒看是否提示验证码错误
+                if not self.tab("#verifyCode_error", timeout=3):
+                    return True
+
+                # 验证码错误, 重新识别
                 img = verifyCodeImg.src()
                 verifyCode = self.ocr_classification(img)
                 verifyCode_input.input(verifyCode).input(Keys.ENTER)
+                return False
+
+            if not self.waiter.until(verified, reason="京东资质验证码"):
+                self.logInfo.emit(f"识别验证码超时: {url}")
+                return
 
             # 获取数据包并解析
             res = self.tab.listen.wait(timeout=2)
@@ -206,6 +221,8 @@ class SearchJdCertWorker(QThread):
 
             self.process_url(url)
 
+        self.logInfo.emit(f"阻塞时间: {self.waiter.stats.summary()}")
+
 
 class SearchJdCertInterface(GalleryInterface):
     def __init__(self, parent=None):
@@ -1,35 +1,97 @@
 # coding:utf-8
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
-from typing import Optional, override
+from typing import Iterator, NamedTuple, Optional, override
 
 import cv2
 import numpy as np
-import onnxruntime as ort
+import polars as pl
 from PySide6.QtCore import Qt, QThread, Signal, Slot
 from PySide6.QtWidgets import QFileDialog, QHBoxLayout, QVBoxLayout, QWidget
 from qfluentwidgets import (
     BodyLabel,
+    CheckBox,
+    ComboBox,
     InfoBar,
     InfoBarPosition,
     ProgressBar,
     PushButton,
+    SpinBox,
     TextEdit,
 )
 
 from common.config import cfg
 from utils.classnames import CLASS_NAMES
+from utils.yolo import (
+    SUPPORTED_FORMATS,
+    Detection,
+    InferenceCache,
+    ShardedInference,
+    compare_report,
+    content_hash,
+    create_session,
+    evaluate_model,
+    letterbox,
+    medicine_label,
+    model_input,
+    postprocess,
+    quantize_model,
+    to_input,
+)
 from view.components.dropable_lineEdit import DropableLineEditDir, DropableLineEditOnnx
 from view.interface.gallery_interface import GalleryInterface
 
 
+# 界面上的选项与 utils.yolo 中设置的对应关系
+GRAPH_OPTIMIZATION_OPTIONS = {
+    "全部": "all",
+    "扩展": "extended",
+    "基础": "basic",
+    "禁用": "disable",
+}
+EXECUTION_MODE_OPTIONS = {"顺序": "sequential", "并行": "parallel"}
+QUANT_MODE_OPTIONS = {"动态": "dynamic", "静态": "static"}
+
+
+class Preprocessed(NamedTuple):
+    """一张图片的预处理结果"""
+
+    image_hash: str
+    slot: Optional[int]  # 画布编号, 命中缓存时为 None
+    ratio: float
+    pad: tuple[int, int]
+    cached: bool
+    detection: Optional[Detection]  # 命中缓存时的检测结果
+
+
 class YoloInferenceWorker(QThread):
     logInfo = Signal(str)
     setProgress = Signal(int)
     setProgressInfo = Signal(int, int)
 
     # 定义支持的文件格式集合
-    SUPPORTED_FORMATS = {".jpeg", ".jpg", ".webp", ".png", ".avif", ".gif"}
+    SUPPORTED_FORMATS = SUPPORTED_FORMATS
+
+    # 导出的识别结果的列
+    PREDICTION_SCHEMA = {
+        "图片": pl.Utf8,
+        "图片哈希": pl.Utf8,
+        "类别ID": pl.Int64,
+        "类别": pl.Utf8,
+        "置信度": pl.Float64,
+        "x1": pl.Float64,
+        "y1": pl.Float64,
+        "x2": pl.Float64,
+        "y2": pl.Float64,
+        "命中缓存": pl.Boolean,
+        "移动到": pl.Utf8,
+    }
 
     def __init__(
         self,
@@ -38,7 +100,28 @@ class YoloInferenceWorker(QThread):
         output_dir: Path,
         conf_thresh=0.85,
         iou_thresh=0.5,
+        batch_size=8,
+        intra_threads=0,
+        inter_threads=0,
+        decode_workers: Optional[int] = None,
+        export_format: Optional[str] = None,
+        graph_optimization="all",
+        execution_mode="sequential",
+        cache_optimized=False,
+        processes=1,
     ):
+        """
+        Args:
+            batch_size: 每次推理的图片数量
+            decode_workers: 并行读取、解码、预处理图片的线程数, 默认为 CPU 核数的一半
+            intra_threads: 单个算子使用的线程数, 0 表示由 onnxruntime 决定
+            inter_threads: 算子之间并行的线程数, 0 表示由 onnxruntime 决定
+            export_format: 识别结果导出格式, "CSV" 或者 "Parquet", None 表示不导出
+            graph_optimization: 图优化级别
+            execution_mode: 执行模式
+            cache_optimized: 是否缓存优化后的模型
+            processes: 推理进程数, 大于 1 时把图片分片到多个进程, 每个进程各自加载模型
+        """
         super().__init__()
 
         self.img_dir = img_dir
@@ -55,131 +138,228 @@ class YoloInferenceWorker(QThread):
             0, 255, size=(len(self.classes), 3), dtype="uint8"
         )
 
-        # 加载 ONNX 模型
-        self.session = ort.InferenceSession(
-            model_path,
-            providers=(
-                ["CUDAExecutionProvider"]
-                if ort.get_device() == "GPU"
-                else ["CPUExecutionProvider"]
-            ),
+        self.session_kwargs = {
+            "intra_threads": intra_threads,
+            "inter_threads": inter_threads,
+            "graph_optimization": graph_optimization,
+            "execution_mode": execution_mode,
+            "cache_optimized": cache_optimized,
+        }
+        self.processes = processes
+        self.batch_size = batch_size
+
+        # 预处理线程数
+        self.decode_workers = decode_workers or max(1, min(8, (os.cpu_count() or 2) // 2))
+
+        # 多进程时每个进程各自加载模型
+        if self.processes == 1:
+            self.init_session()
+
+        # 推理结果缓存, 同一张图片、同一个模型和阈值只推理一次
+        self.cache = InferenceCache(img_dir, model_path, conf_thresh)
+
+        # 识别结果, 用于导出
+        self.export_format = export_format
+        self.predictions: list[tuple] = []
+
+        # 纯推理耗时、等待预处理的耗时, 单位秒
+        self.infer_seconds = 0.0
+        self.wait_seconds = 0.0
+
+        # 推理成功的图片数, 不包括命中缓存、解码失败和推理失败的图片
+        self.inferred = 0
+
+    def init_session(self) -> None:
+        """加载 ONNX 模型, 并预先分配预处理和推理用的内存"""
+        self.session = create_session(self.model_path, **self.session_kwargs)
+        model = model_input(self.session)
+        self.input_name = model.name
+
+        # 模型的批次维度是固定值时, 只能按固定大小推理
+        self.static_batch = model.static_batch
+        self.batch_size = self.static_batch or self.batch_size
+
+        # 最多提前预处理多少张图片
+        self.prefetch = max(self.batch_size * 4, self.decode_workers * 2)
+
+        # 预先分配内存, 推理过程中不再为每张图片分配:
+        # 每张预处理中的图片占用一块 uint8 画布, 推理时写入 float32 输入张量
+        self.canvases = np.empty(
+            (self.prefetch, model.height, model.width, 3), dtype=np.uint8
         )
-        self.input_shape = self.session.get_inputs()[0].shape[
-            2:4
-        ]  # 模型输入尺寸 (H, W)
+        self.free_canvases: queue.SimpleQueue[int] = queue.SimpleQueue()
+        for slot in range(self.prefetch):
+            self.free_canvases.put(slot)
 
-    def letterbox(
-        self,
-        img: cv2.Mat,
-        new_shape=(640, 640),
-        color=(114, 114, 114),
-        auto=False,
-        scaleFill=False,
-        scaleup=True,
-    ):
+        self.input_buffer = np.zeros(
+            (self.batch_size, 3, model.height, model.width), dtype=np.float32
+        )
+
+    def preprocess(self, image_path: Path) -> Preprocessed:
         """
-        将图像进行 letterbox 填充，保持纵横比不变，并缩放到指定尺寸。
+        读取图像并计算哈希, 没有命中缓存时再解码并 letterbox 到一块空闲的画布中
         """
-        shape = img.shape[:2]  # 当前图像的宽高
-
-        if isinstance(new_shape, int):
-            new_shape = (new_shape, new_shape)
-
-        # 计算缩放比例
-        r = min(
-            new_shape[0] / shape[0], new_shape[1] / shape[1]
-        )  # 选择宽高中最小的缩放比
-        if not scaleup:  # 仅缩小，不放大
-            r = min(r, 1.0)
-
-        # 缩放后的未填充尺寸
-        new_unpad = (int(round(shape[1] * r)), int(round(shape[0] * r)))
+        # np.fromfile 直接读取到数组, 也支持中文路径
+        data = np.fromfile(image_path, dtype=np.uint8)
+        image_hash = content_hash(data)
 
-        # 计算需要的填充
-        dw, dh = (
-            new_shape[1] - new_unpad[0],
-            new_shape[0] - new_unpad[1],
-        )  # 计算填充的尺寸
-        dw /= 2  # padding 均分
-        dh /= 2
+        # 命中缓存的图片不解码, 也不占用画布
+        cached, detection = self.cache.get(image_hash)
+        if cached:
+            return Preprocessed(image_hash, None, 0.0, (0, 0), True, detection)
 
-        # 缩放图像
-        if shape[::-1] != new_unpad:  # 如果当前图像尺寸不等于 new_unpad，则缩放
-            img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"无法解码图片: {image_path}")
 
-        # 为图像添加边框以达到目标尺寸
-        top, bottom = int(round(dh)), int(round(dh))
-        left, right = int(round(dw)), int(round(dw))
-        img = cv2.copyMakeBorder(
-            img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color
-        )
-
-        # 确保填充后的图像尺寸为 640x640
-        img = cv2.resize(
-            img, (new_shape[1], new_shape[0]), interpolation=cv2.INTER_LINEAR
-        )
+        # 保持宽高比，进行 letterbox 填充, 使用模型要求的输入尺寸
+        # 预处理在多个线程中并行执行, 结果不能保存在实例属性中
+        slot = self.free_canvases.get()
+        try:
+            ratio, pad = letterbox(img, self.canvases[slot])
+        except Exception:
+            self.free_canvases.put(slot)
+            raise
 
-        return img, (r, r), (dw, dh)
+        return Preprocessed(image_hash, slot, ratio, pad, False, None)
 
-    def preprocess(self, image_path: Path) -> tuple[cv2.Mat, np.array, tuple[int, int]]:
-        """预处理输入图像，返回调整后的图像和比例信息"""
-        with open(image_path, "rb") as f:
-            img_array = np.asarray(bytearray(f.read()), dtype=np.uint8)
+    def fill_input(self, index: int, slot: int) -> None:
+        """
+        把画布写入输入张量的第 index 张图片, 并归还画布
+        """
+        to_input(self.canvases[slot], self.input_buffer[index])
 
-        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+        self.free_canvases.put(slot)
 
-        h, w = img.shape[:2]
+    def classify(
+        self, img_path: Path, top: Optional[Detection], output_dir: Path
+    ) -> Optional[Path]:
+        """
+        根据置信度最高的检测结果整理图片
 
-        # 将图像颜色空间从 BGR 转换为 RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        Returns:
+            图片被移动到的路径, 没有移动时为 None
+        """
+        # 如果识别到的物体不是当前目录的药品名，则移动到对应目录
+        medicine_name = medicine_label(img_path)
+        if top is None or medicine_name not in top.class_name:
+            new_dir = output_dir / medicine_name
+            new_dir.mkdir(exist_ok=True)
+            new_path = new_dir / img_path.name
+            img_path.rename(new_path)
+            return new_path
 
-        # 保持宽高比，进行 letterbox 填充, 使用模型要求的输入尺寸
-        img, self.ratio, (self.dw, self.dh) = self.letterbox(img, new_shape=(640, 640))
+        return None
 
-        # 通过除以 255.0 来归一化图像数据
-        img_normalized = np.array(img) / 255.0
+    def record(
+        self,
+        img_path: Path,
+        image_hash: str,
+        top: Optional[Detection],
+        cached: bool,
+    ) -> None:
+        """整理图片, 并记录识别结果用于导出"""
+        moved_to = self.classify(img_path, top, self.output_dir)
+
+        if not self.export_format:
+            return
 
-        # 将图像的通道维度移到第一维
-        img_transposed = np.transpose(img_normalized, (2, 0, 1))
+        self.predictions.append(
+            (
+                str(img_path),
+                image_hash,
+                *(
+                    (None,) * 7
+                    if top is None
+                    else (top.class_id, top.class_name, top.confidence, *top.box)
+                ),
+                cached,
+                None if moved_to is None else str(moved_to),
+            )
+        )
 
-        # 扩展图像数据的维度，以匹配模型输入的形状
-        image_data = np.expand_dims(img_transposed, axis=0).astype(np.float32)
+    def export_predictions(self) -> Optional[Path]:
+        """把识别结果导出为 CSV 或者 Parquet 文件"""
+        if not self.export_format or not self.predictions:
+            return None
 
-        return img, image_data, (w, h)
+        df = pl.DataFrame(
+            self.predictions, schema=self.PREDICTION_SCHEMA, orient="row"
+        )
 
-    def postprocess(
-        self,
-        outputs,
-        img_path: Path,
-        output_dir: Path,
-    ):
-        # 解析模型输出
-        outputs = np.transpose(np.squeeze(outputs[0]))
+        if self.export_format == "Parquet":
+            filename = self.output_dir / "识别结果.parquet"
+            df.write_parquet(filename)
+        else:
+            filename = self.output_dir / "识别结果.csv"
+            # 带 BOM, 方便直接用 Excel 打开
+            df.write_csv(filename, include_bom=True)
 
-        conf_id_list = []
+        return filename
 
-        for i in range(outputs.shape[0]):
+    def infer_batch(self, batch: list[tuple[Path, str, float, tuple[int, int]]]):
+        """
+        对已写入输入张量的一批图片 (N×3×640×640) 推理, 再把结果分发给每张图片
+        """
+        # 固定批次的模型, 不足一批时用 0 补齐
+        if self.static_batch:
+            self.input_buffer[len(batch) :] = 0
+            inputs = self.input_buffer
+        else:
+            inputs = self.input_buffer[: len(batch)]
+
+        start = time.perf_counter()
+        outputs = self.session.run(None, {self.input_name: inputs})
+        self.infer_seconds += time.perf_counter() - start
+        self.inferred += len(batch)
+
+        results: list[tuple[str, Optional[Detection]]] = []
+
+        for j, (image_path, image_hash, ratio, pad) in enumerate(batch):
+            detections = postprocess(
+                outputs[0][j : j + 1],
+                ratio,
+                pad,
+                self.classes,
+                self.conf_thresh,
+                self.iou_thresh,
+            )
+            top = detections[0] if detections else None
+            results.append((image_hash, top))
+            self.record(image_path, image_hash, top, cached=False)
 
-            classes_scores = outputs[i][4:]
+        # 一批结果一次写入缓存
+        self.cache.put_many(results)
 
-            conf = np.amax(classes_scores)
+    def preprocessed(
+        self, imgs: list[Path]
+    ) -> Iterator[tuple[Path, Optional[Preprocessed], Optional[Exception]]]:
+        """
+        多线程预处理图片, 按原顺序返回 (图片路径, 预处理结果, 异常)
 
-            if conf < self.conf_thresh:
-                continue
+        最多同时有 prefetch 张图片在预处理或者等待推理, 推理线程取走一张才会再提交一张
+        """
+        with ThreadPoolExecutor(max_workers=self.decode_workers) as pool:
+            pending: deque[tuple[Path, Future]] = deque()
+            it = iter(imgs)
 
-            class_id = np.argmax(classes_scores)
+            for image_path in islice(it, self.prefetch):
+                pending.append((image_path, pool.submit(self.preprocess, image_path)))
 
-            conf_id_list.append((conf, class_id))
+            while pending:
+                image_path, future = pending.popleft()
 
-        # 按置信度降序排序
-        conf_id_list.sort(key=lambda x: x[0], reverse=True)
+                next_path = next(it, None)
+                if next_path is not None:
+                    pending.append((next_path, pool.submit(self.preprocess, next_path)))
 
-        # 如果识别到的物体不是当前目录的药品名，则移动到对应目录
-        medicine_name = img_path.stem.split("_")[0]
-        if not conf_id_list or medicine_name not in CLASS_NAMES[conf_id_list[0][1]]:
-            new_dir = output_dir / medicine_name
-            new_dir.mkdir(exist_ok=True)
-            img_path.rename(new_dir / img_path.name)
+                start = time.perf_counter()
+                try:
+                    yield image_path, future.result(), None
+                except Exception as e:
+                    yield image_path, None, e
+                finally:
+                    self.wait_seconds += time.perf_counter() - start
 
     @override
     def run(self):
@@ -193,22 +373,10 @@ class YoloInferenceWorker(QThread):
 
         self.setProgressInfo.emit(0, len(imgs))
 
-        for i, image_path in enumerate(imgs):
-            self.setProgress.emit((i + 1) / len(imgs) * 100)
-            self.setProgressInfo.emit(i + 1, len(imgs))
-
-            try:
-                original_img, preprocessed_img, original_size = self.preprocess(
-                    image_path
-                )
-                outputs = self.session.run(
-                    None, {self.session.get_inputs()[0].name: preprocessed_img}
-                )
-                self.postprocess(outputs, image_path, self.output_dir)
-            except Exception as e:
-                fail_imgs.append(image_path)
-                self.logInfo.emit(f"推理失败: {str(e)}")
-                continue
+        if self.processes > 1:
+            self.run_sharded(imgs, fail_imgs)
+        else:
+            self.run_threaded(imgs, fail_imgs)
 
         # 打印推理失败的图片
         if fail_imgs:
@@ -216,14 +384,247 @@ class YoloInferenceWorker(QThread):
             for img in fail_imgs:
                 self.logInfo.emit(str(img))
 
+        self.cache.close()
+
+        # 导出识别结果
+        try:
+            filename = self.export_predictions()
+            if filename is not None:
+                self.logInfo.emit(f"\n识别结果已导出到: {filename}")
+        except Exception as e:
+            self.logInfo.emit(f"\n导出识别结果失败: {str(e)}")
+
         # 计算还剩多少张图片
         remain_imgs = len(
             [f for f in self.img_dir.rglob("*") if f.suffix in self.SUPPORTED_FORMATS]
         )
 
+        elapsed = (datetime.now() - start).total_seconds()
+
         self.logInfo.emit(
             f"\n耗时: {datetime.now() - start}. 共有 {len(imgs)} 张图片, 识别后剩余 {remain_imgs} 张图片"
         )
+        # 推理耗时只包括实际推理成功的图片
+        self.logInfo.emit(
+            f"批次大小: {self.batch_size}, "
+            f"吞吐量: {len(imgs) / elapsed if elapsed else 0:.1f} 张/秒, "
+            f"纯推理: {self.inferred / self.infer_seconds if self.infer_seconds else 0:.1f} 张/秒"
+        )
+        if self.processes > 1:
+            self.logInfo.emit(
+                f"推理进程数: {self.processes}, 各进程推理耗时合计: {self.infer_seconds:.1f}s"
+            )
+        else:
+            self.logInfo.emit(
+                f"预处理线程数: {self.decode_workers}, "
+                f"推理耗时: {self.infer_seconds:.1f}s, 等待预处理耗时: {self.wait_seconds:.1f}s"
+            )
+        self.logInfo.emit(
+            f"命中缓存: {self.cache.hits} 张, 实际推理: {self.inferred} 张"
+        )
+
+    def run_sharded(self, imgs: list[Path], fail_imgs: list[Path]) -> None:
+        """把图片分片到多个进程推理, 在当前线程汇总结果、整理图片"""
+        sharded = ShardedInference(
+            self.model_path,
+            self.processes,
+            self.classes,
+            self.conf_thresh,
+            self.iou_thresh,
+            batch_size=self.batch_size,
+            cache_dir=self.img_dir,
+            **self.session_kwargs,
+        )
+
+        results: list[tuple[str, Optional[Detection]]] = []
+
+        try:
+            for i, result in enumerate(sharded.run(imgs)):
+                image_path = Path(result.image_path)
+
+                if result.error is not None:
+                    fail_imgs.append(image_path)
+                    self.logInfo.emit(f"推理失败: {result.error}")
+                else:
+                    if result.cached:
+                        self.cache.hits += 1
+                    else:
+                        self.cache.misses += 1
+                        self.inferred += 1
+                        results.append((result.image_hash, result.detection))
+
+                    try:
+                        self.record(
+                            image_path,
+                            result.image_hash,
+                            result.detection,
+                            cached=result.cached,
+                        )
+                    except Exception as e:
+                        fail_imgs.append(image_path)
+                        self.logInfo.emit(f"推理失败: {str(e)}")
+
+                # 结果分批写入缓存
+                if len(results) >= self.batch_size:
+                    self.cache.put_many(results)
+                    results = []
+
+                self.setProgress.emit((i + 1) / len(imgs) * 100)
+                self.setProgressInfo.emit(i + 1, len(imgs))
+        except Exception as e:
+            self.logInfo.emit(f"推理失败: {str(e)}")
+        finally:
+            if results:
+                self.cache.put_many(results)
+
+        self.infer_seconds = sharded.infer_seconds
+
+    def run_threaded(self, imgs: list[Path], fail_imgs: list[Path]) -> None:
+        """单进程推理, 多线程预处理"""
+        batch: list[tuple[Path, str, float, tuple[int, int]]] = []
+
+        for i, (image_path, preprocessed, error) in enumerate(
+            self.preprocessed(imgs)
+        ):
+            if error is None and preprocessed.cached:
+                # 命中缓存, 直接使用上次的结果
+                try:
+                    self.record(
+                        image_path,
+                        preprocessed.image_hash,
+                        preprocessed.detection,
+                        cached=True,
+                    )
+                except Exception as e:
+                    fail_imgs.append(image_path)
+                    self.logInfo.emit(f"推理失败: {str(e)}")
+            elif error is None:
+                self.fill_input(len(batch), preprocessed.slot)
+                batch.append(
+                    (
+                        image_path,
+                        preprocessed.image_hash,
+                        preprocessed.ratio,
+                        preprocessed.pad,
+                    )
+                )
+            else:
+                fail_imgs.append(image_path)
+                self.logInfo.emit(f"推理失败: {str(error)}")
+
+            # 凑满一批或者最后一张时推理
+            if batch and (len(batch) >= self.batch_size or i == len(imgs) - 1):
+                try:
+                    self.infer_batch(batch)
+                except Exception as e:
+                    fail_imgs.extend(image_path for image_path, *_ in batch)
+                    self.logInfo.emit(f"推理失败: {str(e)}")
+
+                batch = []
+
+            self.setProgress.emit((i + 1) / len(imgs) * 100)
+            self.setProgressInfo.emit(i + 1, len(imgs))
+
+
+class YoloQuantizeWorker(QThread):
+    """把模型量化为 INT8, 并在带标注的样本上对比量化前后的准确率和吞吐量"""
+
+    logInfo = Signal(str)
+    setProgress = Signal(int)
+
+    # 静态量化最多使用多少张校准图片
+    CALIBRATION_IMAGES = 100
+
+    def __init__(
+        self,
+        model_path: Path,
+        sample_dir: Optional[Path],
+        mode="dynamic",
+        conf_thresh=0.85,
+        iou_thresh=0.5,
+        **session_kwargs,
+    ):
+        """
+        Args:
+            sample_dir: 带标注的样本文件夹, 文件名中第一个 _ 之前为药品名
+            mode: dynamic 动态量化, static 静态量化
+            session_kwargs: 评估时传给 create_session 的参数
+        """
+        super().__init__()
+
+        self.model_path = model_path
+        self.sample_dir = sample_dir
+        self.mode = mode
+        self.conf_thresh = conf_thresh
+        self.iou_thresh = iou_thresh
+        self.session_kwargs = session_kwargs
+
+    @override
+    def run(self):
+        images = (
+            sorted(
+                f
+                for f in self.sample_dir.rglob("*")
+                if f.suffix in SUPPORTED_FORMATS
+            )
+            if self.sample_dir
+            else []
+        )
+
+        self.setProgress.emit(0)
+
+        try:
+            self.logInfo.emit(f"开始{'动态' if self.mode == 'dynamic' else '静态'}量化...")
+            start = time.perf_counter()
+            quantized_path = quantize_model(
+                self.model_path, self.mode, images[: self.CALIBRATION_IMAGES]
+            )
+            self.logInfo.emit(
+                f"量化完成, 耗时 {time.perf_counter() - start:.1f}s: {quantized_path}"
+            )
+        except Exception as e:
+            self.logInfo.emit(f"量化失败: {str(e)}")
+            return
+
+        self.setProgress.emit(30)
+
+        if not images:
+            self.logInfo.emit("没有选择标注样本文件夹, 跳过对比")
+            self.setProgress.emit(100)
+            return
+
+        self.logInfo.emit(f"\n在 {len(images)} 张样本图片上对比...")
+
+        try:
+            baseline = evaluate_model(
+                "原模型",
+                self.model_path,
+                images,
+                CLASS_NAMES,
+                self.conf_thresh,
+                self.iou_thresh,
+                **self.session_kwargs,
+            )
+            self.setProgress.emit(65)
+
+            quantized = evaluate_model(
+                f"INT8 {self.mode}",
+                quantized_path,
+                images,
+                CLASS_NAMES,
+                self.conf_thresh,
+                self.iou_thresh,
+                **self.session_kwargs,
+            )
+        except Exception as e:
+            self.logInfo.emit(f"对比失败: {str(e)}")
+            return
+
+        for line in compare_report(baseline, [quantized]):
+            self.logInfo.emit(line)
+
+        self.logInfo.emit(f"\n使用量化模型请选择: {quantized_path}")
+        self.setProgress.emit(100)
 
 
 class YoloInterface(GalleryInterface):
@@ -239,6 +640,10 @@ class YoloInterface(GalleryInterface):
         self.hBoxLayout_img = QHBoxLayout()
         self.hBoxLayout_onnx = QHBoxLayout()
         self.hBoxLayout_output = QHBoxLayout()
+        self.hBoxLayout_params = QHBoxLayout()
+        self.hBoxLayout_session = QHBoxLayout()
+        self.hBoxLayout_sample = QHBoxLayout()
+        self.hBoxLayout_quant = QHBoxLayout()
         self.hBoxLayout_progress = QHBoxLayout()
 
         self.label_img = BodyLabel(text="图片所在文件夹: ")
@@ -291,6 +696,97 @@ class YoloInterface(GalleryInterface):
             )
         )
 
+        # 批次大小
+        self.label_batch_size = BodyLabel(text="批次大小: ")
+        self.spinBox_batch_size = SpinBox()
+        self.spinBox_batch_size.setRange(1, 64)
+        self.spinBox_batch_size.valueChanged.connect(
+            lambda value: cfg.set(cfg.yolo_batch_size, value)
+        )
+
+        # 推理线程数, 0 表示由 onnxruntime 决定
+        self.label_intra_threads = BodyLabel(text="算子内线程数: ")
+        self.spinBox_intra_threads = SpinBox()
+        self.spinBox_intra_threads.setRange(0, 64)
+        self.spinBox_intra_threads.valueChanged.connect(
+            lambda value: cfg.set(cfg.yolo_intra_threads, value)
+        )
+
+        self.label_inter_threads = BodyLabel(text="算子间线程数: ")
+        self.spinBox_inter_threads = SpinBox()
+        self.spinBox_inter_threads.setRange(0, 64)
+        self.spinBox_inter_threads.valueChanged.connect(
+            lambda value: cfg.set(cfg.yolo_inter_threads, value)
+        )
+
+        # 推理进程数, 大于 1 时每个进程各自加载模型
+        self.label_processes = BodyLabel(text="进程数: ")
+        self.spinBox_processes = SpinBox()
+        self.spinBox_processes.setRange(1, os.cpu_count() or 1)
+        self.spinBox_processes.valueChanged.connect(
+            lambda value: cfg.set(cfg.yolo_processes, value)
+        )
+
+        # 识别结果导出格式
+        self.label_export_format = BodyLabel(text="导出识别结果: ")
+        self.comboBox_export_format = ComboBox()
+        self.comboBox_export_format.addItems(["不导出", "CSV", "Parquet"])
+        self.comboBox_export_format.currentTextChanged.connect(
+            lambda text: cfg.set(cfg.yolo_export_format, text)
+        )
+
+        # 图优化级别
+        self.label_graph_optimization = BodyLabel(text="图优化: ")
+        self.comboBox_graph_optimization = ComboBox()
+        self.comboBox_graph_optimization.addItems(list(GRAPH_OPTIMIZATION_OPTIONS))
+        self.comboBox_graph_optimization.currentTextChanged.connect(
+            lambda text: cfg.set(cfg.yolo_graph_optimization, text)
+        )
+
+        # 执行模式
+        self.label_execution_mode = BodyLabel(text="执行模式: ")
+        self.comboBox_execution_mode = ComboBox()
+        self.comboBox_execution_mode.addItems(list(EXECUTION_MODE_OPTIONS))
+        self.comboBox_execution_mode.currentTextChanged.connect(
+            lambda text: cfg.set(cfg.yolo_execution_mode, text)
+        )
+
+        # 保存优化后的模型, 下次启动跳过图优化
+        self.checkBox_cache_optimized = CheckBox(text="缓存优化后的模型")
+        self.checkBox_cache_optimized.stateChanged.connect(
+            lambda: cfg.set(
+                cfg.yolo_cache_optimized, self.checkBox_cache_optimized.isChecked()
+            )
+        )
+
+        # 带标注的样本文件夹, 用于量化校准和对比
+        self.label_sample = BodyLabel(text="标注样本文件夹: ")
+        self.lineEdit_sample_path = DropableLineEditDir()
+        self.lineEdit_sample_path.setPlaceholderText(
+            "可选, 文件名以药品名开头的样本图片, 用于静态量化校准和对比"
+        )
+        self.lineEdit_sample_path.textChanged.connect(
+            lambda: cfg.set(cfg.yolo_sample_path, self.lineEdit_sample_path.text())
+        )
+        self.btn_select_sample_path = PushButton(text="···")
+        self.btn_select_sample_path.clicked.connect(
+            lambda: self.lineEdit_sample_path.setText(
+                QFileDialog.getExistingDirectory(self, "选择文件夹")
+            )
+        )
+
+        # 量化方式
+        self.label_quant_mode = BodyLabel(text="量化方式: ")
+        self.comboBox_quant_mode = ComboBox()
+        self.comboBox_quant_mode.addItems(list(QUANT_MODE_OPTIONS))
+        self.comboBox_quant_mode.currentTextChanged.connect(
+            lambda text: cfg.set(cfg.yolo_quant_mode, text)
+        )
+
+        # 量化按钮
+        self.btn_quantize = PushButton(text="INT8 量化并对比")
+        self.btn_quantize.clicked.connect(self.quantize)
+
         # 下载按钮
         self.btn_download = PushButton(text="识别")
         self.btn_download.clicked.connect(self.start)
@@ -317,12 +813,41 @@ class YoloInterface(GalleryInterface):
         self.hBoxLayout_output.addWidget(self.lineEdit_output_path)
         self.hBoxLayout_output.addWidget(self.btn_select_output_path)
 
+        self.hBoxLayout_params.addWidget(self.label_batch_size)
+        self.hBoxLayout_params.addWidget(self.spinBox_batch_size)
+        self.hBoxLayout_params.addWidget(self.label_intra_threads)
+        self.hBoxLayout_params.addWidget(self.spinBox_intra_threads)
+        self.hBoxLayout_params.addWidget(self.label_inter_threads)
+        self.hBoxLayout_params.addWidget(self.spinBox_inter_threads)
+        self.hBoxLayout_params.addWidget(self.label_processes)
+        self.hBoxLayout_params.addWidget(self.spinBox_processes)
+        self.hBoxLayout_params.addWidget(self.label_export_format)
+        self.hBoxLayout_params.addWidget(self.comboBox_export_format)
+
+        self.hBoxLayout_session.addWidget(self.label_graph_optimization)
+        self.hBoxLayout_session.addWidget(self.comboBox_graph_optimization)
+        self.hBoxLayout_session.addWidget(self.label_execution_mode)
+        self.hBoxLayout_session.addWidget(self.comboBox_execution_mode)
+        self.hBoxLayout_session.addWidget(self.checkBox_cache_optimized)
+
+        self.hBoxLayout_sample.addWidget(self.label_sample)
+        self.hBoxLayout_sample.addWidget(self.lineEdit_sample_path)
+        self.hBoxLayout_sample.addWidget(self.btn_select_sample_path)
+
+        self.hBoxLayout_quant.addWidget(self.label_quant_mode)
+        self.hBoxLayout_quant.addWidget(self.comboBox_quant_mode)
+        self.hBoxLayout_quant.addWidget(self.btn_quantize)
+
         self.hBoxLayout_progress.addWidget(self.progressBar)
         self.hBoxLayout_progress.addWidget(self.label_progress)
 
         self.vBoxLayout.addLayout(self.hBoxLayout_img)
         self.vBoxLayout.addLayout(self.hBoxLayout_onnx)
         self.vBoxLayout.addLayout(self.hBoxLayout_output)
+        self.vBoxLayout.addLayout(self.hBoxLayout_params)
+        self.vBoxLayout.addLayout(self.hBoxLayout_session)
+        self.vBoxLayout.addLayout(self.hBoxLayout_sample)
+        self.vBoxLayout.addLayout(self.hBoxLayout_quant)
 
         self.vBoxLayout.addWidget(self.btn_download)
         self.vBoxLayout.addWidget(self.textEdit_log)
@@ -336,8 +861,21 @@ class YoloInterface(GalleryInterface):
         self.lineEdit_img_path.setText(cfg.yolo_img_path.value)
         self.lineEdit_onnx_path.setText(cfg.yolo_onnx_path.value)
         self.lineEdit_output_path.setText(cfg.yolo_output_path.value)
+        self.spinBox_batch_size.setValue(cfg.yolo_batch_size.value)
+        self.spinBox_intra_threads.setValue(cfg.yolo_intra_threads.value)
+        self.spinBox_inter_threads.setValue(cfg.yolo_inter_threads.value)
+        self.spinBox_processes.setValue(cfg.yolo_processes.value)
+        self.comboBox_export_format.setCurrentText(cfg.yolo_export_format.value)
+        self.comboBox_graph_optimization.setCurrentText(
+            cfg.yolo_graph_optimization.value
+        )
+        self.comboBox_execution_mode.setCurrentText(cfg.yolo_execution_mode.value)
+        self.checkBox_cache_optimized.setChecked(cfg.yolo_cache_optimized.value)
+        self.lineEdit_sample_path.setText(cfg.yolo_sample_path.value)
+        self.comboBox_quant_mode.setCurrentText(cfg.yolo_quant_mode.value)
 
         self.worker: Optional[YoloInferenceWorker] = None
+        self.quantize_worker: Optional[YoloQuantizeWorker] = None
 
     def __initWidget(self):
         self.view.setObjectName("")
@@ -395,22 +933,89 @@ class YoloInterface(GalleryInterface):
         """
         self.label_progress.setText(f"{value}/{total}")
 
+    def setControlsEnabled(self, enabled: bool):
+        """识别或者量化过程中禁用输入控件"""
+        for widget in (
+            self.lineEdit_img_path,
+            self.lineEdit_onnx_path,
+            self.lineEdit_output_path,
+            self.lineEdit_sample_path,
+            self.btn_select_img_path,
+            self.btn_select_onnx_path,
+            self.btn_select_output_path,
+            self.btn_select_sample_path,
+            self.spinBox_batch_size,
+            self.spinBox_intra_threads,
+            self.spinBox_inter_threads,
+            self.spinBox_processes,
+            self.comboBox_export_format,
+            self.comboBox_graph_optimization,
+            self.comboBox_execution_mode,
+            self.checkBox_cache_optimized,
+            self.comboBox_quant_mode,
+            self.btn_quantize,
+            self.btn_download,
+        ):
+            widget.setEnabled(enabled)
+
+    def sessionOptions(self) -> dict:
+        """界面上的推理会话设置"""
+        return {
+            "intra_threads": self.spinBox_intra_threads.value(),
+            "inter_threads": self.spinBox_inter_threads.value(),
+            "graph_optimization": GRAPH_OPTIMIZATION_OPTIONS[
+                self.comboBox_graph_optimization.currentText()
+            ],
+            "execution_mode": EXECUTION_MODE_OPTIONS[
+                self.comboBox_execution_mode.currentText()
+            ],
+            "cache_optimized": self.checkBox_cache_optimized.isChecked(),
+        }
+
     @Slot()
     def finished(self):
-        self.lineEdit_img_path.setEnabled(True)
-        self.lineEdit_onnx_path.setEnabled(True)
-        self.lineEdit_output_path.setEnabled(True)
-
-        self.btn_select_img_path.setEnabled(True)
-        self.btn_select_onnx_path.setEnabled(True)
-        self.btn_select_output_path.setEnabled(True)
-        self.btn_download.setEnabled(True)
+        self.setControlsEnabled(True)
 
         if self.stateTooltip is not None:
             self.stateTooltip.hide()
 
         self.createSuccessInfoBar("完成", "图片识别完成")
 
+    @Slot()
+    def quantizeFinished(self):
+        self.setControlsEnabled(True)
+        self.createSuccessInfoBar("完成", "模型量化完成")
+
+    def quantize(self):
+        self.textEdit_log.clear()
+
+        # 检查是否选择了 onnx 文件
+        onnx_path = self.lineEdit_onnx_path.text()
+        if not onnx_path:
+            self.createErrorInfoBar("错误", "请选择 onnx 模型文件")
+            return
+
+        mode = QUANT_MODE_OPTIONS[self.comboBox_quant_mode.currentText()]
+        sample_dir = self.lineEdit_sample_path.text()
+        if mode == "static" and not sample_dir:
+            self.createErrorInfoBar("错误", "静态量化需要选择标注样本文件夹")
+            return
+
+        self.setControlsEnabled(False)
+
+        self.quantize_worker = YoloQuantizeWorker(
+            Path(onnx_path),
+            Path(sample_dir) if sample_dir else None,
+            mode,
+            **self.sessionOptions(),
+        )
+
+        self.quantize_worker.logInfo.connect(self.logInfo)
+        self.quantize_worker.setProgress.connect(self.setProgress)
+        self.quantize_worker.finished.connect(self.quantizeFinished)
+
+        self.quantize_worker.start()
+
     def start(self):
         self.textEdit_log.clear()
 
@@ -436,18 +1041,28 @@ class YoloInterface(GalleryInterface):
         onnx_path = Path(self.lineEdit_onnx_path.text())
         output_dir = Path(self.lineEdit_output_path.text())
 
-        self.lineEdit_img_path.setEnabled(False)
-        self.lineEdit_onnx_path.setEnabled(False)
-
-        self.btn_select_img_path.setEnabled(False)
-        self.btn_select_onnx_path.setEnabled(False)
-
-        self.lineEdit_output_path.setEnabled(False)
-        self.btn_select_output_path.setEnabled(False)
+        # 创建 worker 时会加载模型, 先创建再禁用控件, 加载失败时界面仍然可用
+        try:
+            worker = YoloInferenceWorker(
+                img_dir,
+                onnx_path,
+                output_dir,
+                batch_size=self.spinBox_batch_size.value(),
+                processes=self.spinBox_processes.value(),
+                export_format=(
+                    None
+                    if self.comboBox_export_format.currentText() == "不导出"
+                    else self.comboBox_export_format.currentText()
+                ),
+                **self.sessionOptions(),
+            )
+        except Exception as e:
+            self.createErrorInfoBar("加载模型失败", str(e))
+            return
 
-        self.btn_download.setEnabled(False)
+        self.setControlsEnabled(False)
 
-        self.worker = YoloInferenceWorker(img_dir, onnx_path, output_dir)
+        self.worker = worker
 
         self.worker.logInfo.connect(self.logInfo)
         self.worker.finished.connect(self.finished)